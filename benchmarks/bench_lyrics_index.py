@@ -0,0 +1,111 @@
+"""Benchmark local lyrics index lookups against a synthetic corpus.
+
+Usage:
+    python benchmarks/bench_lyrics_index.py [--songs 100000] [--lookups 2000]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from music_wizard_lib.lyrics_index import LyricsIndex  # noqa: E402
+
+SYLLABLES = (
+    "la ri mo na ka te so lu vi da ne ro sa mi ko ba le zu fa go "
+    "ti ra pe lo du shi ve ny ha qua"
+).split()
+COMMON_WORDS = "love night heart fire dance dream the you my me".split()
+
+
+def make_vocabulary(rng, size=20_000):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def random_name(rng, vocabulary, min_words, max_words):
+    words = []
+    for _ in range(rng.randint(min_words, max_words)):
+        # Song names share a handful of very common words, as real ones do.
+        pool = COMMON_WORDS if rng.random() < 0.3 else vocabulary
+        words.append(rng.choice(pool))
+    return " ".join(words)
+
+
+def build_corpus(rng, vocabulary, count):
+    songs = {}
+    while len(songs) < count:
+        artist = random_name(rng, vocabulary, 1, 2).title()
+        title = random_name(rng, vocabulary, 1, 4).title()
+        songs[(artist, title)] = f"[Verse 1]\n{random_name(rng, vocabulary, 20, 40)}"
+    rows = songs.items()
+    return [(artist, title, lyrics, "bench") for (artist, title), lyrics in rows]
+
+
+def misspell(rng, text):
+    pos = rng.randrange(len(text))
+    return text[:pos] + text[pos + 1 :]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def time_lookups(index, queries):
+    samples, hits = [], 0
+    for artist, title in queries:
+        start = time.perf_counter()
+        if index.lookup(artist, title):
+            hits += 1
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--songs", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng)
+    corpus = build_corpus(rng, vocabulary, args.songs)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LyricsIndex(os.path.join(tmp, "bench.sqlite3"))
+        start = time.perf_counter()
+        index.add_many(corpus)
+        print(f"indexed {len(index)} songs in {time.perf_counter() - start:.1f}s")
+
+        sample = rng.sample(corpus, args.lookups)
+        scenarios = {
+            "exact": [(a, t) for a, t, _, _ in sample],
+            "decorated": [(a, f"{t} (Official Video)") for a, t, _, _ in sample],
+            "misspelled": [(a, misspell(rng, t)) for a, t, _, _ in sample],
+            "missing": [
+                (random_name(rng, vocabulary, 1, 2), random_name(rng, vocabulary, 3, 4))
+                for _ in range(200)
+            ],
+        }
+        for name, queries in scenarios.items():
+            samples, hits = time_lookups(index, queries)
+            print(
+                f"{name:>10}: hit {hits / len(queries):6.1%}  "
+                f"mean {statistics.mean(samples):6.2f}ms  "
+                f"p50 {percentile(samples, 50):6.2f}ms  "
+                f"p95 {percentile(samples, 95):6.2f}ms  "
+                f"p99 {percentile(samples, 99):6.2f}ms"
+            )
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
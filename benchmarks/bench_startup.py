@@ -0,0 +1,180 @@
+"""Startup benchmark: how long each entry point takes to become ready.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--json results.json]
+    python benchmarks/bench_startup.py --importtime bot
+
+Every measurement runs in a fresh interpreter, so nothing is cached in
+sys.modules. --importtime lists the slowest imports of one target using
+Python's -X importtime.
+
+The first_request scenarios time the OpenAI title lookup a YouTube link
+starts with, against a local stub of the API, right after the application
+is built. In the warm scenario the warm-up thread was started first, as
+bot.main() does, and may still be running when the request arrives.
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A local stand-in for the OpenAI API, so the first request does real
+# client work without the network.
+OPENAI_STUB = """
+import os, json, asyncio, threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+class OpenAIStub(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        content = json.dumps({"artist": "Queen", "title": "Bohemian Rhapsody"})
+        body = json.dumps({
+            "id": "bench", "object": "chat.completion", "created": 0,
+            "model": "bench", "choices": [{
+                "index": 0, "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+stub = HTTPServer(("127.0.0.1", 0), OpenAIStub)
+threading.Thread(target=stub.serve_forever, daemon=True).start()
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{stub.server_port}/v1"
+"""
+
+FIRST_REQUEST = """
+start = time.perf_counter()
+info = asyncio.run(
+    bot.ai_services.extract_song_info_with_openai("Queen - Bohemian Rhapsody")
+)
+assert info["artist"] == "Queen", info
+"""
+
+# Each snippet prints the seconds it measured as its last line.
+SCENARIOS = {
+    "import_package": "import music_wizard_lib",
+    "import_bot": "import bot",
+    "import_worker": "import worker; from music_wizard_lib import jobs",
+    "bot_ready": "import bot; bot.build_application()",
+    "first_request_cold": (
+        OPENAI_STUB + "import bot\nbot.build_application()\n" + FIRST_REQUEST
+    ),
+    "first_request_warm": (
+        OPENAI_STUB
+        + "import bot\n"
+        + "threading.Thread(target=bot.warm_up_clients, daemon=True).start()\n"
+        + "bot.build_application()\n"
+        + FIRST_REQUEST
+    ),
+}
+
+TEMPLATE = """
+import time
+start = time.perf_counter()
+{code}
+print(time.perf_counter() - start)
+"""
+
+
+def _environment() -> dict:
+    env = dict(os.environ)
+    scratch = tempfile.mkdtemp(prefix="musicwizard-startup-")
+    for name, value in {
+        "TELEGRAM_TOKEN": "123456:bench",
+        "GENIUS_ACCESS_TOKEN": "bench",
+        "OPENAI_API_KEY": "bench",
+        "PERSISTENCE_PATH": "",
+        "TRACE_PATH": "",
+        "SCRATCH_DIR": scratch,
+    }.items():
+        env.setdefault(name, value)
+    return env
+
+
+def run_once(code: str, env: dict) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", TEMPLATE.format(code=code)],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def run_suite(runs: int = 5, pattern: str = None) -> dict:
+    env = _environment()
+    results = {}
+    for name, code in SCENARIOS.items():
+        if pattern and pattern not in name:
+            continue
+        samples = [run_once(code, env) * 1000 for _ in range(runs)]
+        results[name] = {
+            "median_ms": round(statistics.median(samples), 1),
+            "min_ms": round(min(samples), 1),
+            "runs": runs,
+        }
+    return results
+
+
+def import_offenders(module: str, top: int = 15) -> list:
+    """Return ``(cumulative_ms, package)`` for the slowest imports."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=_environment(),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    totals = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            totals.append((int(cumulative) / 1000, name.rstrip()))
+    return sorted(totals, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--filter", help="only run scenarios containing this")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--importtime", metavar="MODULE")
+    args = parser.parse_args()
+
+    if args.importtime:
+        for milliseconds, name in import_offenders(args.importtime):
+            print(f"{milliseconds:8.1f}ms {name}")
+        return
+
+    results = run_suite(args.runs, args.filter)
+    for name, result in results.items():
+        print(
+            f"{name:>20}: median {result['median_ms']:8.1f}ms  "
+            f"min {result['min_ms']:8.1f}ms"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
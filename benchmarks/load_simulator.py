@@ -0,0 +1,661 @@
+"""Load-test the real bot handlers with fake Telegram, YouTube, OpenAI, Genius
+and yt-dlp backends.
+
+Usage:
+    python benchmarks/load_simulator.py [--users 1,5,10,25] [--flows 3]
+        [--mix song=0.8,playlist=0.2] [--telegram 0.05] [--youtube 0.3]
+        [--openai 0.8] [--genius 0.6] [--download 3] [--transcode 1]
+        [--fail youtube=0.02,download=0.05] [--json results.json]
+
+Every simulated user runs ``--flows`` conversations one after another through
+the Application returned by ``bot.build_application()``: updates go into its
+update queue and each step waits for the bot's answer to reach the fake Bot
+API. Service latencies are log-normal around the given medians (seconds).
+Downloads run in-process (DOWNLOAD_WORKERS=0) because worker processes would
+not see the fakes.
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import threading
+import warnings
+import subprocess
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_SCRATCH = tempfile.mkdtemp(prefix="musicwizard-load-")
+for name, value in {
+    "TELEGRAM_TOKEN": "123456:load-simulator",
+    "GENIUS_ACCESS_TOKEN": "load",
+    "OPENAI_API_KEY": "load",
+    "DOWNLOAD_WORKERS": "0",
+    "PERSISTENCE_PATH": "",
+    "TRACE_PATH": "",
+    "SCRATCH_DIR": os.path.join(_SCRATCH, "scratch"),
+    "LYRICS_INDEX_PATH": os.path.join(_SCRATCH, "lyrics_index.sqlite3"),
+    "PLAYLIST_JOBS_PATH": os.path.join(_SCRATCH, "playlist_jobs.sqlite3"),
+    "JOB_QUEUE_PATH": os.path.join(_SCRATCH, "jobs.sqlite3"),
+    "CATALOG_PATH": os.path.join(_SCRATCH, "song_catalog.sqlite3"),
+    "CALLBACK_STORE_PATH": os.path.join(_SCRATCH, "callbacks.sqlite3"),
+}.items():
+    os.environ.setdefault(name, value)
+
+import requests  # noqa: E402
+import httplib2  # noqa: E402
+from googleapiclient.errors import HttpError  # noqa: E402
+from telegram import Update  # noqa: E402
+from telegram.request import BaseRequest  # noqa: E402
+from telegram.warnings import PTBUserWarning  # noqa: E402
+
+import bot  # noqa: E402
+from music_wizard_lib import (  # noqa: E402
+    ai_services,
+    config,
+    downloader,
+    localization,
+    lyrics_services,
+    youtube_services,
+)
+
+STEP_TIMEOUT = 300
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "MusicWizard", "username": "bot"}
+# Texts that end a flow as failed (English prefixes, before any placeholder).
+FAILURE_TEXTS = tuple(
+    localization.MESSAGES["en"][key].split("{")[0]
+    for key in (
+        "error",
+        "not_found",
+        "search_error",
+        "auth_error",
+        "ai_fail",
+        "playlist_unexpected_error",
+    )
+)
+WORDS = (
+    "love night heart fire dance dream baby light shadow river golden "
+    "tonight forever broken wings rain summer city lonely road"
+).split()
+
+
+class Service:
+    """Latency and failure distribution of one fake backend."""
+
+    def __init__(self, name: str, median: float, sigma: float, failure: float, rng):
+        self.name = name
+        self.median = median
+        self.sigma = sigma
+        self.failure = failure
+        self.rng = rng
+        self.calls = 0
+        self.failures = 0
+
+    def delay(self) -> float:
+        self.calls += 1
+        if self.median <= 0:
+            return 0.0
+        return self.median * math.exp(self.sigma * self.rng.gauss(0, 1))
+
+    def fails(self) -> bool:
+        failed = self.rng.random() < self.failure
+        self.failures += failed
+        return failed
+
+
+def _song_name(rng) -> tuple:
+    artist = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 2))).title()
+    title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+    return artist, title
+
+
+# --- Fake Bot API ---
+
+
+class Chat:
+    """Calls the bot made to one chat, for flows to wait on."""
+
+    def __init__(self):
+        self.calls = []
+        self.changed = asyncio.Event()
+        self.next_message_id = 1
+
+    def record(self, method: str, params: dict) -> None:
+        self.calls.append((method, params))
+        self.changed.set()
+
+    async def wait_for(self, predicate, since: int, timeout: float):
+        """Return the first call after index ``since`` matching ``predicate``."""
+        deadline = time.monotonic() + timeout
+        while True:
+            for method, params in self.calls[since:]:
+                outcome = predicate(method, params)
+                if outcome is not None:
+                    return outcome
+            since = len(self.calls)
+            self.changed.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            await asyncio.wait_for(self.changed.wait(), remaining)
+
+
+class FakeBotAPI(BaseRequest):
+    """Answers Bot API calls locally after a simulated network delay."""
+
+    def __init__(self, service: Service, chats: dict):
+        self.service = service
+        self.chats = chats
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _message(self, chat_id: int, params: dict, audio: bool = False) -> dict:
+        chat = self.chats.setdefault(chat_id, Chat())
+        message_id = params.get("message_id") or chat.next_message_id
+        chat.next_message_id += 1
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+        if audio:
+            file_id = f"audio-{chat_id}-{message_id}"
+            message["audio"] = {
+                "file_id": file_id,
+                "file_unique_id": file_id,
+                "duration": 180,
+            }
+        return message
+
+    def _result(self, method: str, params: dict):
+        chat_id = params.get("chat_id")
+        chat_id = int(chat_id) if chat_id is not None else None
+        if method == "getMe":
+            return {**BOT_USER, "can_join_groups": True}
+        if method in ("sendMessage", "editMessageText", "sendDocument"):
+            return self._message(chat_id, params)
+        if method == "sendAudio":
+            return self._message(chat_id, params, audio=True)
+        if method == "sendMediaGroup":
+            return [self._message(chat_id, {}, audio=True) for _ in params["media"]]
+        return True
+
+    async def do_request(
+        self,
+        url,
+        method,
+        request_data=None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ):
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        await asyncio.sleep(self.service.delay())
+        if self.service.fails():
+            body = {"ok": False, "error_code": 500, "description": "Fake outage"}
+            return 500, json.dumps(body).encode()
+        result = self._result(api_method, params)
+        if params.get("chat_id") is not None:
+            chat = self.chats.setdefault(int(params["chat_id"]), Chat())
+            if isinstance(result, dict):
+                params = {**params, "message_id": result["message_id"]}
+            chat.record(api_method, params)
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+# --- Fake external services ---
+
+
+class FakeYouTube:
+    def __init__(self, service: Service):
+        self.service = service
+
+    def search(self):
+        return self
+
+    def list(self, **kwargs):
+        return self
+
+    def execute(self):
+        # Called from a worker thread, like the real blocking client.
+        time.sleep(self.service.delay())
+        if self.service.fails():
+            raise HttpError(httplib2.Response({"status": 503}), b"fake outage")
+        return {"items": [{"id": {"videoId": f"v{self.service.calls}"}}]}
+
+
+def install_openai(service: Service, rng) -> None:
+    async def create(model, messages, **kwargs):
+        await asyncio.sleep(service.delay())
+        if service.fails():
+            raise RuntimeError("Fake OpenAI outage")
+        prompt = messages[-1]["content"]
+        if model == config.OPENAI_PLAYLIST_MODEL:
+            count = int(re.search(r"playlist of (\d+) songs", prompt).group(1))
+            songs = [_song_name(rng) for _ in range(count)]
+            data = {"songs": [{"artist": a, "title": t} for a, t in songs]}
+        else:
+            artist, title = _song_name(rng)
+            data = {"artist": artist, "title": title}
+        message = SimpleNamespace(content=json.dumps(data))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    ai_services.openai_client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+
+
+class FakeGenius:
+    def __init__(self, service: Service):
+        self.service = service
+
+    def search_song(self, title, artist=None):
+        time.sleep(self.service.delay())
+        if self.service.fails():
+            raise requests.exceptions.ConnectionError("Fake Genius outage")
+        verses = "\n".join(f"{title} line {i}" for i in range(40))
+        return SimpleNamespace(lyrics=f"{title} Lyrics\n[Verse 1]\n{verses}")
+
+
+def install_downloader(services: dict, file_size: int) -> None:
+    async def fake_run(command, timeout):
+        if "--dump-json" in command:
+            service = services["metadata"]
+        elif command[0] == "ffmpeg":
+            service = services["transcode"]
+        else:
+            service = services["download"]
+        await asyncio.sleep(service.delay())
+        if service.fails():
+            raise subprocess.CalledProcessError(1, command, "", "fake failure")
+        if "--dump-json" in command:
+            return json.dumps({"title": "Some Artist - Some Song (Official Video)"})
+        if command[0] == "ffmpeg":
+            target = command[-1]
+        else:
+            template = command[command.index("--output") + 1]
+            target = os.path.join(os.path.dirname(template), "song.webm")
+        with open(target, "wb") as f:
+            f.write(b"\0" * file_size)
+        return ""
+
+    downloader._run = fake_run
+
+
+# --- Simulated users ---
+
+
+class User:
+    def __init__(self, sim, user_id: int):
+        self.sim = sim
+        self.user_id = user_id
+        self.chat = sim.chats.setdefault(user_id, Chat())
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+        self.step_latencies = []
+
+    async def _send(self, update: dict, predicate) -> object:
+        since = len(self.chat.calls)
+        start = time.perf_counter()
+        await self.sim.application.update_queue.put(
+            Update.de_json(update, self.sim.application.bot)
+        )
+        outcome = await self.chat.wait_for(predicate, since, self.sim.step_timeout)
+        self.step_latencies.append(time.perf_counter() - start)
+        if outcome is False:
+            raise FlowFailed
+        return outcome
+
+    def _message(self, text: str) -> dict:
+        message = {
+            "message_id": self.chat.next_message_id,
+            "date": int(time.time()),
+            "chat": {"id": self.user_id, "type": "private"},
+            "from": self.user,
+            "text": text,
+        }
+        self.chat.next_message_id += 1
+        if text.startswith("/"):
+            command = text.split()[0]
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": len(command)}
+            ]
+        return {"update_id": self.sim.next_update_id(), "message": message}
+
+    def _callback(self, data: str, message_id: int) -> dict:
+        return {
+            "update_id": self.sim.next_update_id(),
+            "callback_query": {
+                "id": str(self.sim.next_update_id()),
+                "from": self.user,
+                "chat_instance": str(self.user_id),
+                "data": data,
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": self.user_id, "type": "private"},
+                    "from": BOT_USER,
+                    "text": "",
+                },
+            },
+        }
+
+    async def say(self, text: str, predicate):
+        return await self._send(self._message(text), predicate)
+
+    async def tap(self, data: str, message_id: int, predicate):
+        return await self._send(self._callback(data, message_id), predicate)
+
+    async def think(self):
+        if self.sim.think_time > 0:
+            await asyncio.sleep(self.sim.rng.expovariate(1 / self.sim.think_time))
+
+
+class FlowFailed(Exception):
+    """The bot answered a step with an error message."""
+
+
+def _buttons(params: dict) -> list:
+    markup = params.get("reply_markup") or {}
+    if isinstance(markup, str):
+        markup = json.loads(markup)
+    rows = markup.get("inline_keyboard", [])
+    return [button.get("callback_data", "") for row in rows for button in row]
+
+
+def expect_button(prefix: str):
+    """Match a message offering a button whose data starts with ``prefix``;
+    an error text fails the step."""
+
+    def predicate(method, params):
+        if str(params.get("text", "")).startswith(FAILURE_TEXTS):
+            return False
+        for data in _buttons(params):
+            if data.startswith(prefix):
+                return (params.get("message_id"), data)
+        return None
+
+    return predicate
+
+
+def expect_method(*methods):
+    def predicate(method, params):
+        if str(params.get("text", "")).startswith(FAILURE_TEXTS):
+            return False
+        return True if method in methods else None
+
+    return predicate
+
+
+async def _open_menu(user: User) -> int:
+    """Run /start and choose English; return the menu message id."""
+    message_id, _ = await user.say("/start", expect_button("lang_"))
+    await user.think()
+    await user.tap("lang_en", message_id, expect_button("create_playlist"))
+    return message_id
+
+
+async def song_flow(user: User) -> None:
+    message_id = await _open_menu(user)
+    await user.think()
+    await user.tap("download_song", message_id, expect_method("editMessageText"))
+    await user.think()
+    artist, title = _song_name(user.sim.rng)
+    menu_id, lyrics_data = await user.say(f"{artist} {title}", expect_button("lyrics_"))
+    await user.think()
+    await user.tap(lyrics_data, menu_id, expect_button("create_playlist"))
+
+
+async def playlist_flow(user: User) -> None:
+    message_id = await _open_menu(user)
+    await user.think()
+    await user.tap("create_playlist", message_id, expect_method("editMessageText"))
+    await user.think()
+    vibe = " ".join(user.sim.rng.sample(WORDS, 3))
+    await user.say(vibe, expect_method("sendMessage"))
+    await user.think()
+    choice_id, _ = await user.say(
+        str(user.sim.playlist_size), expect_button("playlist_download")
+    )
+    await user.think()
+    # The job ends by offering the main menu again.
+    await user.tap("playlist_download", choice_id, expect_button("create_playlist"))
+
+
+FLOWS = {"song": song_flow, "playlist": playlist_flow}
+
+
+# --- Runner ---
+
+
+class Simulation:
+    def __init__(self, args, services: dict, rng):
+        self.args = args
+        self.services = services
+        self.rng = rng
+        self.think_time = args.think_time
+        self.playlist_size = args.playlist_size
+        self.step_timeout = args.step_timeout
+        self.chats = {}
+        self._update_id = 0
+        self.application = None
+
+    def next_update_id(self) -> int:
+        self._update_id += 1
+        return self._update_id
+
+    def build(self):
+        application = bot.build_application()
+        fake = FakeBotAPI(self.services["telegram"], self.chats)
+        for pool in application.bot.request.pools.values():
+            pool.request = fake
+        self.application = application
+        return application
+
+    def pick_flow(self) -> str:
+        names, weights = zip(*self.args.mix.items())
+        return self.rng.choices(names, weights)[0]
+
+
+async def _run_user(sim, user_id: int, results: dict) -> None:
+    user = User(sim, user_id)
+    for _ in range(sim.args.flows):
+        name = sim.pick_flow()
+        user.step_latencies = []
+        start = time.perf_counter()
+        try:
+            await FLOWS[name](user)
+        except (FlowFailed, asyncio.TimeoutError):
+            results[name]["failed"] += 1
+            # Back off before starting over, as a person would.
+            await asyncio.sleep(1)
+            continue
+        results[name]["latencies"].append(time.perf_counter() - start)
+        # The time the bot kept the user waiting, without think time.
+        results[name]["service"].append(sum(user.step_latencies))
+
+
+async def _watch_loop(stats: dict, stop: asyncio.Event) -> None:
+    """Sample event loop lag and thread count while the level runs."""
+    interval = 0.05
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        stats["lag"].append(time.perf_counter() - start - interval)
+        stats["threads"] = max(stats["threads"], threading.active_count())
+
+
+def percentile(samples, pct):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run_level(args, services: dict, rng, users: int, first_id: int) -> dict:
+    sim = Simulation(args, services, rng)
+    application = sim.build()
+    results = {name: {"latencies": [], "service": [], "failed": 0} for name in FLOWS}
+    stats = {"lag": [], "threads": 0}
+    stop = asyncio.Event()
+    async with application:
+        await application.start()
+        watcher = asyncio.create_task(_watch_loop(stats, stop))
+        cpu, wall = time.process_time(), time.perf_counter()
+        await asyncio.gather(
+            *(_run_user(sim, first_id + index, results) for index in range(users))
+        )
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        stop.set()
+        await watcher
+        await application.stop()
+    flows = {}
+    for name, result in results.items():
+        done = len(result["latencies"])
+        if not done and not result["failed"]:
+            continue
+        flows[name] = {
+            "completed": done,
+            "failed": result["failed"],
+            "p50": percentile(result["service"], 50),
+            "p95": percentile(result["service"], 95),
+            "p99": percentile(result["service"], 99),
+            "wall_p50": percentile(result["latencies"], 50),
+        }
+    return {
+        "users": users,
+        "seconds": wall,
+        "throughput": sum(f["completed"] for f in flows.values()) / wall,
+        "telegram_calls": sum(len(chat.calls) for chat in sim.chats.values()),
+        "cpu_percent": 100 * cpu / wall,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "loop_lag_p99_ms": 1000 * percentile(stats["lag"], 99),
+        "max_threads": stats["threads"],
+        "flows": flows,
+    }
+
+
+def _print_level(level: dict) -> None:
+    print(
+        f"users={level['users']:<4} {level['throughput']:6.2f} flows/s  "
+        f"cpu {level['cpu_percent']:5.1f}%  rss {level['max_rss_mb']:6.1f}MB  "
+        f"loop lag p99 {level['loop_lag_p99_ms']:7.1f}ms  "
+        f"threads {level['max_threads']}"
+    )
+    for name, flow in level["flows"].items():
+        print(
+            f"    {name:>9}: ok {flow['completed']:<4} failed {flow['failed']:<4} "
+            f"p50 {flow['p50']:7.2f}s  p95 {flow['p95']:7.2f}s  "
+            f"p99 {flow['p99']:7.2f}s"
+        )
+
+
+def _parse_pairs(text: str) -> dict:
+    pairs = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        name, _, value = item.partition("=")
+        pairs[name] = float(value)
+    return pairs
+
+
+async def simulate(args) -> list:
+    rng = random.Random(args.seed)
+    failures = _parse_pairs(args.fail)
+    medians = {
+        "telegram": args.telegram,
+        "youtube": args.youtube,
+        "openai": args.openai,
+        "genius": args.genius,
+        "metadata": args.metadata,
+        "download": args.download,
+        "transcode": args.transcode,
+    }
+    services = {
+        name: Service(name, median, args.sigma, failures.get(name, 0.0), rng)
+        for name, median in medians.items()
+    }
+    youtube_services.get_authenticated_service = lambda: FakeYouTube(
+        services["youtube"]
+    )
+    lyrics_services._genius_client = FakeGenius(services["genius"])
+    install_openai(services["openai"], rng)
+    install_downloader(services, args.file_size)
+    if args.unthrottled:
+        config.TELEGRAM_GLOBAL_RATE = 10_000
+        config.TELEGRAM_CHAT_RATE = 10_000
+        config.TELEGRAM_GROUP_RATE = 10_000
+
+    levels = []
+    first_id = 1000
+    for users in args.users:
+        level = await run_level(args, services, rng, users, first_id)
+        first_id += users
+        _print_level(level)
+        levels.append(level)
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--users",
+        default="1,5,10,25",
+        type=lambda text: [int(n) for n in text.split(",")],
+        help="comma-separated concurrent user counts, one run each",
+    )
+    parser.add_argument("--flows", type=int, default=3, help="flows per user")
+    parser.add_argument("--mix", default="song=0.8,playlist=0.2", type=_parse_pairs)
+    parser.add_argument("--playlist-size", type=int, default=5)
+    parser.add_argument("--think-time", type=float, default=0.5)
+    parser.add_argument("--step-timeout", type=float, default=STEP_TIMEOUT)
+    parser.add_argument("--telegram", type=float, default=0.05)
+    parser.add_argument("--youtube", type=float, default=0.3)
+    parser.add_argument("--openai", type=float, default=0.8)
+    parser.add_argument("--genius", type=float, default=0.6)
+    parser.add_argument("--metadata", type=float, default=1.0)
+    parser.add_argument("--download", type=float, default=3.0)
+    parser.add_argument("--transcode", type=float, default=1.0)
+    parser.add_argument("--sigma", type=float, default=0.5, help="log-normal spread")
+    parser.add_argument(
+        "--fail",
+        default="",
+        help="failure rates per service, e.g. youtube=0.02,download=0.05",
+    )
+    parser.add_argument("--file-size", type=int, default=64 * 1024)
+    parser.add_argument(
+        "--unthrottled",
+        action="store_true",
+        help="lift the outbound Telegram rate limits",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="CRITICAL")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level)
+    warnings.filterwarnings("ignore", category=PTBUserWarning)
+    levels = asyncio.run(simulate(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(levels, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""Microbenchmarks for the music_wizard_lib hot paths, run offline with fakes.
+
+Usage:
+    python benchmarks/microbench.py [--filter split] [--json results.json]
+    python benchmarks/microbench.py --compare benchmarks/baseline.json
+    python benchmarks/microbench.py --save benchmarks/baseline.json
+
+With --compare the run fails (exit code 1) when a benchmark's best repeat
+is more than --threshold (default 25%) slower than in the baseline; the
+best repeat is the one least disturbed by other load on the machine.
+Baselines are only comparable on the machine and Python version that
+recorded them.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_SCRATCH = tempfile.mkdtemp(prefix="musicwizard-bench-")
+for name, value in {
+    "TELEGRAM_TOKEN": "bench",
+    "GENIUS_ACCESS_TOKEN": "bench",
+    "OPENAI_API_KEY": "bench",
+    "DOWNLOAD_WORKERS": "0",
+    "LYRICS_INDEX_PATH": "",
+    "PERSISTENCE_PATH": "",
+    "TRACE_PATH": "",
+    "SCRATCH_DIR": _SCRATCH,
+}.items():
+    os.environ.setdefault(name, value)
+
+from music_wizard_lib import (  # noqa: E402
+    ai_services,
+    cache,
+    downloader,
+    jobs,
+    localization,
+    logging_setup,
+    lyrics_services,
+    utils,
+    workspace,
+)
+from music_wizard_lib.lyrics_index import LyricsIndex  # noqa: E402
+
+DEFAULT_THRESHOLD = 0.25
+# Each repeat runs the benchmark for at least this long.
+MIN_REPEAT_SECONDS = 0.05
+
+BENCHMARKS = {}
+
+WORDS = (
+    "love night heart fire dance dream baby light shadow river golden "
+    "tonight forever broken wings rain summer city lonely road"
+).split()
+
+
+def benchmark(name: str):
+    """Register ``setup``; it returns the callable (sync or async) to time."""
+
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def _line(rng, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _genius_page(rng, sections: int) -> str:
+    """Raw Genius lyrics: header line, sections, embed noise at the end."""
+    parts = ["123 ContributorsSong Title Lyrics"]
+    for number in range(sections):
+        parts.append(f"[Verse {number + 1}]")
+        parts.extend(_line(rng, rng.randint(4, 9)) for _ in range(8))
+        parts.append("")
+    parts.append("You might also like42Embed")
+    return "\n".join(parts)
+
+
+@benchmark("lyrics_clean_large")
+def bench_lyrics_clean():
+    text = _genius_page(random.Random(1), 400)
+    return lambda: lyrics_services._clean_lyrics(text)
+
+
+@benchmark("split_text_large")
+def bench_split_text():
+    rng = random.Random(2)
+    text = lyrics_services._clean_lyrics(_genius_page(rng, 400))
+    return lambda: utils.split_text(text)
+
+
+@benchmark("split_text_two_messages")
+def bench_split_text_two_messages():
+    text = lyrics_services._clean_lyrics(_genius_page(random.Random(3), 14))
+    return lambda: utils.split_text(text)
+
+
+@benchmark("localization_get_text")
+def bench_get_text():
+    return lambda: localization.get_text("searching", lang="ru", query="Artist - Song")
+
+
+@benchmark("title_parse")
+def bench_title_parse():
+    content = json.dumps({"artist": "Survivor", "title": "Eye of the Tiger"})
+    response = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+    )
+
+    async def create(**kwargs):
+        return response
+
+    ai_services.openai_client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+
+    async def parse():
+        await ai_services.extract_song_info_with_openai(
+            "Survivor - Eye Of The Tiger (Official HD Video)"
+        )
+
+    return parse
+
+
+def _lyrics_index(songs: int) -> tuple:
+    rng = random.Random(4)
+    rows = {}
+    while len(rows) < songs:
+        artist = _line(rng, rng.randint(1, 2)).title()
+        title = _line(rng, rng.randint(1, 4)).title()
+        rows[(artist, title)] = f"[Verse 1]\n{_line(rng, 30)}"
+    index = LyricsIndex(os.path.join(_SCRATCH, f"index-{songs}.sqlite3"))
+    index.add_many(
+        (artist, title, lyrics, "bench") for (artist, title), lyrics in rows.items()
+    )
+    return index, list(rows)
+
+
+@benchmark("search_ranking_fuzzy")
+def bench_search_ranking():
+    index, names = _lyrics_index(5000)
+    rng = random.Random(5)
+    queries = []
+    for artist, title in rng.sample(names, 50):
+        # Drop a letter so the exact-key lookup misses and candidates get ranked.
+        position = rng.randrange(len(title))
+        queries.append((artist, title[:position] + title[position + 1 :]))
+    position = [0]
+
+    def lookup():
+        artist, title = queries[position[0] % len(queries)]
+        position[0] += 1
+        index.lookup(artist, title)
+
+    return lookup
+
+
+@benchmark("search_exact")
+def bench_search_exact():
+    index, names = _lyrics_index(5000)
+    artist, title = names[len(names) // 2]
+    return lambda: index.lookup(artist, title)
+
+
+@benchmark("cache_lookup")
+def bench_cache_lookup():
+    lyrics_cache = cache.TTLCache(maxsize=1000, ttl=3600)
+    keys = [
+        lyrics_services._cache_key(f"artist {i}", f"title {i}") for i in range(1000)
+    ]
+    for key in keys:
+        lyrics_cache.set(key, "lyrics")
+    position = [0]
+
+    def lookup():
+        position[0] += 1
+        lyrics_cache.get(keys[position[0] % 1000])
+        lyrics_cache.get(("missing", "key"))
+
+    return lookup
+
+
+@benchmark("download_pipeline_overhead")
+def bench_download_pipeline():
+    """Workspace, job submission, download steps and title parsing, with
+    yt-dlp, ffmpeg and OpenAI replaced by instant fakes."""
+    bench_title_parse()
+    metadata = json.dumps({"title": "Survivor - Eye Of The Tiger"})
+
+    async def fake_run(command, timeout):
+        if "--dump-json" in command:
+            return metadata
+        if command[0] == "ffmpeg":
+            target = command[-1]
+        else:
+            template = command[command.index("--output") + 1]
+            target = os.path.join(os.path.dirname(template), "Song.webm")
+        with open(target, "wb") as f:
+            f.write(b"\0" * 1024)
+        return ""
+
+    downloader._run = fake_run
+    manager = workspace.get_manager()
+
+    async def download():
+        async with manager.workspace() as song_workspace:
+            await jobs.download_song("https://youtu.be/x", song_workspace.path)
+
+    return download
+
+
+def _quiet_logging() -> None:
+    """Keep the real logging pipeline, writing to /dev/null."""
+    logging_setup.configure(stream=open(os.devnull, "w"))
+
+
+def _timer(function, loop):
+    """Return ``run(loops) -> seconds`` for a sync or async benchmark."""
+    if asyncio.iscoroutinefunction(function):
+
+        async def batch(loops):
+            start = time.perf_counter()
+            for _ in range(loops):
+                await function()
+            return time.perf_counter() - start
+
+        return lambda loops: loop.run_until_complete(batch(loops))
+
+    def run(loops):
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        return time.perf_counter() - start
+
+    return run
+
+
+def measure(function, loop, repeats: int = 7) -> dict:
+    run = _timer(function, loop)
+    loops = 1
+    while run(loops) < MIN_REPEAT_SECONDS:
+        loops *= 2
+    samples = [run(loops) / loops * 1e6 for _ in range(repeats)]
+    return {
+        "median_us": round(statistics.median(samples), 3),
+        "min_us": round(min(samples), 3),
+        "stdev_us": round(statistics.stdev(samples), 3) if repeats > 1 else 0.0,
+        "loops": loops,
+        "repeats": repeats,
+    }
+
+
+def run_suite(pattern: str = None, repeats: int = 7) -> dict:
+    _quiet_logging()
+    loop = asyncio.new_event_loop()
+    results = {}
+    try:
+        for name, setup in BENCHMARKS.items():
+            if pattern and pattern not in name:
+                continue
+            results[name] = measure(setup(), loop, repeats)
+    finally:
+        loop.close()
+    return {
+        "python": platform.python_version(),
+        "machine": f"{platform.system()}-{platform.machine()}",
+        "benchmarks": results,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Return ``(name, baseline_us, now_us)`` for every regressed benchmark.
+
+    Benchmarks the baseline does not have are reported and skipped.
+    """
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if not base:
+            print(f"note: {name} is not in the baseline, not compared")
+            continue
+        if result["min_us"] > base["min_us"] * (1 + threshold):
+            regressions.append((name, base["min_us"], result["min_us"]))
+    return regressions
+
+
+def _repeats(value: str) -> int:
+    repeats = int(value)
+    if repeats < 2:
+        raise argparse.ArgumentTypeError("needs at least 2 repeats for a stdev")
+    return repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", help="only run benchmarks containing this")
+    parser.add_argument("--repeats", type=_repeats, default=7)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--save", help="store the results as a new baseline")
+    parser.add_argument("--compare", help="baseline to check the results against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    results = run_suite(args.filter, args.repeats)
+    for name, result in results["benchmarks"].items():
+        print(
+            f"{name:>28}: median {result['median_us']:10.2f}us  "
+            f"min {result['min_us']:10.2f}us  ({result['loops']} loops)"
+        )
+    for path in (args.json, args.save):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+                f.write("\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("python") != results["python"]:
+            print(
+                f"warning: baseline recorded on Python {baseline.get('python')}, "
+                f"running {results['python']}"
+            )
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after in regressions:
+            print(
+                f"REGRESSION {name}: {before:.2f}us -> {after:.2f}us "
+                f"(+{after / before - 1:.0%}, threshold {args.threshold:.0%})"
+            )
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
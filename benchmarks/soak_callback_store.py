@@ -0,0 +1,79 @@
+"""Soak-test the callback payload store and report its memory over time.
+
+Usage:
+    python benchmarks/soak_callback_store.py [--puts 1000000] [--chats 50000]
+
+Simulates songs being sent to many chats, with a fraction of the "Get
+Lyrics" buttons pressed, and prints the store's own size estimate next to
+the traced Python heap and the database file every ``--report`` puts. All
+of them should level off once the store is full.
+"""
+
+import os
+import sys
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from music_wizard_lib.callbacks import CallbackStore  # noqa: E402
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--puts", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=50_000)
+    parser.add_argument("--press-rate", type=float, default=0.3)
+    parser.add_argument("--report", type=int, default=100_000)
+    parser.add_argument(
+        "--puts-per-second", type=float, default=20, help="Simulated send rate."
+    )
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    clock = SimulatedClock()
+    path = os.path.join(tempfile.mkdtemp(), "callbacks.sqlite3")
+    store = CallbackStore(path, timer=clock)
+    recent = []
+    tracemalloc.start()
+    print(
+        f"{'puts':>10} {'entries':>8} {'chats':>7} {'store KiB':>10} "
+        f"{'heap KiB':>9} {'file KiB':>9}"
+    )
+    for step in range(1, args.puts + 1):
+        clock.now = step / args.puts_per_second
+        chat_id = rng.randrange(args.chats)
+        recent.append(
+            (store.put(chat_id, f"Artist {step % 5000}", f"Title {step}"), chat_id)
+        )
+        if rng.random() < args.press_rate:
+            store.pop(*recent.pop(rng.randrange(len(recent))))
+        if len(recent) > 10_000:
+            del recent[:5_000]
+        if step % args.report == 0:
+            stats = store.stats()
+            heap, _ = tracemalloc.get_traced_memory()
+            size = sum(
+                os.path.getsize(path + suffix)
+                for suffix in ("", "-wal")
+                if os.path.exists(path + suffix)
+            )
+            print(
+                f"{step:>10} {stats['entries']:>8} {stats['chats']:>7} "
+                f"{stats['bytes'] / 1024:>10.0f} {heap / 1024:>9.0f} "
+                f"{size / 1024:>9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,20 @@
-import os
+import time
 import logging
-import uuid
-import shutil
 import asyncio
+import sqlite3
+import functools
+import threading
 
 from telegram import (
     Update,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
+    InlineQueryResultCachedAudio,
+    InlineQueryResultsButton,
     ReplyKeyboardRemove,
 )
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     ContextTypes,
     CommandHandler,
@@ -18,17 +22,34 @@ from telegram.ext import (
     filters,
     CallbackQueryHandler,
     ConversationHandler,
+    InlineQueryHandler,
 )
 
 # Import from your new library
 from music_wizard_lib import (
     config,
+    callbacks,
+    catalog,
+    executors,
+    http_server,
     ai_services,
     lyrics_services,
     youtube_services,
-    downloader,
+    jobs,
     utils,
     localization,
+    logging_setup,
+    metrics,
+    pager,
+    persistence,
+    playlist_jobs,
+    playlist_prefetch,
+    profiler,
+    rate_limiter,
+    telegram_http,
+    tracing,
+    webhook,
+    workspace,
 )
 
 logger = logging.getLogger(__name__)
@@ -77,6 +98,7 @@ def build_main_menu_keyboard(lang: str) -> InlineKeyboardMarkup:
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the conversation by asking the user to choose a language."""
     context.user_data.clear()
+    playlist_prefetch.cancel(update.effective_user.id)
     keyboard = [
         [
             InlineKeyboardButton(
@@ -113,6 +135,7 @@ async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Shows the main menu, used as a fallback to return to the start."""
     query = update.callback_query
     await query.answer()
+    playlist_prefetch.cancel(update.effective_user.id)
     lang = get_lang(context)
     reply_markup = build_main_menu_keyboard(lang)
     await query.edit_message_text(
@@ -124,6 +147,12 @@ async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancels the current operation and ends the conversation."""
     lang = get_lang(context)
+    playlist_prefetch.cancel(update.effective_user.id)
+    store = playlist_jobs.get_store()
+    for job_id in await asyncio.to_thread(
+        store.running_jobs, update.effective_chat.id
+    ):
+        await cancel_playlist_job(job_id)
     await update.message.reply_text(
         localization.get_text("cancelled", lang=lang),
         reply_markup=ReplyKeyboardRemove(),
@@ -131,6 +160,36 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return ConversationHandler.END
 
 
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin only: sample the running bot and send the hot stacks as a file.
+
+    Usage: /profile [seconds]
+    """
+    lang = get_lang(context)
+    seconds = config.PROFILE_DEFAULT_SECONDS
+    if context.args:
+        try:
+            seconds = float(context.args[0])
+        except ValueError:
+            pass
+    seconds = max(1, min(seconds, config.PROFILE_MAX_SECONDS))
+    await update.message.reply_text(
+        localization.get_text("profile_started", lang=lang, seconds=f"{seconds:g}")
+    )
+    try:
+        # Sampled from a thread so the event loop keeps running meanwhile.
+        profile = await asyncio.to_thread(profiler.sample, seconds)
+    except profiler.ProfilerBusyError:
+        await update.message.reply_text(
+            localization.get_text("profile_busy", lang=lang)
+        )
+        return
+    await update.message.reply_document(
+        document=profiler.report(profile).encode(),
+        filename=f"profile-{time.strftime('%Y%m%d-%H%M%S')}.txt",
+    )
+
+
 # --- Single Song Download Flow ---
 
 
@@ -151,6 +210,8 @@ async def handle_youtube_link(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     """Processes a link or song name, sends the song, and asks about lyrics."""
+    if await refuse_while_draining(update, context):
+        return HANDLE_LINK
     lang = get_lang(context)
     text = update.message.text.strip()
 
@@ -164,15 +225,16 @@ async def handle_youtube_link(
             localization.get_text("searching", lang=lang, query=text)
         )
         try:
-            youtube = await asyncio.to_thread(
-                youtube_services.get_authenticated_service
+            youtube = await executors.run(
+                "youtube", youtube_services.get_authenticated_service
             )
             if not youtube:
                 await update.message.reply_text(
                     localization.get_text("auth_error", lang=lang)
                 )
                 return HANDLE_LINK
-            video_id = await asyncio.to_thread(
+            video_id = await executors.run(
+                "youtube",
                 youtube_services.search_for_song_on_youtube,
                 youtube,
                 {"title": text, "artist": "# "},
@@ -184,7 +246,7 @@ async def handle_youtube_link(
                 return HANDLE_LINK
             text = f"https://www.youtube.com/watch?v={video_id}"
         except Exception as e:
-            logger.error(f"Error searching for song: {e}", exc_info=True)
+            logger.error("Error searching for song: %s", e, exc_info=True)
             await update.message.reply_text(
                 localization.get_text("search_error", lang=lang)
             )
@@ -194,8 +256,7 @@ async def handle_youtube_link(
     url = text
 
     chat_id = update.effective_chat.id
-    download_folder = f"temp_{uuid.uuid4()}"
-    os.makedirs(download_folder, exist_ok=True)
+    song_workspace = None
 
     processing_message = await update.message.reply_text(
         localization.get_text("link_received", lang=lang)
@@ -207,16 +268,12 @@ async def handle_youtube_link(
             chat_id=chat_id,
             message_id=processing_message.message_id,
         )
-        metadata, audio_filepath = await downloader.download_song_from_youtube(
-            url, download_folder
-        )
-
-        video_title = metadata.get("title", "Unknown Title")
-        openai_info = await ai_services.extract_song_info_with_openai(video_title)
-        song_title = openai_info.get("title") or metadata.get("track") or video_title
-        song_artist = (
-            openai_info.get("artist") or metadata.get("artist") or "Unknown Artist"
-        )
+        song_workspace = await workspace.get_manager().acquire()
+        track = await jobs.download_song(url, song_workspace.path)
+        song_title = track["title"]
+        song_artist = track["artist"]
+        # Warm the lyrics cache while the audio uploads.
+        lyrics_services.prefetch_lyrics(song_artist, song_title)
 
         await context.bot.edit_message_text(
             text=localization.get_text("download_complete", lang=lang),
@@ -224,22 +281,17 @@ async def handle_youtube_link(
             message_id=processing_message.message_id,
         )
 
-        with open(audio_filepath, "rb") as audio_file:
-            await context.bot.send_audio(
-                chat_id=chat_id,
-                audio=audio_file,
-                filename=os.path.basename(audio_filepath),
-                caption=f"{song_title} by {song_artist}",
-                title=song_title,
-                performer=song_artist,
-            )
+        message = await utils.send_audio_track(context.bot, chat_id, track)
+        await remember_song(track, message)
 
         await context.bot.delete_message(
             chat_id=chat_id, message_id=processing_message.message_id
         )
 
-        callback_data = f"lyrics_{uuid.uuid4()}"
-        context.chat_data[callback_data] = {"artist": song_artist, "title": song_title}
+        callback_id = await asyncio.to_thread(
+            callbacks.get_lyrics_requests().put, chat_id, song_artist, song_title
+        )
+        callback_data = f"lyrics_{callback_id}"
 
         keyboard = [
             [
@@ -261,7 +313,7 @@ async def handle_youtube_link(
         )
 
     except Exception as e:
-        logger.error(f"Error processing link {url}: {e}", exc_info=True)
+        logger.error("Error processing link %s: %s", url, e, exc_info=True)
         await context.bot.edit_message_text(
             text=localization.get_text("error", lang=lang, error=e),
             chat_id=chat_id,
@@ -269,8 +321,8 @@ async def handle_youtube_link(
         )
         return await start(update, context)  # On error, restart the conversation
     finally:
-        if os.path.exists(download_folder):
-            shutil.rmtree(download_folder, ignore_errors=True)
+        if song_workspace is not None:
+            await song_workspace.release()
 
     # Transition to the state where we wait for the user to click a button
     return AWAITING_LYRICS_CHOICE
@@ -282,8 +334,11 @@ async def lyrics_button_callback(
     """Handles the 'Get Lyrics' button press and returns to the main menu state."""
     query = update.callback_query
     await query.answer()
-    callback_data_key = query.data
-    song_info = context.chat_data.get(callback_data_key)
+    song_info = await asyncio.to_thread(
+        callbacks.get_lyrics_requests().pop,
+        query.data[len("lyrics_") :],
+        query.message.chat_id,
+    )
 
     lang = get_lang(context)
     await query.edit_message_text(
@@ -296,21 +351,18 @@ async def lyrics_button_callback(
         )
         return await main_menu(update, context)
 
-    lyrics_text = await lyrics_services.get_lyrics(
-        song_info["artist"], song_info["title"]
-    )
+    artist, title = song_info
+    lyrics_text = await lyrics_services.get_lyrics(artist, title)
     full_text = localization.get_text(
         "lyrics_header",
         lang=lang,
-        title=song_info["title"],
-        artist=song_info["artist"],
+        title=title,
+        artist=artist,
     ) + f"{lyrics_text}"
 
     # Send lyrics as a new message. edit_message_text above keeps the old message
-    # as feedback.
-    await utils.send_long_message(context.bot, query.message.chat_id, full_text)
-
-    del context.chat_data[callback_data_key]
+    # as feedback. Long lyrics get one message with page buttons.
+    await pager.send_paginated_message(context.bot, query.message.chat_id, full_text)
 
     # Show main menu again and return to start state
     reply_markup = build_main_menu_keyboard(lang)
@@ -322,6 +374,84 @@ async def lyrics_button_callback(
     return CHOOSE_ACTION
 
 
+async def lyrics_page_callback(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """Turns the page of a paginated lyrics message in place."""
+    query = update.callback_query
+    if query.data == pager.NOOP_CALLBACK:
+        await query.answer()
+        return
+    page = await asyncio.to_thread(pager.get_page, query.data)
+    if page is None:
+        await query.answer(
+            localization.get_text("request_expired", lang=get_lang(context)),
+            show_alert=True,
+        )
+        await query.edit_message_reply_markup(reply_markup=None)
+        return
+    await query.answer()
+    text, reply_markup = page
+    await query.edit_message_text(text=text, reply_markup=reply_markup)
+
+
+# --- Inline Mode ---
+
+
+async def remember_song(track: dict, message) -> None:
+    """Add a sent song to the catalog that inline queries are served from."""
+    song_catalog = catalog.get_catalog()
+    if song_catalog is None or message is None or not message.audio:
+        return
+    try:
+        await asyncio.to_thread(
+            song_catalog.add,
+            track["artist"],
+            track["title"],
+            message.audio.file_id,
+        )
+    except sqlite3.Error as e:
+        logger.error("Could not add '%s' to the catalog: %s", track["title"], e)
+
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answers "@bot <song>" with matching songs already sent by the bot."""
+    query = update.inline_query
+    song_catalog = catalog.get_catalog()
+    songs = []
+    if song_catalog is not None:
+        with metrics.stage("inline_search"):
+            songs = await asyncio.to_thread(
+                song_catalog.search, query.query, config.INLINE_RESULTS_LIMIT
+            )
+    results = [
+        InlineQueryResultCachedAudio(
+            id=str(song["id"]),
+            audio_file_id=song["file_id"],
+            caption=f"{song['title']} by {song['artist']}",
+        )
+        for song in songs
+    ]
+    button = None
+    if not results:
+        button = InlineQueryResultsButton(
+            text=localization.get_text("inline_not_found", lang=get_lang(context)),
+            start_parameter="inline",
+        )
+    await query.answer(results, cache_time=config.INLINE_CACHE_TIME, button=button)
+
+
+async def fill_catalog(application) -> None:
+    """Seed an empty catalog with the songs sent by earlier playlist jobs."""
+    song_catalog = catalog.get_catalog()
+    if song_catalog is None or await asyncio.to_thread(len, song_catalog):
+        return
+    songs = await asyncio.to_thread(playlist_jobs.get_store().sent_songs)
+    added = await asyncio.to_thread(song_catalog.add_many, songs)
+    if added:
+        logger.info("Added %s songs from playlist jobs to the catalog", added)
+
+
 # --- AI Playlist Creation Flow ---
 
 
@@ -352,6 +482,8 @@ async def handle_playlist_vibe(
 async def handle_playlist_songs(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
+    if await refuse_while_draining(update, context):
+        return PLAYLIST_SONGS
     try:
         num_songs = int(update.message.text)
         if not 1 <= num_songs <= 69:
@@ -392,6 +524,7 @@ async def handle_playlist_songs(
         )
 
         context.user_data["playlist"]["songs"] = song_list
+        playlist_prefetch.start(update.effective_user.id, song_list)
 
         keyboard = [
             [
@@ -442,6 +575,8 @@ async def handle_playlist_title(
 async def handle_playlist_desc_and_create(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
+    if await refuse_while_draining(update, context):
+        return PLAYLIST_DESC
     description = update.message.text
     if description.lower() in ["none", "no", "skip"]:
         description = localization.get_text(
@@ -457,78 +592,147 @@ async def handle_playlist_desc_and_create(
     )
 
     playlist_data = context.user_data.get("playlist", {})
-    song_list = playlist_data.get("songs", [])
+    job_id = await asyncio.to_thread(
+        playlist_jobs.get_store().create,
+        "upload",
+        update.effective_chat.id,
+        lang,
+        playlist_data.get("songs", []),
+        title=playlist_data.get("title"),
+        description=description,
+    )
+    prefetch = await take_playlist_prefetch(update.effective_user.id, job_id)
+    if prefetch is not None:
+        # Uploads only need the video ids.
+        prefetch.release()
+    start_playlist_job(context.application, job_id, "upload")
+    return CHOOSE_ACTION
+
+
+async def run_playlist_upload(bot, job_id: str) -> None:
+    """Create the job's YouTube playlist and add its songs, resuming if needed."""
+    store = playlist_jobs.get_store()
+    job = await asyncio.to_thread(store.get, job_id)
+    chat_id, lang, song_list = job["chat_id"], job["lang"], job["songs"]
     try:
-        youtube = await asyncio.to_thread(youtube_services.get_authenticated_service)
+        youtube = await executors.run(
+            "youtube", youtube_services.get_authenticated_service
+        )
         if not youtube:
-            await update.message.reply_text(
-                localization.get_text("auth_error", lang=lang)
+            await asyncio.to_thread(store.update_job, job_id, state="failed")
+            await bot.send_message(
+                chat_id=chat_id, text=localization.get_text("auth_error", lang=lang)
             )
-            return CHOOSE_ACTION
+            return
 
-        playlist_id = await asyncio.to_thread(
-            youtube_services.create_youtube_playlist,
-            youtube,
-            playlist_data.get("title"),
-            playlist_data.get("description"),
-        )
+        playlist_id = job["playlist_id"]
         if not playlist_id:
-            await update.message.reply_text(
-                localization.get_text("create_fail", lang=lang)
+            playlist_id = await executors.run(
+                "youtube",
+                youtube_services.create_youtube_playlist,
+                youtube,
+                job["title"],
+                job["description"],
             )
-            return CHOOSE_ACTION
+            if not playlist_id:
+                await asyncio.to_thread(store.update_job, job_id, state="failed")
+                await bot.send_message(
+                    chat_id=chat_id,
+                    text=localization.get_text("create_fail", lang=lang),
+                )
+                return
+            await asyncio.to_thread(store.update_job, job_id, playlist_id=playlist_id)
 
-        progress_message = await update.message.reply_text(
-            localization.get_text("playlist_created", lang=lang, count=len(song_list))
+        progress_message = await bot.send_message(
+            chat_id=chat_id,
+            text=localization.get_text(
+                "playlist_created", lang=lang, count=len(song_list)
+            ),
+            reply_markup=build_cancel_keyboard(job_id, lang),
         )
 
-        for i, song in enumerate(song_list):
-            video_id = await asyncio.to_thread(
-                youtube_services.search_for_song_on_youtube, youtube, song
-            )
-            if video_id:
+        for song in song_list:
+            if song["status"] in playlist_jobs.FINISHED_SONG_STATUSES:
+                continue
+            await raise_if_cancelled(store, job_id)
+            video_id = song["video_id"]
+            if not video_id:
+                video_id = await executors.run(
+                    "youtube",
+                    youtube_services.search_for_song_on_youtube,
+                    youtube,
+                    song,
+                )
                 await asyncio.to_thread(
+                    store.update_song,
+                    job_id,
+                    song["position"],
+                    status="resolved" if video_id else "not_found",
+                    video_id=video_id,
+                )
+            if video_id:
+                item_id = await executors.run(
+                    "youtube",
                     youtube_services.add_video_to_youtube_playlist,
                     youtube,
                     playlist_id,
                     video_id,
                 )
-                await context.bot.edit_message_text(
+                await asyncio.to_thread(
+                    store.update_song,
+                    job_id,
+                    song["position"],
+                    status="inserted" if item_id else "failed",
+                    playlist_item_id=item_id,
+                )
+                await bot.edit_message_text(
                     text=localization.get_text(
                         "added_song",
                         lang=lang,
-                        num=i + 1,
+                        num=song["position"] + 1,
                         total=len(song_list),
                         title=song["title"],
                     ),
-                    chat_id=update.effective_chat.id,
+                    chat_id=chat_id,
                     message_id=progress_message.message_id,
+                    reply_markup=build_cancel_keyboard(job_id, lang),
                 )
             await asyncio.sleep(1)
 
         playlist_url = f"https://www.youtube.com/playlist?list={playlist_id}"
-        await context.bot.edit_message_text(
+        await bot.edit_message_text(
             text=localization.get_text("playlist_ready", lang=lang, url=playlist_url),
-            chat_id=update.effective_chat.id,
+            chat_id=chat_id,
             message_id=progress_message.message_id,
         )
+        await asyncio.to_thread(store.update_job, job_id, state="done")
 
+    except asyncio.CancelledError:
+        if not await cancelled_by_user(store, job_id):
+            raise
+        await bot.send_message(
+            chat_id=chat_id,
+            text=localization.get_text("playlist_cancelled", lang=lang),
+        )
     except FileNotFoundError:
-        await update.message.reply_text(
-            localization.get_text("auth_error", lang=lang)
+        await asyncio.to_thread(store.update_job, job_id, state="failed")
+        await bot.send_message(
+            chat_id=chat_id, text=localization.get_text("auth_error", lang=lang)
         )
     except Exception as e:
-        logger.error(f"Playlist creation failed: {e}", exc_info=True)
-        await update.message.reply_text(
-            localization.get_text("playlist_unexpected_error", lang=lang, error=e)
+        logger.error("Playlist creation failed: %s", e, exc_info=True)
+        await asyncio.to_thread(store.update_job, job_id, state="failed")
+        await bot.send_message(
+            chat_id=chat_id,
+            text=localization.get_text("playlist_unexpected_error", lang=lang, error=e),
         )
 
     reply_markup = build_main_menu_keyboard(lang)
-    await update.message.reply_text(
-        localization.get_text("next_action", lang=lang),
+    await bot.send_message(
+        chat_id=chat_id,
+        text=localization.get_text("next_action", lang=lang),
         reply_markup=reply_markup,
     )
-    return CHOOSE_ACTION
 
 
 async def handle_playlist_upload(
@@ -546,127 +750,664 @@ async def handle_playlist_upload(
 async def handle_playlist_download(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
+    if await refuse_while_draining(update, context):
+        return PLAYLIST_DECISION
     query = update.callback_query
     await query.answer()
     lang = get_lang(context)
     playlist_data = context.user_data.get("playlist", {})
-    song_list = playlist_data.get("songs", [])
+    job_id = await asyncio.to_thread(
+        playlist_jobs.get_store().create,
+        "download",
+        query.message.chat_id,
+        lang,
+        playlist_data.get("songs", []),
+    )
+    prefetch = await take_playlist_prefetch(update.effective_user.id, job_id)
+    start_playlist_job(
+        context.application,
+        job_id,
+        "download",
+        query.message.message_id,
+        prefetched=prefetch.tracks if prefetch is not None else None,
+    )
+    return CHOOSE_ACTION
 
-    try:
-        youtube = await asyncio.to_thread(youtube_services.get_authenticated_service)
-        if not youtube:
-            await query.edit_message_text(
-                localization.get_text("auth_error", lang=lang)
+
+async def run_playlist_download(
+    bot, job_id: str, message_id: int = None, prefetched: dict = None
+) -> None:
+    """Download the job's songs and send them to its chat, resuming if needed.
+
+    Progress is shown by editing ``message_id``, or a new message if None.
+    ``prefetched`` maps song positions to tracks already downloaded.
+    """
+    store = playlist_jobs.get_store()
+    prefetched = dict(prefetched or {})
+    job = await asyncio.to_thread(store.get, job_id)
+    chat_id, lang, song_list = job["chat_id"], job["lang"], job["songs"]
+    # Downloaded tracks wait here until a whole media group can be sent.
+    pending_tracks = []
+
+    # Workspace of the song being downloaded, until it joins pending_tracks.
+    song_workspace = None
+
+    async def show_progress(text, cancellable=False):
+        nonlocal message_id
+        reply_markup = build_cancel_keyboard(job_id, lang) if cancellable else None
+        if message_id is None:
+            message = await bot.send_message(
+                chat_id=chat_id, text=text, reply_markup=reply_markup
+            )
+            message_id = message.message_id
+        else:
+            await bot.edit_message_text(
+                text=text,
+                chat_id=chat_id,
+                message_id=message_id,
+                reply_markup=reply_markup,
             )
-            return CHOOSE_ACTION
 
-        progress_message = await query.edit_message_text(
-            localization.get_text(
-                "downloading_playlist",
-                lang=lang,
-                num=1,
-                total=len(song_list),
-                title=song_list[0]["title"] if song_list else "",
+    async def deliver_pending():
+        if config.PLAYLIST_DELIVERY == "media_group":
+            results = await utils.send_audio_group(bot, chat_id, pending_tracks)
+        else:
+            results = await utils.send_audio_tracks(bot, chat_id, pending_tracks)
+        for track, message in zip(pending_tracks, results):
+            if message is None:
+                status, file_id = "send_failed", None
+            else:
+                status = "sent"
+                file_id = message.audio.file_id if message.audio else None
+                await remember_song(track, message)
+            await asyncio.to_thread(
+                store.update_song,
+                job_id,
+                track["position"],
+                status=status,
+                file_id=file_id,
             )
+            await track["workspace"].release()
+        pending_tracks.clear()
+
+    try:
+        youtube = await executors.run(
+            "youtube", youtube_services.get_authenticated_service
         )
+        if not youtube:
+            await asyncio.to_thread(store.update_job, job_id, state="failed")
+            await show_progress(localization.get_text("auth_error", lang=lang))
+            return
 
-        for i, song in enumerate(song_list):
-            if i > 0:
-                await context.bot.edit_message_text(
-                    text=localization.get_text(
-                        "downloading_playlist",
-                        lang=lang,
-                        num=i + 1,
-                        total=len(song_list),
-                        title=song["title"],
-                    ),
-                    chat_id=query.message.chat_id,
-                    message_id=progress_message.message_id,
-                )
-            video_id = await asyncio.to_thread(
-                youtube_services.search_for_song_on_youtube, youtube, song
+        for song in song_list:
+            if song["status"] in playlist_jobs.FINISHED_SONG_STATUSES:
+                continue
+            await raise_if_cancelled(store, job_id)
+            await show_progress(
+                localization.get_text(
+                    "downloading_playlist",
+                    lang=lang,
+                    num=song["position"] + 1,
+                    total=len(song_list),
+                    title=song["title"],
+                ),
+                cancellable=True,
             )
+            video_id = song["video_id"]
             if not video_id:
-                await context.bot.send_message(
-                    chat_id=query.message.chat_id,
-                    text=localization.get_text(
-                        "song_not_found", lang=lang, title=song["title"]
-                    ),
-                )
-                continue
-
-            url = f"https://www.youtube.com/watch?v={video_id}"
-            download_folder = f"temp_{uuid.uuid4()}"
-            os.makedirs(download_folder, exist_ok=True)
-            try:
-                metadata, audio_filepath = await downloader.download_song_from_youtube(
-                    url, download_folder
-                )
-                video_title = metadata.get("title", "Unknown Title")
-                openai_info = await ai_services.extract_song_info_with_openai(
-                    video_title
-                )
-                song_title = (
-                    openai_info.get("title") or metadata.get("track") or video_title
+                video_id = await executors.run(
+                    "youtube",
+                    youtube_services.search_for_song_on_youtube,
+                    youtube,
+                    song,
                 )
-                song_artist = (
-                    openai_info.get("artist")
-                    or metadata.get("artist")
-                    or "Unknown Artist"
+                await asyncio.to_thread(
+                    store.update_song,
+                    job_id,
+                    song["position"],
+                    status="resolved" if video_id else "not_found",
+                    video_id=video_id,
                 )
+                if not video_id:
+                    continue
 
-                with open(audio_filepath, "rb") as audio_file:
-                    await context.bot.send_audio(
-                        chat_id=query.message.chat_id,
-                        audio=audio_file,
-                        filename=os.path.basename(audio_filepath),
-                        caption=f"{song_title} by {song_artist}",
-                        title=song_title,
-                        performer=song_artist,
+            url = f"https://www.youtube.com/watch?v={video_id}"
+            if song["position"] in prefetched:
+                pending_tracks.append(prefetched.pop(song["position"]))
+            else:
+                try:
+                    song_workspace = await workspace.get_manager().acquire()
+                    track = await jobs.download_song(url, song_workspace.path)
+                    # Only what the file really takes stays reserved while
+                    # it waits.
+                    await song_workspace.settle()
+                    track["workspace"] = song_workspace
+                    track["position"] = song["position"]
+                    pending_tracks.append(track)
+                except Exception as e:
+                    logger.error("Failed to download %s: %s", url, e, exc_info=True)
+                    await asyncio.to_thread(
+                        store.update_song, job_id, song["position"], status="failed"
                     )
-            except Exception as e:
-                logger.error(f"Failed to download {url}: {e}", exc_info=True)
-                await context.bot.send_message(
-                    chat_id=query.message.chat_id,
-                    text=localization.get_text(
-                        "download_song_fail", lang=lang, title=song["title"]
-                    ),
-                )
-            finally:
-                if os.path.exists(download_folder):
-                    shutil.rmtree(download_folder, ignore_errors=True)
+                    if song_workspace is not None:
+                        await song_workspace.release()
+                song_workspace = None
+
+            if config.PLAYLIST_DELIVERY != "media_group" or (
+                len(pending_tracks) >= config.MEDIA_GROUP_SIZE
+            ):
+                await deliver_pending()
+
+        await deliver_pending()
+        failures = playlist_failures(await asyncio.to_thread(store.get, job_id))
+        if failures:
+            await utils.send_long_message(
+                bot,
+                chat_id,
+                localization.get_text(
+                    "playlist_failures", lang=lang, failures="\n".join(failures)
+                ),
+            )
 
-        await context.bot.edit_message_text(
-            text=localization.get_text("songs_sent", lang=lang),
-            chat_id=query.message.chat_id,
-            message_id=progress_message.message_id,
-        )
+        await show_progress(localization.get_text("songs_sent", lang=lang))
+        await asyncio.to_thread(store.update_job, job_id, state="done")
 
+    except asyncio.CancelledError:
+        if not await cancelled_by_user(store, job_id):
+            raise
+        await show_progress(localization.get_text("playlist_cancelled", lang=lang))
     except Exception as e:
-        logger.error(f"Download playlist failed: {e}", exc_info=True)
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
+        logger.error("Download playlist failed: %s", e, exc_info=True)
+        await asyncio.to_thread(store.update_job, job_id, state="failed")
+        await bot.send_message(
+            chat_id=chat_id,
             text=localization.get_text("playlist_unexpected_error", lang=lang, error=e),
         )
+    finally:
+        if song_workspace is not None:
+            await song_workspace.release()
+        for track in pending_tracks + list(prefetched.values()):
+            await track["workspace"].release()
 
     reply_markup = build_main_menu_keyboard(lang)
-    await context.bot.send_message(
-        chat_id=query.message.chat_id,
+    await bot.send_message(
+        chat_id=chat_id,
         text=localization.get_text("next_action", lang=lang),
         reply_markup=reply_markup,
     )
-    return CHOOSE_ACTION
 
 
-# === Main Bot Setup ===
+async def take_playlist_prefetch(user_id: int, job_id: str):
+    """Seed a new playlist job with the video ids prefetched for its user.
 
+    Returns the prefetch, whose downloaded tracks the caller now owns, or
+    None when there was none.
+    """
+    prefetch = playlist_prefetch.take(user_id)
+    if prefetch is not None:
+        await asyncio.to_thread(prefetch.seed, playlist_jobs.get_store(), job_id)
+    return prefetch
 
-def main():
-    if not ai_services.openai_client:
-        logger.error("OpenAI client not initialized. The bot cannot start.")
+
+# Localization keys for songs a playlist download could not deliver.
+SONG_FAILURE_KEYS = {
+    "not_found": "song_not_found",
+    "failed": "download_song_fail",
+    "send_failed": "send_song_fail",
+}
+
+
+def playlist_failures(job: dict) -> list:
+    return [
+        localization.get_text(
+            SONG_FAILURE_KEYS[song["status"]], lang=job["lang"], title=song["title"]
+        )
+        for song in job["songs"]
+        if song["status"] in SONG_FAILURE_KEYS
+    ]
+
+
+# Playlist jobs running in this process, by job id.
+playlist_tasks = {}
+
+PLAYLIST_CANCEL_PREFIX = "cancel_job_"
+
+
+def build_cancel_keyboard(job_id: str, lang: str) -> InlineKeyboardMarkup:
+    button = InlineKeyboardButton(
+        localization.get_text("cancel_playlist", lang=lang),
+        callback_data=f"{PLAYLIST_CANCEL_PREFIX}{job_id}",
+    )
+    return InlineKeyboardMarkup([[button]])
+
+
+async def cancel_playlist_job(job_id: str, chat_id: int = None) -> bool:
+    """Mark a running playlist job cancelled and stop it if it runs here.
+
+    A job running in another process stops before its next song. Returns
+    ``False`` if the job was not running (or not in ``chat_id``).
+    """
+    cancelled = await asyncio.to_thread(
+        playlist_jobs.get_store().cancel, job_id, chat_id
+    )
+    task = playlist_tasks.get(job_id)
+    if cancelled and task is not None:
+        task.cancel()
+    return cancelled
+
+
+async def raise_if_cancelled(store, job_id: str) -> None:
+    if await asyncio.to_thread(store.get_state, job_id) == "cancelled":
+        raise asyncio.CancelledError
+
+
+async def cancelled_by_user(store, job_id: str) -> bool:
+    """Tell a user's cancel apart from the application shutting down."""
+    if await asyncio.to_thread(store.get_state, job_id) != "cancelled":
+        return False
+    asyncio.current_task().uncancel()
+    return True
+
+
+async def playlist_cancel_callback(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """Stops the playlist job whose progress message was tapped."""
+    query = update.callback_query
+    job_id = query.data[len(PLAYLIST_CANCEL_PREFIX) :]
+    if await cancel_playlist_job(job_id, query.message.chat_id):
+        await query.answer()
         return
+    await query.answer(
+        localization.get_text("request_expired", lang=get_lang(context)),
+        show_alert=True,
+    )
+
+
+async def _traced_job(coroutine, kind: str, job_id: str):
+    with tracing.span(f"playlist_{kind}", job_id=job_id):
+        return await coroutine
+
+
+def start_playlist_job(
+    application, job_id: str, kind: str, message_id=None, prefetched=None
+):
+    if kind == "download":
+        coroutine = run_playlist_download(
+            application.bot, job_id, message_id, prefetched
+        )
+    else:
+        coroutine = run_playlist_upload(application.bot, job_id)
+    task = application.create_task(_traced_job(coroutine, kind, job_id))
+    playlist_tasks[job_id] = task
+    task.add_done_callback(lambda _: playlist_tasks.pop(job_id, None))
+    return task
+
+
+async def resume_playlist_jobs(application) -> None:
+    """Pick up playlist jobs left unfinished by a previous run."""
+    store = playlist_jobs.get_store()
+    for job_id in await asyncio.to_thread(store.claim_orphans):
+        job = await asyncio.to_thread(store.get, job_id)
+        logger.info("Resuming %s playlist job %s", job["kind"], job_id)
+        await application.bot.send_message(
+            chat_id=job["chat_id"],
+            text=localization.get_text("playlist_resumed", lang=job["lang"]),
+        )
+        start_playlist_job(application, job_id, job["kind"])
+
+
+# === Graceful Shutdown ===
+
+
+async def refuse_while_draining(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> bool:
+    """Ask the user to come back later when the bot is shutting down."""
+    if not context.application.draining:
+        return False
+    text = localization.get_text("shutting_down", lang=get_lang(context))
+    if update.callback_query:
+        await update.callback_query.answer(text, show_alert=True)
+    else:
+        await update.message.reply_text(text)
+    return True
+
+
+async def drain(application, timeout: float) -> None:
+    """Let running updates and playlist jobs finish for up to ``timeout`` s.
+
+    New downloads and playlists are refused from now on. Whatever still runs
+    at the deadline is cancelled, and its playlist jobs are released in the
+    store for the next process to resume.
+    """
+    application.draining = True
+    playlist_prefetch.cancel_all()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    def running():
+        return set(playlist_tasks.values()) | application.updates_in_flight
+
+    busy = running()
+    if busy:
+        logger.info("Waiting up to %s s for %s running tasks", timeout, len(busy))
+    while busy and loop.time() < deadline:
+        await asyncio.wait(busy, timeout=deadline - loop.time())
+        busy = running()
+    if not busy:
+        return
+
+    interrupted = [
+        job_id for job_id, task in playlist_tasks.items() if not task.done()
+    ]
+    logger.warning("Cancelling %s tasks still running at shutdown", len(busy))
+    for task in busy:
+        task.cancel()
+    await asyncio.gather(*busy, return_exceptions=True)
+
+    store = playlist_jobs.get_store()
+    await asyncio.to_thread(store.release, interrupted)
+    for job_id in interrupted:
+        job = await asyncio.to_thread(store.get, job_id)
+        if job["state"] != "running":
+            continue
+        try:
+            await application.bot.send_message(
+                chat_id=job["chat_id"],
+                text=localization.get_text("playlist_paused", lang=job["lang"]),
+            )
+        except Exception as e:
+            logger.warning(
+                "Could not tell chat %s about the restart: %s", job["chat_id"], e
+            )
 
-    application = ApplicationBuilder().token(config.TELEGRAM_TOKEN).build()
+
+# === Metrics ===
+
+
+def collect_metrics(application) -> None:
+    """Refresh the saturation gauges right before a scrape."""
+    metrics.set_gauges({"playlist_tasks": len(playlist_tasks)})
+    log_stats = logging_setup.stats()
+    if log_stats:
+        metrics.set_gauges({"queued": log_stats.pop("queued")}, "log_")
+        metrics.set_counts(log_stats, "log_")
+    for name, stats in executors.stats().items():
+        metrics.set_gauges(
+            {key: stats[key] for key in ("size", "in_flight", "queued")},
+            f"executor_{name}_",
+        )
+        metrics.set_counts(
+            {"calls": stats["calls"], "wait_seconds": stats["wait_seconds_total"]},
+            f"executor_{name}_",
+        )
+    metrics.set_gauges(
+        {
+            **workspace.get_manager().stats(),
+            "disk_bytes": application.bot_data.get("disk_bytes", 0),
+        },
+        "workspace_",
+    )
+    if config.DOWNLOAD_WORKERS > 0:
+        queue = jobs.get_job_queue()
+        depth = queue.depth()
+        metrics.set_gauges(
+            {
+                "queued": depth.get("queued", 0),
+                "running": depth.get("running", 0),
+                "workers": config.DOWNLOAD_WORKERS,
+                "busy_workers": queue.busy_workers(),
+            },
+            "jobs_",
+        )
+    store_stats = callbacks.get_lyrics_requests().stats()
+    metrics.set_gauges(
+        {name: store_stats[name] for name in ("entries", "chats", "bytes")},
+        "callback_store_",
+    )
+    metrics.set_counts(
+        {name: store_stats[name] for name in ("evicted", "expired")},
+        "callback_store_",
+    )
+    prefetch = lyrics_services.prefetch_stats()
+    metrics.set_gauges({"in_flight": prefetch.pop("in_flight")}, "lyrics_prefetch_")
+    prefetch.pop("hit_rate")
+    metrics.set_counts(prefetch, "lyrics_prefetch_")
+    speculation = playlist_prefetch.stats()
+    metrics.set_gauges({"active": speculation.pop("active")}, "playlist_prefetch_")
+    metrics.set_counts(speculation, "playlist_prefetch_")
+    scheduler = application.bot.rate_limiter
+    if isinstance(scheduler, rate_limiter.OutboundScheduler):
+        metrics.set_counts(scheduler.stats, "telegram_scheduler_")
+    request = application.bot.request
+    if isinstance(request, telegram_http.RoutedRequest):
+        for pool, stats in request.stats().items():
+            metrics.set_gauges(
+                {"in_flight": stats["in_flight"], "queued": stats["queued"]},
+                f"telegram_pool_{pool}_",
+            )
+            metrics.set_counts(
+                {
+                    "requests": stats["requests"],
+                    "wait_seconds": stats["wait_seconds_total"],
+                },
+                f"telegram_pool_{pool}_",
+            )
+
+
+async def measure_disk_usage(application) -> None:
+    """Keep the scratch disk usage for scrapes, measured off the event loop."""
+    manager = workspace.get_manager()
+    while True:
+        application.bot_data["disk_bytes"] = await asyncio.to_thread(
+            manager.disk_usage
+        )
+        await asyncio.sleep(config.METRICS_DISK_INTERVAL)
+
+
+async def start_metrics_server(application) -> None:
+    if not config.METRICS_PORT:
+        return
+    # Every webhook worker serves its own numbers on its own port, so each
+    # one can be scraped as a separate target.
+    port = config.METRICS_PORT + application.bot_data.get("worker_index", 0)
+    server = http_server.HTTPServer(
+        {("GET", "/metrics"): metrics.metrics_route}, config.METRICS_LISTEN, port
+    )
+    await server.start()
+    collector = functools.partial(collect_metrics, application)
+    metrics.REGISTRY.add_collector(collector)
+    disk_task = asyncio.create_task(measure_disk_usage(application))
+    application.bot_data["metrics"] = (server, collector, disk_task)
+    logger.info("Metrics on http://%s:%s/metrics", config.METRICS_LISTEN, server.port)
+
+
+async def stop_metrics_server(application) -> None:
+    server, collector, disk_task = application.bot_data.pop(
+        "metrics", (None, None, None)
+    )
+    if server is not None:
+        disk_task.cancel()
+        metrics.REGISTRY.remove_collector(collector)
+        await server.stop()
+
+
+# === Housekeeping ===
+
+
+def purge_old_rows() -> None:
+    """Delete finished work older than its retention from the SQLite stores."""
+    if config.DOWNLOAD_WORKERS > 0:
+        removed = jobs.get_job_queue().purge(config.JOB_RETENTION)
+        if removed:
+            logger.info("Purged %s finished download jobs", removed)
+    removed = playlist_jobs.get_store().purge(config.PLAYLIST_JOB_RETENTION)
+    if removed:
+        logger.info("Purged %s finished playlist jobs", removed)
+
+
+async def housekeeping() -> None:
+    while True:
+        try:
+            await asyncio.to_thread(purge_old_rows)
+        except Exception as e:
+            logger.error("Housekeeping failed: %s", e, exc_info=True)
+        await asyncio.sleep(config.HOUSEKEEPING_INTERVAL)
+
+
+async def post_init(application) -> None:
+    await start_metrics_server(application)
+    await fill_catalog(application)
+    await resume_playlist_jobs(application)
+    application.bot_data["housekeeping"] = asyncio.create_task(housekeeping())
+
+
+async def post_shutdown(application) -> None:
+    task = application.bot_data.pop("housekeeping", None)
+    if task is not None:
+        task.cancel()
+    await stop_metrics_server(application)
+    executors.shutdown()
+    # Drop download folders that cancelled work may have left behind.
+    workspace.get_manager().clean_orphans()
+
+
+# === Main Bot Setup ===
+
+
+class TracedApplication(Application):
+    """Application that runs every update inside its own trace.
+
+    Stopping it first drains running work, see ``drain``. When several
+    webhook workers share the persisted state, each update reloads the
+    user's conversation state first and writes its changes back at once,
+    since the next update of the same user may reach another process.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.draining = False
+        self.updates_in_flight = set()
+        self.shares_state = config.BOT_MODE == "webhook" and config.WEBHOOK_WORKERS > 1
+
+    async def process_update(self, update: object) -> None:
+        attrs = {}
+        if getattr(update, "update_id", None) is not None:
+            attrs["update_id"] = update.update_id
+        if getattr(update, "effective_chat", None) is not None:
+            attrs["chat_id"] = update.effective_chat.id
+        with tracing.span("update", **attrs):
+            # A task of its own, so that draining can cancel a handler that
+            # overruns without cancelling the update fetcher.
+            task = asyncio.create_task(self._process_shared(update))
+            self.updates_in_flight.add(task)
+            try:
+                await task
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+                await self.notify_interrupted(update)
+            finally:
+                self.updates_in_flight.discard(task)
+
+    async def _process_shared(self, update: object) -> None:
+        if not (self.shares_state and self.persistence):
+            await super().process_update(update)
+            return
+        await self.reload_conversations(update)
+        await super().process_update(update)
+        await self.update_persistence()
+        await self.persistence.write_pending()
+
+    async def reload_conversations(self, update: object) -> None:
+        """Load the conversation states of ``update`` that another process set.
+
+        PTB has no public API for this, so it uses ConversationHandler
+        internals of the pinned PTB release; tests/test_persistence.py checks
+        they are still there.
+        """
+        if not isinstance(update, Update):
+            return
+        for handlers in self.handlers.values():
+            for handler in handlers:
+                if not isinstance(handler, ConversationHandler):
+                    continue
+                if not handler.persistent:
+                    continue
+                try:
+                    key = handler._get_key(update)
+                except RuntimeError:
+                    continue
+                changed, state = await self.persistence.reload_conversation(
+                    handler.name, key
+                )
+                if not changed:
+                    continue
+                # Untracked, so the state is not written straight back.
+                if state is None:
+                    handler._conversations.data.pop(key, None)
+                else:
+                    handler._conversations.update_no_track({key: state})
+
+    async def notify_interrupted(self, update: object) -> None:
+        chat = getattr(update, "effective_chat", None)
+        if chat is None:
+            return
+        user = update.effective_user
+        lang = self.user_data.get(user.id, {}).get("lang", "en") if user else "en"
+        try:
+            await self.bot.send_message(
+                chat_id=chat.id,
+                text=localization.get_text("restart_interrupted", lang=lang),
+            )
+        except Exception as e:
+            logger.warning("Could not tell chat %s about the restart: %s", chat.id, e)
+
+    async def stop(self) -> None:
+        if self.running:
+            await drain(self, config.SHUTDOWN_TIMEOUT)
+        await super().stop()
+
+
+def warm_up_clients() -> None:
+    """Build the API clients the first requests would otherwise wait for.
+
+    Runs in a background thread while the bot connects to Telegram, so
+    startup does not wait for the slow OpenAI and Google imports.
+    """
+    for name, warm_up in (
+        ("OpenAI", ai_services.get_openai_client),
+        ("YouTube", youtube_services.preload),
+        ("Genius", lyrics_services.get_genius_client),
+    ):
+        try:
+            warm_up()
+        except Exception as e:
+            logger.error("Could not initialize the %s client: %s", name, e)
+
+
+def build_application():
+    """Create the Application with all handlers registered."""
+    builder = (
+        ApplicationBuilder()
+        .application_class(TracedApplication)
+        .token(config.TELEGRAM_TOKEN)
+        .request(telegram_http.RoutedRequest())
+        .rate_limiter(rate_limiter.OutboundScheduler())
+    )
+    if config.TELEGRAM_BASE_URL:
+        builder = builder.base_url(config.TELEGRAM_BASE_URL)
+    if config.TELEGRAM_BASE_FILE_URL:
+        builder = builder.base_file_url(config.TELEGRAM_BASE_FILE_URL)
+    if config.TELEGRAM_LOCAL_MODE:
+        builder = builder.local_mode(True)
+    builder = builder.post_init(post_init).post_shutdown(post_shutdown)
+    if config.PERSISTENCE_PATH:
+        builder = builder.persistence(
+            persistence.SQLitePersistence(config.PERSISTENCE_PATH)
+        )
+    application = builder.build()
 
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler("start", start)],
@@ -724,12 +1465,59 @@ def main():
         ],
         per_user=True,
         per_chat=False,
+        name="main",
+        persistent=bool(config.PERSISTENCE_PATH),
     )
 
     application.add_handler(conv_handler)
+    if config.CATALOG_PATH:
+        application.add_handler(InlineQueryHandler(inline_query))
+    if config.ADMIN_IDS:
+        # Non-blocking, so updates keep being handled while it samples them.
+        application.add_handler(
+            CommandHandler(
+                "profile",
+                profile_command,
+                filters=filters.User(user_id=config.ADMIN_IDS),
+                block=False,
+            )
+        )
+    # Page and cancel buttons keep working whatever state the conversation is in.
+    application.add_handler(
+        CallbackQueryHandler(lyrics_page_callback, pattern=f"^{pager.CALLBACK_PREFIX}")
+    )
+    application.add_handler(
+        CallbackQueryHandler(
+            playlist_cancel_callback, pattern=f"^{PLAYLIST_CANCEL_PREFIX}"
+        )
+    )
+
+    return application
+
+
+def main():
+    try:
+        config.validate()
+    except ValueError as e:
+        logger.error("%s The bot cannot start.", e)
+        return
+
+    threading.Thread(target=warm_up_clients, name="warm-up", daemon=True).start()
+
+    # Clear download folders left behind by earlier runs that were killed.
+    workspace.get_manager().clean_orphans()
+
+    # Downloads run in separate worker processes fed through the job queue.
+    workers = jobs.start_workers(config.DOWNLOAD_WORKERS)
 
     logger.info("MusicWizard Bot is starting...")
-    application.run_polling()
+    try:
+        if config.BOT_MODE == "webhook":
+            webhook.run_webhook(build_application)
+        else:
+            build_application().run_polling()
+    finally:
+        jobs.stop_workers(workers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,77 @@
+"""Bulk-import lyrics files into the local lyrics index.
+
+Usage:
+    python import_lyrics.py PATH [PATH ...] [--index lyrics_index.sqlite3]
+
+Each PATH may be an ``.lrc``/``.txt`` file or a directory that is searched
+recursively. Artist and title are read from LRC ``[ar:]``/``[ti:]`` tags, or
+from file names of the form ``Artist - Title.txt``.
+"""
+
+import os
+import argparse
+import logging
+
+from music_wizard_lib import config
+from music_wizard_lib.lyrics_index import LyricsIndex, parse_lyrics_file
+
+logger = logging.getLogger(__name__)
+
+LYRICS_EXTENSIONS = (".lrc", ".txt")
+BATCH_SIZE = 1000
+
+
+def iter_lyrics_files(paths):
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.lower().endswith(LYRICS_EXTENSIONS):
+                    yield os.path.join(root, name)
+
+
+def import_lyrics(paths, index_path: str) -> int:
+    """Parse every lyrics file under ``paths`` into the index at ``index_path``."""
+    index = LyricsIndex(index_path)
+    imported, skipped, batch = 0, 0, []
+    for path in iter_lyrics_files(paths):
+        try:
+            parsed = parse_lyrics_file(path)
+        except OSError as e:
+            logger.error("Could not read '%s': %s", path, e)
+            parsed = None
+        if parsed is None:
+            skipped += 1
+            continue
+        batch.append((*parsed, "import"))
+        if len(batch) >= BATCH_SIZE:
+            imported += index.add_many(batch)
+            batch.clear()
+    imported += index.add_many(batch)
+    logger.info(
+        "Imported %s songs into '%s' (%s files skipped, %s songs indexed).",
+        imported,
+        index_path,
+        skipped,
+        len(index),
+    )
+    index.close()
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="Lyrics files or directories.")
+    parser.add_argument(
+        "--index",
+        default=config.LYRICS_INDEX_PATH,
+        help="Index database to write to (default: %(default)s).",
+    )
+    args = parser.parse_args()
+    import_lyrics(args.paths, args.index)
+
+
+if __name__ == "__main__":
+    main()
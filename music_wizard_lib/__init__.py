@@ -1,19 +1,46 @@
-"""Initialization for the MusicWizard library."""
+"""Initialization for the MusicWizard library.
 
-from . import ai_services
-from . import config
-from . import downloader
-from . import lyrics_services
-from . import utils
-from . import youtube_services
-from . import localization
+Submodules are imported on first access, so a process only pays for the ones
+it uses: download workers never load the Telegram or Google libraries.
+"""
+
+import importlib
 
 __all__ = [
     "ai_services",
+    "cache",
+    "callbacks",
+    "catalog",
     "config",
     "downloader",
+    "executors",
+    "http_server",
+    "jobs",
+    "lyrics_index",
     "lyrics_services",
+    "metrics",
+    "pager",
+    "persistence",
+    "playlist_jobs",
+    "playlist_prefetch",
+    "profiler",
+    "rate_limiter",
+    "telegram_http",
+    "tracing",
     "utils",
+    "webhook",
+    "workspace",
     "youtube_services",
     "localization",
+    "logging_setup",
 ]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
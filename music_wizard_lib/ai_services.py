@@ -1,19 +1,34 @@
 import json
 import logging
-import openai
+import threading
 from . import config
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
-try:
-    openai_client = openai.AsyncOpenAI(api_key=config.OPENAI_API_KEY)
-except Exception as e:
-    logger.error(f"Could not initialize OpenAI client: {e}")
-    openai_client = None
+openai_client = None
+# The warm-up thread and the first request may build the client at once.
+_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """Return the shared OpenAI client, building it on first use.
+
+    The openai package takes a noticeable part of a second to import, so
+    neither importing this module nor starting the bot pays for it.
+    """
+    global openai_client
+    if openai_client is None:
+        with _client_lock:
+            if openai_client is None:
+                import openai
+
+                openai_client = openai.AsyncOpenAI(api_key=config.OPENAI_API_KEY)
+    return openai_client
 
 
 async def extract_song_info_with_openai(video_title: str) -> dict:
-    logger.info(f"Attempting to extract info from '{video_title}' with OpenAI.")
+    logger.info("Attempting to extract info from '%s' with OpenAI.", video_title)
     system_prompt = (
         "You are an expert at parsing song information. Extract the artist and "
         "song title from the following "
@@ -27,29 +42,30 @@ async def extract_song_info_with_openai(video_title: str) -> dict:
         "the tiger by Survivor"
     )
     try:
-        response = await openai_client.chat.completions.create(
-            model=config.OPENAI_CHAT_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": video_title},
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.0,
-            timeout=10,
-        )
-        content = response.choices[0].message.content
-        parsed_json = json.loads(content)
+        with metrics.stage("openai_title_parse"):
+            response = await get_openai_client().chat.completions.create(
+                model=config.OPENAI_CHAT_MODEL,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": video_title},
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.0,
+                timeout=10,
+            )
+            content = response.choices[0].message.content
+            parsed_json = json.loads(content)
         artist = parsed_json.get("artist")
         title = parsed_json.get("title")
-        logger.info(f"OpenAI extracted: Artist='{artist}', Title='{title}'")
+        logger.info("OpenAI extracted: Artist='%s', Title='%s'", artist, title)
         return {"artist": artist, "title": title}
     except Exception as e:
-        logger.error(f"OpenAI API call failed: {e}", exc_info=True)
+        logger.error("OpenAI API call failed: %s", e, exc_info=True)
         return {"artist": None, "title": None}
 
 
 async def generate_song_list_with_ai(vibe, num_songs=10):
-    logger.info(f"Asking AI to generate a playlist for the vibe: '{vibe}'...")
+    logger.info("Asking AI to generate a playlist for the vibe: '%s'...", vibe)
     system_prompt = (
         "You are a helpful playlist assistant. "
         "Your task is to generate a list of songs "
@@ -61,16 +77,17 @@ async def generate_song_list_with_ai(vibe, num_songs=10):
         f'Generate a playlist of {num_songs} songs for the following vibe: "{vibe}"'
     )
     try:
-        response = await openai_client.chat.completions.create(
-            model=config.OPENAI_PLAYLIST_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            response_format={"type": "json_object"},
-        )
-        data = json.loads(response.choices[0].message.content)
+        with metrics.stage("playlist_generation"):
+            response = await get_openai_client().chat.completions.create(
+                model=config.OPENAI_PLAYLIST_MODEL,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt},
+                ],
+                response_format={"type": "json_object"},
+            )
+            data = json.loads(response.choices[0].message.content)
         return data.get("songs", [])
     except Exception as e:
-        logger.error(f"OpenAI API call for playlist failed: {e}")
+        logger.error("OpenAI API call for playlist failed: %s", e)
         return None
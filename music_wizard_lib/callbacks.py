@@ -0,0 +1,182 @@
+import time
+import secrets
+import sqlite3
+import threading
+
+from . import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS callbacks (
+    id TEXT PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS callbacks_chat ON callbacks (chat_id, created_at);
+CREATE INDEX IF NOT EXISTS callbacks_used ON callbacks (used_at);
+CREATE INDEX IF NOT EXISTS callbacks_expires ON callbacks (expires_at);
+"""
+
+# Separates the values of a payload; never part of an artist or title.
+_SEPARATOR = "\x1f"
+
+
+def _encode(values) -> str:
+    # Every value is cut to a fixed number of bytes, so a row has a fixed
+    # upper size whatever the song is called.
+    limit = config.CALLBACK_VALUE_BYTES
+    return _SEPARATOR.join(
+        str(value).replace(_SEPARATOR, " ").encode()[:limit].decode(errors="ignore")
+        for value in values
+    )
+
+
+class CallbackStore:
+    """Payloads for inline buttons, referenced by short callback ids.
+
+    Entries live in SQLite, so buttons keep working after a restart and in
+    whichever bot process receives the tap. They expire ``ttl`` seconds
+    after they are stored. Each chat keeps at most ``per_chat`` entries, and
+    the least recently used entries overall are evicted once the store holds
+    more than ``maxsize`` of them, so the table stays bounded however many
+    songs are sent. Counting the entries takes a full scan, so the global
+    limit is only checked every ``evict_every`` puts.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        maxsize: int = None,
+        per_chat: int = None,
+        ttl: float = None,
+        evict_every: int = None,
+        timer=time.time,
+    ):
+        self.path = path
+        self.maxsize = maxsize or config.CALLBACK_STORE_SIZE
+        self.per_chat = per_chat or config.CALLBACK_STORE_PER_CHAT
+        self.ttl = ttl or config.CALLBACK_STORE_TTL
+        self.evict_every = evict_every or config.CALLBACK_STORE_EVICT_EVERY
+        self._puts = 0
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.evicted = 0
+        self.expired = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM callbacks").fetchone()[0]
+
+    def put(self, chat_id: int, *values) -> str:
+        """Store ``values`` for a button in ``chat_id`` and return its id."""
+        now = self._timer()
+        callback_id = secrets.token_urlsafe(6)
+        with self._lock, self._conn:
+            self.expired += self._conn.execute(
+                "DELETE FROM callbacks WHERE expires_at <= ?", (now,)
+            ).rowcount
+            self._conn.execute(
+                "INSERT INTO callbacks "
+                "(id, chat_id, payload, created_at, used_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (callback_id, chat_id, _encode(values), now, now, now + self.ttl),
+            )
+            self.evicted += self._conn.execute(
+                "DELETE FROM callbacks WHERE chat_id = ? AND id NOT IN "
+                "(SELECT id FROM callbacks WHERE chat_id = ? "
+                "ORDER BY created_at DESC LIMIT ?)",
+                (chat_id, chat_id, self.per_chat),
+            ).rowcount
+            self._puts += 1
+            if self._puts % self.evict_every == 0:
+                self._evict_least_used()
+        return callback_id
+
+    def _evict_least_used(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM callbacks").fetchone()[0]
+        if count > self.maxsize:
+            self.evicted += self._conn.execute(
+                "DELETE FROM callbacks WHERE id IN "
+                "(SELECT id FROM callbacks ORDER BY used_at LIMIT ?)",
+                (count - self.maxsize,),
+            ).rowcount
+
+    def _lookup(self, callback_id: str, chat_id):
+        row = self._conn.execute(
+            "SELECT chat_id, payload, expires_at FROM callbacks WHERE id = ?",
+            (callback_id,),
+        ).fetchone()
+        if row is None or (chat_id is not None and row[0] != chat_id):
+            return None
+        if row[2] <= self._timer():
+            self._conn.execute("DELETE FROM callbacks WHERE id = ?", (callback_id,))
+            self.expired += 1
+            return None
+        return tuple(row[1].split(_SEPARATOR))
+
+    def get(self, callback_id: str, chat_id: int = None):
+        """Return the stored values, or ``None`` if unknown or expired."""
+        with self._lock, self._conn:
+            values = self._lookup(callback_id, chat_id)
+            if values is not None:
+                self._conn.execute(
+                    "UPDATE callbacks SET used_at = ? WHERE id = ?",
+                    (self._timer(), callback_id),
+                )
+        return values
+
+    def pop(self, callback_id: str, chat_id: int = None):
+        with self._lock, self._conn:
+            values = self._lookup(callback_id, chat_id)
+            if values is not None:
+                self._conn.execute(
+                    "DELETE FROM callbacks WHERE id = ?", (callback_id,)
+                )
+        return values
+
+    def purge(self) -> int:
+        """Drop every expired entry and return how many were removed."""
+        with self._lock, self._conn:
+            removed = self._conn.execute(
+                "DELETE FROM callbacks WHERE expires_at <= ?", (self._timer(),)
+            ).rowcount
+        self.expired += removed
+        return removed
+
+    def stats(self) -> dict:
+        """Return entry counts and the bytes the stored payloads take."""
+        with self._lock:
+            entries, chats, size = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT chat_id), "
+                # Plus 32 bytes for the chat id and the three timestamps.
+                "COALESCE(SUM(length(id) + length(CAST(payload AS BLOB)) + 32), 0) "
+                "FROM callbacks"
+            ).fetchone()
+        return {
+            "entries": entries,
+            "chats": chats,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "bytes": size,
+        }
+
+
+_lyrics_requests = None
+
+
+def get_lyrics_requests() -> CallbackStore:
+    """Artist and title behind each "Get Lyrics" button."""
+    global _lyrics_requests
+    if _lyrics_requests is None:
+        _lyrics_requests = CallbackStore(config.CALLBACK_STORE_PATH or ":memory:")
+    return _lyrics_requests
@@ -0,0 +1,162 @@
+import time
+import sqlite3
+import difflib
+import logging
+import threading
+
+from . import config
+from .lyrics_index import normalize
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    id INTEGER PRIMARY KEY,
+    norm_key TEXT NOT NULL UNIQUE,
+    artist TEXT NOT NULL,
+    title TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    sent_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS songs_sent_at ON songs (sent_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(
+    artist, title, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# When nothing matches, query words are cut to this many letters and
+# matched as prefixes, so a typo later in a word still finds candidates.
+_FUZZY_PREFIX = 3
+
+
+def _match_query(words: list, operator: str) -> str:
+    return f" {operator} ".join(f'"{word}"*' for word in words)
+
+
+def _word_score(word: str, parts: list) -> float:
+    """Similarity of a query word to the closest artist or title word."""
+    if any(part.startswith(word) for part in parts):
+        return 1.0
+    return max(difflib.SequenceMatcher(None, word, part).ratio() for part in parts)
+
+
+class SongCatalog:
+    """Songs the bot has sent, keyed by the Telegram file_id they got.
+
+    Lookups by artist and title use an FTS5 prefix index, so a partly typed
+    query matches, and fall back to ranking near misses by similarity.
+    """
+
+    def __init__(self, path: str, min_score: float = 0.5, candidates: int = 50):
+        self.path = path
+        self.min_score = min_score
+        self.candidates = candidates
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+
+    def add(self, artist: str, title: str, file_id: str) -> None:
+        self.add_many([(artist, title, file_id)])
+
+    def add_many(self, rows) -> int:
+        """Insert or refresh ``(artist, title, file_id)`` rows."""
+        count = 0
+        now = time.time()
+        with self._lock, self._conn:
+            for artist, title, file_id in rows:
+                norm_artist, norm_title = normalize(artist), normalize(title)
+                if not norm_title or not file_id:
+                    continue
+                norm_key = f"{norm_artist}\x1f{norm_title}"
+                row = self._conn.execute(
+                    "SELECT id FROM songs WHERE norm_key = ?", (norm_key,)
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE songs SET file_id = ?, sent_at = ? WHERE id = ?",
+                        (file_id, now, row[0]),
+                    )
+                else:
+                    cursor = self._conn.execute(
+                        "INSERT INTO songs "
+                        "(norm_key, artist, title, file_id, sent_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (norm_key, artist, title, file_id, now),
+                    )
+                    self._conn.execute(
+                        "INSERT INTO songs_fts (rowid, artist, title) "
+                        "VALUES (?, ?, ?)",
+                        (cursor.lastrowid, norm_artist, norm_title),
+                    )
+                count += 1
+        return count
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """Return up to ``limit`` songs matching ``query``, best first.
+
+        Each song is a dict with ``id``, ``artist``, ``title`` and
+        ``file_id``. An empty query returns the most recently sent songs.
+        """
+        words = normalize(query).split()
+        with self._lock:
+            if not words:
+                rows = self._conn.execute(
+                    "SELECT id, artist, title, file_id FROM songs "
+                    "ORDER BY sent_at DESC LIMIT ?",
+                    (limit,),
+                ).fetchall()
+                return [self._song(row) for row in rows]
+            rows = self._candidates(words)
+        scored = []
+        for row in rows:
+            parts = normalize(f"{row[1]} {row[2]}").split()
+            # Every query word has to resemble some word of the artist or
+            # title; songs rank by how closely all of them do.
+            scores = [_word_score(word, parts) for word in words]
+            if min(scores) >= self.min_score:
+                scored.append((sum(scores) / len(scores), row))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [self._song(row) for _, row in scored[:limit]]
+
+    def _candidates(self, words: list) -> list:
+        sql = (
+            "SELECT songs.id, songs.artist, songs.title, songs.file_id "
+            "FROM songs_fts JOIN songs ON songs.id = songs_fts.rowid "
+            "WHERE songs_fts MATCH ? ORDER BY rank LIMIT ?"
+        )
+        # Every word as a prefix of artist or title words; then any of them;
+        # then any of their first letters, to catch typos.
+        attempts = [_match_query(words, "AND"), _match_query(words, "OR")]
+        attempts.append(
+            _match_query(sorted({word[:_FUZZY_PREFIX] for word in words}), "OR")
+        )
+        for match in attempts:
+            rows = self._conn.execute(sql, (match, self.candidates)).fetchall()
+            if rows:
+                return rows
+        return []
+
+    @staticmethod
+    def _song(row) -> dict:
+        return {"id": row[0], "artist": row[1], "title": row[2], "file_id": row[3]}
+
+
+_catalog = None
+
+
+def get_catalog():
+    """Return the song catalog, or ``None`` when it is disabled."""
+    global _catalog
+    if _catalog is None and config.CATALOG_PATH:
+        _catalog = SongCatalog(config.CATALOG_PATH, min_score=config.INLINE_MIN_SCORE)
+    return _catalog
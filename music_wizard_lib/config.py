@@ -1,5 +1,6 @@
 import os
 import logging
+import tempfile
 from dotenv import load_dotenv
 
 # --- Environment Variable Loading ---
@@ -17,11 +18,21 @@ GENIUS_ACCESS_TOKEN = os.environ.get("GENIUS_ACCESS_TOKEN")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
 # --- Validate Configuration ---
-if not all([TELEGRAM_TOKEN, GENIUS_ACCESS_TOKEN, OPENAI_API_KEY]):
-    raise ValueError(
-        "One or more required environment variables "
-        "(TELEGRAM_TOKEN, GENIUS_ACCESS_TOKEN, OPENAI_API_KEY) are not set."
-    )
+REQUIRED_VARIABLES = ("TELEGRAM_TOKEN", "GENIUS_ACCESS_TOKEN", "OPENAI_API_KEY")
+
+
+def validate(names=REQUIRED_VARIABLES) -> None:
+    """Raise ValueError if any of the required variables ``names`` is unset.
+
+    Entry points call this at startup; importing the config never fails, so
+    tools and tests that do not need every token can still use it.
+    """
+    missing = [name for name in names if not globals()[name]]
+    if missing:
+        raise ValueError(
+            f"Required environment variables are not set: {', '.join(missing)}."
+        )
+
 
 # --- OpenAI Models ---
 OPENAI_CHAT_MODEL = "gpt-4o-mini"
@@ -34,15 +45,280 @@ API_VERSION = "v3"
 SCOPES = ["https://www.googleapis.com/auth/youtube.force-ssl"]
 TOKEN_FILE = "token.pickle"
 
+# --- Telegram Bot API Server ---
+# Leave empty to use api.telegram.org. For a self-hosted server use e.g.
+# TELEGRAM_BASE_URL=http://localhost:8081/bot and
+# TELEGRAM_BASE_FILE_URL=http://localhost:8081/file/bot
+TELEGRAM_BASE_URL = os.environ.get("TELEGRAM_BASE_URL", "")
+TELEGRAM_BASE_FILE_URL = os.environ.get("TELEGRAM_BASE_FILE_URL", "")
+# Set when the server runs with --local and sees this machine's files: audio
+# is then passed by path and read by the server directly.
+TELEGRAM_LOCAL_MODE = os.environ.get("TELEGRAM_LOCAL_MODE", "").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# --- Runtime Mode ---
+# "polling" (default) or "webhook". Webhook mode serves an HTTP endpoint that
+# Telegram posts updates to; several worker processes on this host can
+# share the update stream.
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+# Public HTTPS URL Telegram should post to, e.g. https://bot.example.com/tg
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+# Random string Telegram echoes in every request; others are rejected.
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8443))
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH") or (
+    "/" + WEBHOOK_URL.split("://", 1)[-1].partition("/")[2]
+)
+# Worker processes sharing the webhook port on this host.
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", 1))
+WEBHOOK_MAX_CONNECTIONS = 40
+
+# --- Telegram HTTP Pools ---
+# Media uploads and light control calls (answers, edits, menus) use separate
+# connection pools so a few large uploads cannot hold up the menus.
+TELEGRAM_UPLOAD_POOL_SIZE = 4
+TELEGRAM_CONTROL_POOL_SIZE = 16
+TELEGRAM_UPLOAD_READ_TIMEOUT = 120
+TELEGRAM_UPLOAD_WRITE_TIMEOUT = 300
+TELEGRAM_CONTROL_TIMEOUT = 10
+
 # --- Bot Settings ---
-MAX_FILE_SIZE_MB = 49
+# Largest audio file the bot will upload. The cloud Bot API accepts 50 MB;
+# a local Bot API server accepts up to 2000 MB.
+MAX_FILE_SIZE_MB = int(
+    os.environ.get("MAX_FILE_SIZE_MB", 2000 if TELEGRAM_LOCAL_MODE else 49)
+)
+# How playlist downloads are delivered: "media_group" sends albums of up to
+# MEDIA_GROUP_SIZE audios per request, "single" sends one message per song.
+PLAYLIST_DELIVERY = "media_group"
+MEDIA_GROUP_SIZE = 10
 TELEGRAM_MESSAGE_LIMIT = 4096
+# Long lyrics are shown one page at a time in a single editable message.
+LYRICS_PAGE_LIMIT = 1500
+# Payloads behind inline buttons such as "Get Lyrics": how many are kept in
+# total and per chat, and for how long. They are kept in CALLBACK_STORE_PATH,
+# which bot processes share, so buttons survive restarts; an empty path
+# keeps them in memory. Each stored value is cut to CALLBACK_VALUE_BYTES.
+# The total is checked every CALLBACK_STORE_EVICT_EVERY buttons, so it may
+# overshoot CALLBACK_STORE_SIZE by that many in between.
+CALLBACK_STORE_PATH = os.environ.get("CALLBACK_STORE_PATH", "callbacks.sqlite3")
+CALLBACK_VALUE_BYTES = 128
+CALLBACK_STORE_SIZE = 50_000
+CALLBACK_STORE_EVICT_EVERY = 100
+CALLBACK_STORE_PER_CHAT = 20
+CALLBACK_STORE_TTL = 24 * 60 * 60
+# Paginated texts kept server-side for the next/previous buttons, in the
+# CALLBACK_STORE_PATH database so every bot process can turn the pages.
+PAGER_MAX_DOCUMENTS = 1000
+PAGER_TTL = 24 * 60 * 60
+
+# --- Outbound Telegram Rate Limits ---
+# Requests per second across all chats, within one private chat and within
+# one group chat. TELEGRAM_CHAT_BURST requests to a chat may go out at once.
+TELEGRAM_GLOBAL_RATE = 30
+TELEGRAM_CHAT_RATE = 1
+TELEGRAM_GROUP_RATE = 20 / 60
+TELEGRAM_CHAT_BURST = 3
+# How often a request is retried after a RetryAfter (flood control) error.
+TELEGRAM_MAX_RETRIES = 3
+
+# --- State Persistence ---
+# Conversation states, user data and chat data survive restarts in this
+# SQLite file, which several bot processes may share. Set to an empty string
+# to keep state in memory only.
+PERSISTENCE_PATH = os.environ.get("PERSISTENCE_PATH", "bot_state.sqlite3")
+# Changed state is written in one batch at most this many seconds apart.
+# With several webhook workers it is written after every update instead,
+# because the user's next update may reach another worker.
+PERSISTENCE_INTERVAL = 30
+
+# --- Playlist Jobs ---
+# Playlist downloads and uploads with their per-song progress, so they can
+# resume after a restart.
+PLAYLIST_JOBS_PATH = os.environ.get("PLAYLIST_JOBS_PATH", "playlist_jobs.sqlite3")
+# A job another process has not advanced for this long is taken over.
+PLAYLIST_JOB_STALE_AFTER = 30 * 60
+# Finished and cancelled playlist jobs, with their songs, are deleted after
+# this many seconds.
+PLAYLIST_JOB_RETENTION = 7 * 24 * 60 * 60
+
+# --- Graceful Shutdown ---
+# On SIGTERM or SIGINT the bot stops taking new downloads and playlists and
+# gives running ones up to SHUTDOWN_TIMEOUT seconds to finish. Playlists
+# still running then are handed to the next process, which resumes them.
+# Keep the service manager's stop timeout above this, e.g. docker stop -t.
+SHUTDOWN_TIMEOUT = float(os.environ.get("SHUTDOWN_TIMEOUT", "25"))
+# How long download workers may take to finish their current job after the
+# bot has drained, before it is abandoned.
+WORKER_STOP_TIMEOUT = 10
+
+# --- Speculative Playlist Prefetch ---
+# While the user decides what to do with a generated playlist, look up its
+# songs on YouTube and download the first few, so either choice starts
+# warm. Off by default: every lookup costs YouTube API quota even when the
+# user then goes back to the main menu. Each user gets at most
+# PLAYLIST_PREFETCH_SEARCHES lookups and PLAYLIST_PREFETCH_DOWNLOADS
+# downloads per playlist, and results unused after PLAYLIST_PREFETCH_TTL
+# seconds are dropped.
+PLAYLIST_PREFETCH = os.environ.get("PLAYLIST_PREFETCH", "").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+PLAYLIST_PREFETCH_SEARCHES = int(os.environ.get("PLAYLIST_PREFETCH_SEARCHES", "25"))
+PLAYLIST_PREFETCH_DOWNLOADS = int(os.environ.get("PLAYLIST_PREFETCH_DOWNLOADS", "2"))
+# Users speculated for at once; playlists beyond this are not prefetched.
+PLAYLIST_PREFETCH_MAX_ACTIVE = 16
+PLAYLIST_PREFETCH_TIMEOUT = 5 * 60
+PLAYLIST_PREFETCH_TTL = 15 * 60
+
+# --- Download Workspace ---
+# Downloads go to per-song folders under SCRATCH_DIR, which may be a tmpfs
+# such as /dev/shm for fast I/O. Together they may reserve at most
+# WORKSPACE_BUDGET_MB; webhook workers each get an equal share of it, since
+# every process only tracks its own reservations. Each download reserves
+# WORKSPACE_RESERVE_MB up front, enough for a MAX_FILE_SIZE_MB file next to
+# the source it is transcoded from (at most the whole budget), and one that
+# finds the budget full waits up to WORKSPACE_WAIT_TIMEOUT seconds before
+# failing.
+SCRATCH_DIR = os.environ.get(
+    "SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "musicwizard")
+)
+WORKSPACE_BUDGET_MB = int(os.environ.get("WORKSPACE_BUDGET_MB", "2048"))
+WORKSPACE_RESERVE_MB = 2 * MAX_FILE_SIZE_MB
+WORKSPACE_WAIT_TIMEOUT = 5 * 60
+
+# --- Download Workers ---
+# Downloads and song identification run in this many worker processes,
+# which take jobs from a SQLite queue shared with the bot. More workers on
+# the same host can be started with worker.py; the queue needs a local
+# filesystem.
+# Set to 0 to run downloads inside the bot process instead.
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", "2"))
+JOB_QUEUE_PATH = os.environ.get("JOB_QUEUE_PATH", "jobs.sqlite3")
+# A worker that misses heartbeats for this long is presumed dead and its
+# job is handed to another worker, up to JOB_MAX_ATTEMPTS times in total.
+JOB_LEASE_SECONDS = 60
+# How often a worker renews its lease; also how quickly it notices that the
+# bot cancelled its job.
+JOB_HEARTBEAT_INTERVAL = 2
+JOB_MAX_ATTEMPTS = 3
+# Longest a handler waits for a job before giving up on it.
+JOB_TIMEOUT = 15 * 60
+JOB_POLL_INTERVAL = 0.5
+# Finished, failed and cancelled jobs are deleted after this many seconds.
+JOB_RETENTION = 24 * 60 * 60
+# How often the bot deletes old rows from its SQLite stores.
+HOUSEKEEPING_INTERVAL = 60 * 60
+
+# --- Blocking I/O Executors ---
+# Each class of blocking work runs in its own thread pool, so slow Genius
+# scraping or download file work cannot starve quick YouTube API calls.
+# Override sizes with e.g. EXECUTOR_THREADS="youtube=16,lyrics=4".
+EXECUTOR_THREADS = {
+    "youtube": 8,
+    "lyrics": 8,
+    "download": 4,
+    **{
+        name.strip(): int(threads)
+        for name, threads in (
+            item.split("=", 1)
+            for item in os.environ.get("EXECUTOR_THREADS", "").split(",")
+            if "=" in item
+        )
+    },
+}
+
+# --- Metrics ---
+# Serve Prometheus metrics on http://METRICS_LISTEN:METRICS_PORT/metrics.
+# 0 disables the endpoint. With several webhook workers, worker N serves its
+# own numbers on METRICS_PORT + N.
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+METRICS_LISTEN = os.environ.get("METRICS_LISTEN", "127.0.0.1")
+# Seconds between measurements of the scratch directory's disk usage.
+METRICS_DISK_INTERVAL = 30
+
+# --- Tracing and Profiling ---
+# Every update gets a trace id; its spans (one per stage, with timings) are
+# appended to TRACE_PATH as JSON lines. "-" writes them to stderr, empty
+# disables tracing.
+TRACE_PATH = os.environ.get("TRACE_PATH", "")
+# Telegram user ids allowed to run admin commands such as /profile.
+ADMIN_IDS = [
+    int(user_id)
+    for user_id in os.environ.get("ADMIN_IDS", "").split(",")
+    if user_id.strip()
+]
+PROFILE_DEFAULT_SECONDS = 10
+PROFILE_MAX_SECONDS = 60
+PROFILE_INTERVAL = 0.005
+
+# --- Lyrics (Genius) ---
+GENIUS_TIMEOUT = 15
+# Upper bound on simultaneous requests to Genius; also sizes the HTTP pool.
+GENIUS_MAX_CONCURRENCY = 4
+# Seconds to wait on the artist+title search before also trying title only.
+GENIUS_HEDGE_DELAY = 1.5
+# Looked-up lyrics are kept in memory so repeated requests skip Genius.
+LYRICS_CACHE_SIZE = 512
+LYRICS_CACHE_TTL = 60 * 60
+# Fetch lyrics in the background as soon as a song is identified.
+LYRICS_PREFETCH = True
+# Prefetches beyond this many in flight are dropped rather than queued.
+LYRICS_PREFETCH_MAX_INFLIGHT = 8
+LYRICS_PREFETCH_TIMEOUT = 30
+
+# --- Lyrics Providers ---
+# Local full-text index of lyrics already fetched or imported with
+# import_lyrics.py. Set LYRICS_INDEX_PATH to an empty string to disable it.
+LYRICS_INDEX_PATH = os.environ.get("LYRICS_INDEX_PATH", "lyrics_index.sqlite3")
+# Minimum fuzzy-match score (0..1) for an index hit on a non-exact name.
+LYRICS_INDEX_MIN_SCORE = 0.8
+# Minimum artist similarity (0..1) for that hit, so a song with the same
+# title by another artist is not returned.
+LYRICS_INDEX_MIN_ARTIST_SCORE = 0.7
+# Remote providers queried concurrently after the index; the first one to
+# return lyrics wins. Available: "genius", "lrclib".
+LYRICS_PROVIDERS = [
+    name.strip()
+    for name in os.environ.get("LYRICS_PROVIDERS", "genius").split(",")
+    if name.strip()
+]
+LYRICS_PROVIDER_TIMEOUTS = {"genius": 20, "lrclib": 8}
+LRCLIB_API_URL = "https://lrclib.net/api/search"
+
+# --- Inline Mode ---
+# Every song the bot sends is recorded with its Telegram file_id in
+# CATALOG_PATH, and "@bot <song>" in any chat offers matches from it, resent
+# by file_id without downloading anything. An empty path disables both.
+# Inline mode must also be switched on for the bot with @BotFather.
+CATALOG_PATH = os.environ.get("CATALOG_PATH", "song_catalog.sqlite3")
+INLINE_RESULTS_LIMIT = 20
+# Minimum similarity (0..1) of every query word to some artist or title word.
+INLINE_MIN_SCORE = 0.5
+# Seconds Telegram may reuse the results of one query.
+INLINE_CACHE_TIME = 300
+
 # --- Audio Quality ---
 # Options: "perfect", "high", "medium", "low"
 AUDIO_QUALITY = "perfect"
 
 # --- Logging Setup ---
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
+# Log records are queued and written by a background thread, so a slow
+# stdout never stalls the event loop; when LOG_QUEUE_SIZE records are
+# waiting, new ones are dropped. LOG_FORMAT is "text" or "json" (one object
+# per line, with the trace id). Identical warnings and errors are written
+# at most once per LOG_DUPLICATE_WINDOW seconds.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+LOG_QUEUE_SIZE = 10000
+LOG_DUPLICATE_WINDOW = 60
+
+from . import logging_setup  # noqa: E402
+
+logging_setup.configure()
 logger = logging.getLogger(__name__)
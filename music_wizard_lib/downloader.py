@@ -1,28 +1,54 @@
 import os
 import json
+import signal
 import asyncio
 import subprocess
 import logging
 
+from music_wizard_lib import executors
+from music_wizard_lib import metrics
 from music_wizard_lib.config import AUDIO_QUALITY
 
 logger = logging.getLogger(__name__)
 
 
+async def _run(command: list, timeout: float) -> str:
+    """Run ``command`` and return its stdout, killing it if cancelled.
+
+    The command gets its own process group so that cancelling also kills any
+    processes it starts (e.g. ffmpeg for merging or fixups).
+    """
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except BaseException as e:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        if isinstance(e, asyncio.TimeoutError):
+            raise subprocess.TimeoutExpired(command, timeout) from e
+        raise
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(
+            process.returncode, command, stdout.decode(), stderr.decode()
+        )
+    return stdout.decode()
+
+
 async def download_song_from_youtube(url: str, download_folder: str) -> (dict, str):
     # Get metadata
     meta_command = ["yt-dlp", "--dump-json", "--no-playlist", url]
-    meta_process = await asyncio.to_thread(
-        subprocess.run,
-        meta_command,
-        check=True,
-        capture_output=True,
-        text=True,
-        timeout=60,
-    )
-    metadata = json.loads(meta_process.stdout)
+    with metrics.stage("ytdlp_metadata"):
+        metadata = json.loads(await _run(meta_command, timeout=60))
 
-    # Map audio quality to yt-dlp setting
+    # Map audio quality to the LAME VBR setting (what yt-dlp -x would use)
     quality_mapping = {
         "perfect": "0",
         "high": "3",
@@ -31,27 +57,45 @@ async def download_song_from_youtube(url: str, download_folder: str) -> (dict, s
     }
     audio_quality = quality_mapping.get(AUDIO_QUALITY, "0")
 
-    # Download audio
+    # Download the best audio stream as is
     output_template = os.path.join(download_folder, "%(title)s.%(ext)s")
     command = [
         "yt-dlp",
-        "-x",
-        "--audio-format",
-        "mp3",
-        "--audio-quality",
-        audio_quality,
+        "-f",
+        "bestaudio/best",
         "--output",
         output_template,
         "--no-playlist",
         url,
     ]
-    await asyncio.to_thread(
-        subprocess.run, command, check=True, capture_output=True, text=True, timeout=300
-    )
+    with metrics.stage("download"):
+        await _run(command, timeout=300)
 
-    downloaded_files = os.listdir(download_folder)
+    downloaded_files = await executors.run("download", os.listdir, download_folder)
     if not downloaded_files:
         raise FileNotFoundError("yt-dlp finished, but no file was found.")
 
-    audio_filepath = os.path.join(download_folder, downloaded_files[0])
+    source_path = os.path.join(download_folder, downloaded_files[0])
+    stem, extension = os.path.splitext(source_path)
+    if extension.lower() == ".mp3":
+        return metadata, source_path
+
+    # Transcode to mp3 separately so its cost shows up on its own
+    audio_filepath = f"{stem}.mp3"
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        "-y",
+        "-i",
+        source_path,
+        "-vn",
+        "-codec:a",
+        "libmp3lame",
+        "-q:a",
+        audio_quality,
+        audio_filepath,
+    ]
+    with metrics.stage("transcode"):
+        await _run(command, timeout=300)
+    await executors.run("download", os.remove, source_path)
     return metadata, audio_filepath
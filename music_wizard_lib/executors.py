@@ -0,0 +1,112 @@
+import time
+import asyncio
+import threading
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config
+
+_executors = {}
+_lock = threading.Lock()
+
+
+class Executor:
+    """A named thread pool plus the bookkeeping behind its queue metrics."""
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self._pool = ThreadPoolExecutor(size, thread_name_prefix=f"{name}-io")
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.queued = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _call(self, submitted: float, state, context, function, args, kwargs):
+        wait = time.perf_counter() - submitted
+        with self._lock:
+            state["started"] = True
+            if not state["dropped"]:
+                self.queued -= 1
+            self.in_flight += 1
+            self.calls += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        try:
+            return context.run(function, *args, **kwargs)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    async def run(self, function, *args, **kwargs):
+        """Like ``asyncio.to_thread``, but in this executor's pool."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.queued += 1
+        # Whether a thread took the call, and whether it left the queue
+        # without one (rejected, or its caller was cancelled).
+        state = {"started": False, "dropped": False}
+        call = functools.partial(
+            self._call,
+            time.perf_counter(),
+            state,
+            contextvars.copy_context(),
+            function,
+            args,
+            kwargs,
+        )
+        try:
+            return await loop.run_in_executor(self._pool, call)
+        except BaseException:
+            with self._lock:
+                if not state["started"]:
+                    state["dropped"] = True
+                    self.queued -= 1
+            raise
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "calls": self.calls,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "wait_seconds_total": self.wait_total,
+                "wait_seconds_max": self.wait_max,
+            }
+
+
+def get(name: str) -> Executor:
+    """Return the executor for the workload class ``name``, creating it."""
+    executor = _executors.get(name)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(name)
+            if executor is None:
+                executor = Executor(name, config.EXECUTOR_THREADS[name])
+                _executors[name] = executor
+    return executor
+
+
+async def run(name: str, function, *args, **kwargs):
+    """Run blocking ``function`` in the executor for ``name``."""
+    return await get(name).run(function, *args, **kwargs)
+
+
+def stats() -> dict:
+    return {name: executor.stats() for name, executor in _executors.items()}
+
+
+def shutdown(wait: bool = False) -> None:
+    """Stop every executor; queued calls that have not started are dropped."""
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait)
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from http import HTTPStatus
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class HTTPServer:
+    """Tiny HTTP/1.1 server on asyncio streams for internal endpoints.
+
+    ``routes`` maps ``(method, path)`` to ``async handler(headers, body)``
+    returning ``(status, content_type, payload_bytes)``. Connections are kept
+    alive between requests, as Telegram and Prometheus both reuse them.
+    """
+
+    def __init__(self, routes: dict, host: str, port: int, reuse_port=False):
+        self.routes = routes
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port
+        self._server = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._serve, self.host, self.port, reuse_port=self.reuse_port or None
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader, writer) -> None:
+        try:
+            while await self._serve_one(reader, writer):
+                pass
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_one(self, reader, writer) -> bool:
+        request_line = await reader.readline()
+        if not request_line:
+            return False
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            await self._respond(writer, HTTPStatus.BAD_REQUEST)
+            return False
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            await self._respond(writer, HTTPStatus.BAD_REQUEST)
+            return False
+        if length > MAX_BODY_BYTES:
+            await self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            return False
+        body = await reader.readexactly(length) if length else b""
+
+        path = target.split("?", 1)[0]
+        handler = self.routes.get((method, path))
+        if handler is None:
+            known_path = any(route_path == path for _, route_path in self.routes)
+            status = (
+                HTTPStatus.METHOD_NOT_ALLOWED if known_path else HTTPStatus.NOT_FOUND
+            )
+            await self._respond(writer, status)
+        else:
+            try:
+                status, content_type, payload = await handler(headers, body)
+            except Exception as e:
+                logger.error("HTTP handler for %s failed: %s", path, e, exc_info=True)
+                status, content_type, payload = (
+                    HTTPStatus.INTERNAL_SERVER_ERROR,
+                    "text/plain",
+                    b"",
+                )
+            await self._respond(writer, status, content_type, payload)
+        return headers.get("connection", "").lower() != "close"
+
+    @staticmethod
+    async def _respond(writer, status, content_type="text/plain", payload=b""):
+        status = HTTPStatus(status)
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + payload)
+        await writer.drain()
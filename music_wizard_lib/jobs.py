@@ -0,0 +1,456 @@
+import os
+import json
+import time
+import uuid
+import signal
+import sqlite3
+import asyncio
+import logging
+import threading
+import multiprocessing
+
+from . import config
+from . import executors
+from . import metrics
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATES = ("done", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, kind, created_at);
+"""
+
+
+class JobFailedError(Exception):
+    """Raised when a queued job ends without a result."""
+
+
+class JobQueue:
+    """Durable job queue in SQLite (WAL mode) shared by the bot and workers.
+
+    Workers claim a job with a lease and keep extending it with heartbeats.
+    A job whose lease runs out, because its worker crashed or hung, is put
+    back in the queue until it has been attempted ``max_attempts`` times.
+    """
+
+    def __init__(self, path: str, max_attempts: int = None):
+        self.path = path
+        self.max_attempts = max_attempts or config.JOB_MAX_ATTEMPTS
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, sql: str, params=()) -> int:
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    @staticmethod
+    def _decode(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def enqueue(self, kind: str, payload: dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._write(
+            "INSERT INTO jobs (id, kind, payload, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), now, now),
+        )
+        return job_id
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._decode(row)
+
+    def _requeue_expired(self, now: float) -> None:
+        # Runs inside the claim transaction, so expiring leases costs no
+        # extra write lock.
+        failed = self._conn.execute(
+            "UPDATE jobs SET state = 'failed', error = 'lease expired', "
+            "worker = NULL, updated_at = ? WHERE state = 'running' "
+            "AND lease_until < ? AND attempts >= ?",
+            (now, now, self.max_attempts),
+        ).rowcount
+        requeued = self._conn.execute(
+            "UPDATE jobs SET state = 'queued', worker = NULL, "
+            "updated_at = ? WHERE state = 'running' AND lease_until < ?",
+            (now, now),
+        ).rowcount
+        if failed or requeued:
+            logger.warning("Requeued %s and failed %s expired jobs", requeued, failed)
+
+    def claim(self, worker_id: str, kinds=None, lease_seconds: float = None):
+        """Lease the oldest queued job to ``worker_id``, or return ``None``.
+
+        Jobs whose lease lapsed are put back in the queue (or failed) first.
+        An idle poll only reads, so it never waits for the write lock.
+        """
+        lease_seconds = lease_seconds or config.JOB_LEASE_SECONDS
+        now = time.time()
+        sql = "SELECT id FROM jobs WHERE state = 'queued'"
+        params = []
+        if kinds:
+            sql += f" AND kind IN ({','.join('?' for _ in kinds)})"
+            params.extend(kinds)
+        sql += " ORDER BY created_at LIMIT 1"
+        with self._lock:
+            pending = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE state = 'queued' "
+                "OR (state = 'running' AND lease_until < ?) LIMIT 1",
+                (now,),
+            ).fetchone()
+            if pending is None:
+                return None
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._requeue_expired(now)
+                row = self._conn.execute(sql, params).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET state = 'running', worker = ?, "
+                        "lease_until = ?, attempts = attempts + 1, updated_at = ? "
+                        "WHERE id = ?",
+                        (worker_id, now + lease_seconds, now, row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = None):
+        """Extend the lease; ``False`` means the worker no longer owns the job."""
+        lease_seconds = lease_seconds or config.JOB_LEASE_SECONDS
+        now = time.time()
+        return bool(
+            self._write(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND state = 'running'",
+                (now + lease_seconds, now, job_id, worker_id),
+            )
+        )
+
+    def complete(self, job_id: str, worker_id: str, result: dict) -> bool:
+        return bool(
+            self._write(
+                "UPDATE jobs SET state = 'done', result = ?, lease_until = NULL, "
+                "updated_at = ? WHERE id = ? AND worker = ? AND state = 'running'",
+                (json.dumps(result), time.time(), job_id, worker_id),
+            )
+        )
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        return bool(
+            self._write(
+                "UPDATE jobs SET state = 'failed', error = ?, lease_until = NULL, "
+                "updated_at = ? WHERE id = ? AND worker = ? AND state = 'running'",
+                (error, time.time(), job_id, worker_id),
+            )
+        )
+
+    def cancel(self, job_id: str) -> bool:
+        return bool(
+            self._write(
+                "UPDATE jobs SET state = 'cancelled', updated_at = ? "
+                "WHERE id = ? AND state IN ('queued', 'running')",
+                (time.time(), job_id),
+            )
+        )
+
+    def release(self, job_id: str, worker_id: str) -> bool:
+        """Record that ``worker_id`` stopped working on a cancelled job."""
+        return bool(
+            self._write(
+                "UPDATE jobs SET lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND state = 'cancelled'",
+                (time.time(), job_id, worker_id),
+            )
+        )
+
+    def worker_gone(self, job_id: str) -> bool:
+        """Whether no worker is, or may still be, working on the job."""
+        job = self.get(job_id)
+        return job["lease_until"] is None or job["lease_until"] < time.time()
+
+    def depth(self) -> dict:
+        """Return the number of jobs in each state."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+            ).fetchall()
+        return {state: count for state, count in rows}
+
+    def busy_workers(self) -> int:
+        """Return how many workers are currently running a job."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(DISTINCT worker) FROM jobs WHERE state = 'running'"
+            ).fetchone()
+        return row[0]
+
+    def purge(self, older_than: float) -> int:
+        """Delete finished jobs last updated more than ``older_than`` seconds ago."""
+        return self._write(
+            "DELETE FROM jobs WHERE state IN ('done', 'failed', 'cancelled') "
+            "AND updated_at < ?",
+            (time.time() - older_than,),
+        )
+
+
+_queue = None
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue(config.JOB_QUEUE_PATH)
+    return _queue
+
+
+# --- Job bodies ---
+
+
+async def run_download(url: str, folder: str) -> dict:
+    """Download ``url`` into ``folder`` and work out the artist and title.
+
+    Returns a track dict with ``path``, ``title`` and ``artist``.
+    """
+    from . import ai_services
+    from . import downloader
+
+    metadata, audio_filepath = await downloader.download_song_from_youtube(
+        url, folder
+    )
+    video_title = metadata.get("title", "Unknown Title")
+    openai_info = await ai_services.extract_song_info_with_openai(video_title)
+    song_title = openai_info.get("title") or metadata.get("track") or video_title
+    song_artist = (
+        openai_info.get("artist") or metadata.get("artist") or "Unknown Artist"
+    )
+    return {"path": audio_filepath, "title": song_title, "artist": song_artist}
+
+
+JOB_KINDS = {"download": lambda payload: run_download(**payload)}
+
+
+async def cancel_job(queue: JobQueue, job_id: str) -> None:
+    """Cancel a job and wait until no worker is working on it any more.
+
+    The worker keeps writing into the job's folder until its next heartbeat,
+    so the caller must not delete the folder before this returns.
+    """
+    await asyncio.to_thread(queue.cancel, job_id)
+    while not await asyncio.to_thread(queue.worker_gone, job_id):
+        await asyncio.sleep(config.JOB_POLL_INTERVAL)
+
+
+async def wait_for_job(queue: JobQueue, job_id: str, timeout: float = None) -> dict:
+    """Poll until the job reaches a terminal state and return it."""
+    deadline = time.monotonic() + (timeout or config.JOB_TIMEOUT)
+    while True:
+        job = await asyncio.to_thread(queue.get, job_id)
+        if job["state"] in TERMINAL_STATES:
+            return job
+        if time.monotonic() >= deadline:
+            await cancel_job(queue, job_id)
+            raise JobFailedError(f"Job {job_id} did not finish in time.")
+        await asyncio.sleep(config.JOB_POLL_INTERVAL)
+
+
+async def submit(kind: str, payload: dict) -> dict:
+    """Run a job on the worker pool and return its result.
+
+    With ``config.DOWNLOAD_WORKERS`` set to 0 the job runs in this process
+    instead. Cancelling the caller cancels the queued job as well.
+    """
+    if config.DOWNLOAD_WORKERS <= 0:
+        return await JOB_KINDS[kind](payload)
+    queue = get_job_queue()
+    if tracing.current() is not None:
+        payload = {**payload, "trace": tracing.current()}
+    job_id = await asyncio.to_thread(queue.enqueue, kind, payload)
+    try:
+        job = await wait_for_job(queue, job_id)
+    except asyncio.CancelledError:
+        await cancel_job(queue, job_id)
+        raise
+    if job["state"] != "done":
+        raise JobFailedError(job["error"] or f"Job {job_id} was {job['state']}.")
+    result = job["result"]
+    metrics.replay(result.pop("stages", ()))
+    return result
+
+
+async def download_song(url: str, folder: str) -> dict:
+    """Download a song through the job queue and return its track dict."""
+    return await submit("download", {"url": url, "folder": os.path.abspath(folder)})
+
+
+# --- Workers ---
+
+
+async def _heartbeat(queue: JobQueue, job: dict, worker_id: str, task) -> None:
+    while not task.done():
+        await asyncio.sleep(config.JOB_HEARTBEAT_INTERVAL)
+        owned = await asyncio.to_thread(queue.heartbeat, job["id"], worker_id)
+        if not owned:
+            logger.info("Job %s was cancelled or reassigned, stopping it", job["id"])
+            task.cancel()
+            return
+
+
+async def _run_recorded(job: dict) -> dict:
+    """Run the job body in the submitter's trace, adding the stages it timed
+    to its result."""
+    payload = dict(job["payload"])
+    trace = payload.pop("trace", None)
+    with metrics.recording() as stages, tracing.attach(trace):
+        with tracing.span("job", job_id=job["id"], kind=job["kind"]):
+            result = await JOB_KINDS[job["kind"]](payload)
+    return {**result, "stages": stages}
+
+
+async def process_job(queue: JobQueue, job: dict, worker_id: str) -> None:
+    task = asyncio.create_task(_run_recorded(job))
+    heartbeat = asyncio.create_task(_heartbeat(queue, job, worker_id, task))
+    try:
+        result = await task
+    except asyncio.CancelledError:
+        if not heartbeat.done():
+            # The worker itself is stopping; let the lease lapse so the job
+            # is picked up again.
+            raise
+        # Cancelled through the queue: the job body has stopped writing.
+        await asyncio.to_thread(queue.release, job["id"], worker_id)
+    except Exception as e:
+        logger.error("Job %s failed: %s", job["id"], e, exc_info=True)
+        await asyncio.to_thread(queue.fail, job["id"], worker_id, str(e))
+    else:
+        await asyncio.to_thread(queue.complete, job["id"], worker_id, result)
+    finally:
+        heartbeat.cancel()
+
+
+async def worker_main(queue: JobQueue, worker_id: str, stop: asyncio.Event) -> None:
+    """Claim and run jobs one at a time until ``stop`` is set."""
+    kinds = tuple(JOB_KINDS)
+    while not stop.is_set():
+        job = await asyncio.to_thread(queue.claim, worker_id, kinds)
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), config.JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await process_job(queue, job, worker_id)
+
+
+def _preload_job_modules() -> None:
+    """Import what the job bodies need, off the worker's event loop."""
+    from . import ai_services
+    from . import downloader  # noqa: F401
+
+    try:
+        ai_services.get_openai_client()
+    except Exception as e:
+        logger.error("Could not initialize the OpenAI client: %s", e)
+
+
+async def _run_worker_process(index: int, queue_path: str) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    main = asyncio.current_task()
+
+    def on_signal():
+        # The first signal lets the current job finish; a second one gives
+        # it up, which kills its yt-dlp and ffmpeg processes.
+        if stop.is_set():
+            main.cancel()
+        stop.set()
+
+    # Start polling at once; the first job waits for the imports if needed.
+    loop.run_in_executor(None, _preload_job_modules)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, on_signal)
+    worker_id = f"{os.uname().nodename}-{os.getpid()}-{index}"
+    logger.info("Download worker %s started", worker_id)
+    queue = JobQueue(queue_path or config.JOB_QUEUE_PATH)
+    try:
+        await worker_main(queue, worker_id, stop)
+    except asyncio.CancelledError:
+        logger.info("Download worker %s gave up its job", worker_id)
+    finally:
+        queue.close()
+        executors.shutdown()
+
+
+def run_worker_process(index: int = 0, queue_path: str = None) -> None:
+    asyncio.run(_run_worker_process(index, queue_path))
+
+
+def start_workers(count: int, queue_path: str = None) -> list:
+    """Start ``count`` download worker processes and return them."""
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(
+            target=run_worker_process, args=(index, queue_path), daemon=True
+        )
+        for index in range(count)
+    ]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def stop_workers(workers: list, timeout: float = None) -> None:
+    """Stop the workers, giving their current jobs ``timeout`` seconds.
+
+    Workers still busy after that are signalled again and give up their
+    job; any that still do not exit are killed.
+    """
+    deadline = time.monotonic() + (timeout or config.WORKER_STOP_TIMEOUT)
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+    for worker in workers:
+        worker.join(max(deadline - time.monotonic(), 0))
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+            worker.join(5)
+        if worker.is_alive():
+            logger.warning("Killing download worker %s", worker.pid)
+            worker.kill()
+            worker.join()
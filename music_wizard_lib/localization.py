@@ -68,6 +68,24 @@ MESSAGES = {
         "songs_sent": "✅ All songs have been sent.",
         "song_not_found": "❌ Could not find '{title}' on YouTube.",
         "download_song_fail": "❌ Failed to download '{title}'.",
+        "send_song_fail": "❌ Failed to send '{title}'.",
+        "playlist_resumed": (
+            "🔄 The bot was restarted. Continuing your playlist where it stopped..."
+        ),
+        "cancel_playlist": "✖️ Cancel",
+        "playlist_cancelled": "🛑 Playlist cancelled.",
+        "playlist_failures": "⚠️ Some songs could not be delivered:\n\n{failures}",
+        "profile_started": "⏱ Profiling for {seconds} s...",
+        "profile_busy": "⏱ A profile is already running.",
+        "inline_not_found": "🔍 Not found? Download it in the bot",
+        "shutting_down": "🔄 The bot is restarting. Please try again in a minute.",
+        "restart_interrupted": (
+            "🔄 The bot restarted before finishing your request. "
+            "Please send it again in a minute."
+        ),
+        "playlist_paused": (
+            "⏸ The bot is restarting. Your playlist will continue after the restart."
+        ),
     },
     "ru": {
         "language_prompt": "Выберите язык / Please choose your language",
@@ -139,6 +157,24 @@ MESSAGES = {
         "songs_sent": "✅ Все песни отправлены.",
         "song_not_found": "❌ Не удалось найти '{title}' на YouTube.",
         "download_song_fail": "❌ Не удалось скачать '{title}'.",
+        "send_song_fail": "❌ Не удалось отправить '{title}'.",
+        "playlist_resumed": (
+            "🔄 Бот был перезапущен. Продолжаю ваш плейлист с места остановки..."
+        ),
+        "cancel_playlist": "✖️ Отменить",
+        "playlist_cancelled": "🛑 Плейлист отменён.",
+        "playlist_failures": "⚠️ Некоторые песни не удалось отправить:\n\n{failures}",
+        "profile_started": "⏱ Профилирование {seconds} с...",
+        "profile_busy": "⏱ Профилирование уже запущено.",
+        "inline_not_found": "🔍 Не нашли? Скачайте песню в боте",
+        "shutting_down": "🔄 Бот перезапускается. Попробуйте ещё раз через минуту.",
+        "restart_interrupted": (
+            "🔄 Бот перезапустился, не успев выполнить ваш запрос. "
+            "Отправьте его ещё раз через минуту."
+        ),
+        "playlist_paused": (
+            "⏸ Бот перезапускается. Плейлист продолжится после перезапуска."
+        ),
     },
 }
 
@@ -0,0 +1,175 @@
+import sys
+import json
+import time
+import queue
+import logging
+import threading
+import collections
+from logging.handlers import QueueHandler, QueueListener
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with the trace id when there is one."""
+
+    def format(self, record) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DuplicateFilter(logging.Filter):
+    """Let through one of each identical warning or error per ``window``.
+
+    The first record after the window carries a note with how many copies
+    were dropped in the meantime.
+    """
+
+    def __init__(self, window: float, maxsize: int = 1024, timer=time.monotonic):
+        super().__init__()
+        self.window = window
+        self.maxsize = maxsize
+        self.suppressed = 0
+        self._timer = timer
+        self._lock = threading.Lock()
+        # (logger, level, message) -> [first seen, copies dropped since]
+        self._seen = collections.OrderedDict()
+
+    def filter(self, record) -> bool:
+        if record.levelno < logging.WARNING or not self.window:
+            return True
+        key = (record.name, record.levelno, record.getMessage())
+        now = self._timer()
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is not None and now - seen[0] < self.window:
+                seen[1] += 1
+                self.suppressed += 1
+                return False
+            self._seen[key] = [now, 0]
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.maxsize:
+                self._seen.popitem(last=False)
+        if seen is not None and seen[1]:
+            record.msg = f"{key[2]} ({seen[1]} identical messages suppressed)"
+            record.args = None
+        return True
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Wait for room instead of failing when the queue is full.
+        self.queue.put(self._sentinel)
+
+
+class BackgroundHandler(QueueHandler):
+    """Queue records for ``target``, which writes them on its own thread.
+
+    Emitting never blocks: when the queue is full the record is dropped
+    and counted. Closing the handler drains the queue first.
+    """
+
+    def __init__(self, target: logging.Handler, maxsize: int, trace_id=None):
+        super().__init__(queue.Queue(maxsize))
+        self.target = target
+        self.dropped = 0
+        self._trace_id = trace_id
+        self._listener = _Listener(self.queue, target, respect_handler_level=True)
+        self._listener.start()
+
+    def prepare(self, record):
+        # Merge the arguments now, while they still hold their values, but
+        # leave the traceback to be formatted on the listener thread. Other
+        # handlers see the same text, so the record is updated in place.
+        record.msg = record.getMessage()
+        record.args = None
+        if self._trace_id is not None:
+            record.trace_id = self._trace_id()
+        return record
+
+    def enqueue(self, record) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5) -> None:
+        """Wait up to ``timeout`` seconds for queued records to be written."""
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks and self._listener._thread is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.queue.all_tasks_done.wait(remaining)
+        self.target.flush()
+
+    def close(self) -> None:
+        if self._listener._thread is not None:
+            self._listener.stop()
+        self.target.close()
+        super().close()
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize(), "dropped": self.dropped}
+
+
+def _root_handler():
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, BackgroundHandler):
+            return handler
+    return None
+
+
+def configure(level: str = None, log_format: str = None, stream=None):
+    """Route the root logger through a background writer thread.
+
+    Replaces the handler from an earlier call. Returns the new handler.
+    """
+    # Imported here: config calls this function at the end of its import.
+    from . import config
+    from . import tracing
+
+    root = logging.getLogger()
+    previous = _root_handler()
+    if previous is not None:
+        root.removeHandler(previous)
+        previous.close()
+
+    target = logging.StreamHandler(stream or sys.stderr)
+    if (log_format or config.LOG_FORMAT) == "json":
+        target.setFormatter(JSONFormatter())
+    else:
+        target.setFormatter(logging.Formatter(TEXT_FORMAT))
+    # Looked up per record, as tracing may still be importing right now.
+    handler = BackgroundHandler(
+        target, config.LOG_QUEUE_SIZE, trace_id=lambda: tracing.current_trace_id()
+    )
+    handler.addFilter(DuplicateFilter(config.LOG_DUPLICATE_WINDOW))
+    root.addHandler(handler)
+    root.setLevel(level or config.LOG_LEVEL)
+    return handler
+
+
+def stats() -> dict:
+    """Queue depth plus dropped and suppressed record counts."""
+    handler = _root_handler()
+    if handler is None:
+        return {}
+    suppressed = sum(
+        log_filter.suppressed
+        for log_filter in handler.filters
+        if isinstance(log_filter, DuplicateFilter)
+    )
+    return {**handler.stats(), "suppressed": suppressed}
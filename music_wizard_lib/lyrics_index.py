@@ -0,0 +1,183 @@
+import os
+import re
+import time
+import sqlite3
+import difflib
+import logging
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    id INTEGER PRIMARY KEY,
+    norm_key TEXT NOT NULL UNIQUE,
+    artist TEXT NOT NULL,
+    title TEXT NOT NULL,
+    lyrics TEXT NOT NULL,
+    source TEXT,
+    added_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(
+    artist, title, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_LRC_TAG = re.compile(r"^\[(ar|ti|al|by|offset|length|re|ve|au):(.*)\]$", re.I)
+_LRC_TIMESTAMP = re.compile(r"\[\d{1,2}:\d{2}(?:[.:]\d{1,3})?\]")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents, bracketed parts and punctuation."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"\(.*?\)|\[.*?\]", " ", text.lower())
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def _similarity(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def _match_query(column: str, words: list, operator: str) -> str:
+    terms = f" {operator} ".join(f'"{word}"*' for word in words)
+    return f"{column} : ({terms})"
+
+
+class LyricsIndex:
+    """SQLite full-text index of lyrics with fuzzy artist/title lookup."""
+
+    def __init__(
+        self,
+        path: str,
+        min_score: float = 0.8,
+        candidates: int = 25,
+        min_artist_score: float = 0.7,
+    ):
+        self.path = path
+        self.min_score = min_score
+        self.min_artist_score = min_artist_score
+        self.candidates = candidates
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+
+    def add(self, artist: str, title: str, lyrics: str, source: str = None) -> None:
+        self.add_many([(artist, title, lyrics, source)])
+
+    def add_many(self, rows) -> int:
+        """Insert or replace ``(artist, title, lyrics, source)`` rows."""
+        count = 0
+        now = time.time()
+        with self._lock, self._conn:
+            for artist, title, lyrics, source in rows:
+                norm_artist, norm_title = normalize(artist), normalize(title)
+                if not norm_title or not lyrics:
+                    continue
+                norm_key = f"{norm_artist}\x1f{norm_title}"
+                row = self._conn.execute(
+                    "SELECT id FROM songs WHERE norm_key = ?", (norm_key,)
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE songs SET lyrics = ?, source = ?, added_at = ? "
+                        "WHERE id = ?",
+                        (lyrics, source, now, row[0]),
+                    )
+                else:
+                    cursor = self._conn.execute(
+                        "INSERT INTO songs "
+                        "(norm_key, artist, title, lyrics, source, added_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (norm_key, artist, title, lyrics, source, now),
+                    )
+                    self._conn.execute(
+                        "INSERT INTO songs_fts (rowid, artist, title) "
+                        "VALUES (?, ?, ?)",
+                        (cursor.lastrowid, norm_artist, norm_title),
+                    )
+                count += 1
+        return count
+
+    def lookup(self, artist: str, title: str):
+        """Return the lyrics of the best matching song, or ``None``."""
+        norm_artist, norm_title = normalize(artist), normalize(title)
+        if not norm_title:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lyrics FROM songs WHERE norm_key = ?",
+                (f"{norm_artist}\x1f{norm_title}",),
+            ).fetchone()
+            if row:
+                return row[0]
+            candidates = self._candidates(norm_title.split())
+        best_score, best_lyrics = 0.0, None
+        for cand_artist, cand_title, lyrics in candidates:
+            score = _similarity(norm_title, cand_title)
+            if norm_artist:
+                artist_score = _similarity(norm_artist, cand_artist)
+                # The same title by someone else is a different song.
+                if artist_score < self.min_artist_score:
+                    continue
+                score = 0.6 * score + 0.4 * artist_score
+            if score > best_score:
+                best_score, best_lyrics = score, lyrics
+        if best_score >= self.min_score:
+            return best_lyrics
+        return None
+
+    def _candidates(self, words: list) -> list:
+        sql = (
+            "SELECT songs_fts.artist, songs_fts.title, songs.lyrics "
+            "FROM songs_fts JOIN songs ON songs.id = songs_fts.rowid "
+            "WHERE songs_fts MATCH ? ORDER BY rank LIMIT ?"
+        )
+        # Every title word first; any of them if that finds nothing.
+        for operator in ("AND", "OR"):
+            rows = self._conn.execute(
+                sql, (_match_query("title", words, operator), self.candidates)
+            ).fetchall()
+            if rows or len(words) == 1:
+                return rows
+        return []
+
+
+def parse_lyrics_file(path: str):
+    """Read an ``.lrc`` or ``.txt`` file into ``(artist, title, lyrics)``.
+
+    Artist and title come from LRC ``[ar:]``/``[ti:]`` tags when present,
+    otherwise from an ``Artist - Title.ext`` file name. Returns ``None`` when
+    neither is available.
+    """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        raw_lines = f.read().splitlines()
+    tags, lines = {}, []
+    for line in raw_lines:
+        tag = _LRC_TAG.match(line.strip())
+        if tag:
+            tags[tag.group(1).lower()] = tag.group(2).strip()
+            continue
+        lines.append(_LRC_TIMESTAMP.sub("", line).strip())
+    artist, title = tags.get("ar"), tags.get("ti")
+    if not title:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if " - " not in stem:
+            return None
+        artist, title = (part.strip() for part in stem.split(" - ", 1))
+    lyrics = re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+    if not lyrics:
+        return None
+    return artist or "", title, lyrics
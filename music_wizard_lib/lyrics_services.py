@@ -1,52 +1,351 @@
 import re
 import logging
 import asyncio
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from . import cache
 from . import config
+from . import executors
+from . import lyrics_index
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
+_genius_client = None
+_genius_client_lock = threading.Lock()
+_genius_semaphore = None
+_http_session = None
+_index = None
 
-async def get_lyrics(artist: str, title: str) -> str:
-    logger.info(f"Searching lyrics for Artist: '{artist}', Title: '{title}'")
+# Lyrics found (or confirmed missing) recently, keyed by normalized artist/title.
+_lyrics_cache = cache.TTLCache(
+    maxsize=config.LYRICS_CACHE_SIZE, ttl=config.LYRICS_CACHE_TTL
+)
+_prefetch_tasks = {}
+# Cache keys a prefetch filled that no tap has used yet.
+_prefetch_filled = cache.TTLCache(
+    maxsize=config.LYRICS_CACHE_SIZE, ttl=config.LYRICS_CACHE_TTL
+)
+_NOT_CACHED = object()
+_prefetch_stats = {"started": 0, "dropped": 0, "failed": 0, "hits": 0, "misses": 0}
+
+
+def get_genius_client():
+    """Return the shared Genius client, building it on first use.
+
+    The client keeps one ``requests.Session`` for its whole lifetime so
+    connections to api.genius.com and genius.com are reused between lookups.
+    """
+    global _genius_client
+    if _genius_client is None:
+        with _genius_client_lock:
+            if _genius_client is None:
+                _genius_client = _build_genius_client()
+    return _genius_client
+
+
+def _build_genius_client():
+    import lyricsgenius
+
+    genius = lyricsgenius.Genius(
+        config.GENIUS_ACCESS_TOKEN,
+        verbose=False,
+        remove_section_headers=False,
+        timeout=config.GENIUS_TIMEOUT,
+        sleep_time=0,
+    )
+    session = getattr(genius, "_session", None)
+    if session is not None:
+        adapter = HTTPAdapter(
+            pool_connections=2, pool_maxsize=config.GENIUS_MAX_CONCURRENCY
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+    return genius
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _genius_semaphore
+    if _genius_semaphore is None:
+        _genius_semaphore = asyncio.Semaphore(config.GENIUS_MAX_CONCURRENCY)
+    return _genius_semaphore
+
+
+def _has_lyrics(song) -> bool:
+    return bool(song and song.lyrics)
+
+
+async def _search_song(genius, title: str, artist: str = None):
+    semaphore = _get_semaphore()
+    await semaphore.acquire()
+    args = (title,) if artist is None else (title, artist)
+    # Run blocking network call in a thread to avoid blocking the event loop
+    search = asyncio.ensure_future(
+        executors.run("lyrics", genius.search_song, *args)
+    )
+
+    def finished(future):
+        # Cancelling us does not stop the thread, so the Genius slot is
+        # only handed back once the search itself has returned.
+        semaphore.release()
+        if not future.cancelled():
+            future.exception()
+
+    search.add_done_callback(finished)
+    return await asyncio.shield(search)
+
+
+async def _hedged_search(genius, title: str, artist: str):
+    """Search with the artist first, hedging with a title-only search.
+
+    If the artist+title search has not answered within
+    ``config.GENIUS_HEDGE_DELAY`` seconds, the title-only search is started
+    alongside it. The artist+title result still wins when it has lyrics.
+    """
+    primary = asyncio.create_task(_search_song(genius, title, artist))
+    fallback = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=config.GENIUS_HEDGE_DELAY)
+        if not done:
+            fallback = asyncio.create_task(_search_song(genius, title))
+        try:
+            song = await primary
+        except requests.exceptions.RequestException:
+            if fallback is None:
+                raise
+            song = None
+        if _has_lyrics(song):
+            return song
+        # Try again without the artist
+        if fallback is None:
+            fallback = asyncio.create_task(_search_song(genius, title))
+        return await fallback
+    finally:
+        for task in (primary, fallback):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+def _cache_key(artist: str, title: str) -> tuple:
+    return ((artist or "").strip().lower(), (title or "").strip().lower())
+
+
+def _clean_lyrics(lyrics: str) -> str:
+    first_section_match = re.search(r"(\[.+\])", lyrics)
+    if first_section_match:
+        lyrics = lyrics[first_section_match.start() :]
+    else:
+        lines = lyrics.split("\n", 1)
+        if len(lines) > 1:
+            lyrics = lines[1]
+    lyrics = re.split(r"\d*You might also like\d*", lyrics, flags=re.IGNORECASE)[0]
+    lines = lyrics.strip().split("\n")
+    if lines and lines[-1].strip().isdigit():
+        lyrics = "\n".join(lines[:-1])
+    return lyrics.strip()
+
+
+def get_lyrics_index():
+    """Return the local lyrics index, or ``None`` when it is disabled."""
+    global _index
+    if _index is None and config.LYRICS_INDEX_PATH:
+        _index = lyrics_index.LyricsIndex(
+            config.LYRICS_INDEX_PATH,
+            min_score=config.LYRICS_INDEX_MIN_SCORE,
+            min_artist_score=config.LYRICS_INDEX_MIN_ARTIST_SCORE,
+        )
+    return _index
+
+
+def _get_http_session() -> requests.Session:
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+        _http_session.headers["User-Agent"] = "MusicWizardBot"
+    return _http_session
+
+
+async def _genius_provider(artist: str, title: str):
+    genius = get_genius_client()
+    cleaned_title = re.sub(r"\(.*\)|\[.*\]", "", title).strip()
+    with metrics.stage("genius_lookup"):
+        song = await _hedged_search(genius, cleaned_title, artist)
+    return _clean_lyrics(song.lyrics) if _has_lyrics(song) else None
+
+
+def _search_lrclib(artist: str, title: str):
+    response = _get_http_session().get(
+        config.LRCLIB_API_URL,
+        params={"artist_name": artist, "track_name": title},
+        timeout=config.LYRICS_PROVIDER_TIMEOUTS.get("lrclib", 10),
+    )
+    response.raise_for_status()
+    for item in response.json():
+        if item.get("plainLyrics"):
+            return item["plainLyrics"].strip()
+    return None
+
+
+async def _lrclib_provider(artist: str, title: str):
+    cleaned_title = re.sub(r"\(.*\)|\[.*\]", "", title).strip()
+    with metrics.stage("lrclib_lookup"):
+        return await executors.run("lyrics", _search_lrclib, artist, cleaned_title)
+
+
+_PROVIDERS = {"genius": _genius_provider, "lrclib": _lrclib_provider}
+
+
+async def _fetch_remote(artist: str, title: str):
+    """Query the remote providers concurrently; the first lyrics found win.
+
+    Returns ``(provider_name, lyrics)``, with ``lyrics`` set to ``None`` when
+    every provider answered that it does not have the song. If none found
+    lyrics and any of them failed, the first error is raised, since the one
+    that failed may have had them.
+    """
+    names = [name for name in config.LYRICS_PROVIDERS if name in _PROVIDERS]
+    tasks = {
+        asyncio.create_task(
+            asyncio.wait_for(
+                _PROVIDERS[name](artist, title),
+                timeout=config.LYRICS_PROVIDER_TIMEOUTS.get(name),
+            )
+        ): name
+        for name in names
+    }
+    errors = []
+    pending = set(tasks)
     try:
-        import lyricsgenius
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in sorted(done, key=lambda t: names.index(tasks[t])):
+                try:
+                    lyrics = task.result()
+                except Exception as e:
+                    logger.warning("Lyrics provider '%s' failed: %r", tasks[task], e)
+                    if isinstance(e, asyncio.TimeoutError):
+                        # The provider's own stage only saw a cancellation.
+                        metrics.count_error(f"{tasks[task]}_lookup")
+                    errors.append(e)
+                    continue
+                if lyrics:
+                    return tasks[task], lyrics
+    finally:
+        for task in pending:
+            task.cancel()
+    if errors:
+        raise errors[0]
+    return None, None
+
+
+async def _fetch_lyrics(artist: str, title: str):
+    """Look the song up in the local index, then remotely, and cache it.
 
-        genius = lyricsgenius.Genius(
-            config.GENIUS_ACCESS_TOKEN,
-            verbose=False,
-            remove_section_headers=False,
-            timeout=15,
+    Returns the lyrics, or ``None`` when no provider has them. Lyrics found
+    remotely are added to the local index. Network errors propagate and are
+    not cached.
+    """
+    index = get_lyrics_index()
+    lyrics = None
+    if index is not None:
+        with metrics.stage("lyrics_index_lookup"):
+            lyrics = await asyncio.to_thread(index.lookup, artist, title)
+        metrics.cache_lookup("lyrics_index", bool(lyrics))
+    if not lyrics:
+        source, lyrics = await _fetch_remote(artist, title)
+        if lyrics and index is not None:
+            await asyncio.to_thread(index.add, artist, title, lyrics, source)
+    _lyrics_cache.set(_cache_key(artist, title), lyrics)
+    return lyrics
+
+
+async def _run_prefetch(key: tuple, artist: str, title: str):
+    try:
+        lyrics = await asyncio.wait_for(
+            _fetch_lyrics(artist, title), timeout=config.LYRICS_PREFETCH_TIMEOUT
         )
-        cleaned_title = re.sub(r"\(.*\)|\[.*\]", "", title).strip()
-        # Run blocking network call in a thread to avoid blocking the event loop
-        song = await asyncio.to_thread(genius.search_song, cleaned_title, artist)
-        if not song or not song.lyrics:
-            # Try again without the artist
-            song = await asyncio.to_thread(genius.search_song, cleaned_title)
-            if not song or not song.lyrics:
-                return "Could not find lyrics for this song."
-
-        lyrics = song.lyrics
-        first_section_match = re.search(r"(\[.+\])", lyrics)
-        if first_section_match:
-            lyrics = lyrics[first_section_match.start() :]
+        _prefetch_filled.set(key, True)
+        return lyrics
+    except Exception as e:
+        _prefetch_stats["failed"] += 1
+        logger.info("Lyrics prefetch for '%s - %s' failed: %r", artist, title, e)
+        raise
+    finally:
+        _prefetch_tasks.pop(key, None)
+
+
+def prefetch_lyrics(artist: str, title: str) -> bool:
+    """Start fetching lyrics in the background so a later tap answers at once.
+
+    The prefetch is skipped when the lyrics are already cached or being
+    fetched, and dropped when Genius is busy or too many prefetches are in
+    flight. Returns ``True`` if a prefetch task was started.
+    """
+    if not config.LYRICS_PREFETCH:
+        return False
+    key = _cache_key(artist, title)
+    if key in _lyrics_cache or key in _prefetch_tasks:
+        return False
+    if (
+        len(_prefetch_tasks) >= config.LYRICS_PREFETCH_MAX_INFLIGHT
+        or _get_semaphore().locked()
+    ):
+        _prefetch_stats["dropped"] += 1
+        return False
+    task = asyncio.create_task(_run_prefetch(key, artist, title))
+    # Failures are already logged; keep asyncio from reporting them again.
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    _prefetch_tasks[key] = task
+    _prefetch_stats["started"] += 1
+    return True
+
+
+def prefetch_stats() -> dict:
+    """Return prefetch counters together with the hit rate of lyrics taps."""
+    stats = dict(_prefetch_stats)
+    stats["in_flight"] = len(_prefetch_tasks)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+
+async def get_lyrics(artist: str, title: str) -> str:
+    logger.info("Searching lyrics for Artist: '%s', Title: '%s'", artist, title)
+    key = _cache_key(artist, title)
+    try:
+        lyrics = _lyrics_cache.get(key, _NOT_CACHED)
+        metrics.cache_lookup("lyrics", lyrics is not _NOT_CACHED)
+        # Only the first tap served by a prefetch counts as its hit; other
+        # cache hits say nothing about prefetching.
+        if lyrics is not _NOT_CACHED:
+            if _prefetch_filled.pop(key):
+                _prefetch_stats["hits"] += 1
+        elif key in _prefetch_tasks:
+            _prefetch_stats["hits"] += 1
+            try:
+                lyrics = await asyncio.shield(_prefetch_tasks[key])
+                _prefetch_filled.pop(key)
+            except Exception:
+                lyrics = await _fetch_lyrics(artist, title)
         else:
-            lines = lyrics.split("\n", 1)
-            if len(lines) > 1:
-                lyrics = lines[1]
-        lyrics = re.split(r"\d*You might also like\d*", lyrics, flags=re.IGNORECASE)[0]
-        lines = lyrics.strip().split("\n")
-        if lines and lines[-1].strip().isdigit():
-            lyrics = "\n".join(lines[:-1])
-        return lyrics.strip()
+            _prefetch_stats["misses"] += 1
+            lyrics = await _fetch_lyrics(artist, title)
+        logger.info(
+            "Lyrics prefetch hit rate: %.0f%%", 100 * prefetch_stats()["hit_rate"]
+        )
+        if not lyrics:
+            return "Could not find lyrics for this song."
+        return lyrics
     except requests.exceptions.HTTPError as e:
-        logger.error(f"HTTP Error fetching lyrics: {e}", exc_info=True)
+        logger.error("HTTP Error fetching lyrics: %s", e, exc_info=True)
         return (
             f"An error occurred while fetching lyrics (HTTP {e.response.status_code})."
         )
     except Exception as e:
         logger.error(
-            f"An unexpected error occurred while fetching lyrics: {e}", exc_info=True
+            "An unexpected error occurred while fetching lyrics: %s", e, exc_info=True
         )
         return "An unexpected error occurred while fetching lyrics."
@@ -0,0 +1,300 @@
+import time
+import bisect
+import asyncio
+import logging
+import contextlib
+import contextvars
+from http import HTTPStatus
+
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans quick cache lookups up to multi-minute playlist uploads.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra="") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values):
+        """Return the child for these label values, creating it on first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def render(self) -> list:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    """Monotonic count; the name should end in ``_total``."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self._children[()].value += amount
+
+    def _render_child(self, values, child):
+        labels = _format_labels(self.labelnames, values)
+        return [f"{self.name}{labels} {_format_value(child.value)}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        self._children[()].value = value
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        bounds = self.upper_bounds + (float("inf"),)
+        for bound, count in zip(bounds, child.counts):
+            cumulative += count
+            labels = _format_labels(
+                self.labelnames, values, f'le="{_format_value(bound)}"'
+            )
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The metrics of one process plus callbacks that refresh gauges."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def add_collector(self, collector) -> None:
+        """Call ``collector()`` before every scrape, e.g. to set gauges."""
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector) -> None:
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def render(self) -> bytes:
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                logger.warning("Metrics collector %r failed: %s", collector, e)
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode()
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "musicwizard_stage_duration_seconds",
+    "Time spent in each processing stage.",
+    ("stage",),
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "musicwizard_stage_errors_total", "Stage runs that failed.", ("stage",)
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "musicwizard_cache_lookups_total", "Cache lookups by result.", ("cache", "result")
+)
+GAUGES = REGISTRY.gauge(
+    "musicwizard_resource",
+    "Queue depths, busy workers, disk usage and other saturation signals.",
+    ("resource",),
+)
+EVENTS = REGISTRY.counter(
+    "musicwizard_events_total",
+    "Counters kept by other components (scheduler, prefetch, stores).",
+    ("event",),
+)
+
+
+# Stages timed while a ``recording()`` block is active, as
+# ``(stage, seconds, failed)``; ``seconds`` is None for ``count_error``.
+_recording = contextvars.ContextVar("metrics_recording", default=None)
+
+
+def _observe_stage(name: str, seconds, failed: bool) -> None:
+    if seconds is not None:
+        STAGE_SECONDS.labels(name).observe(seconds)
+    if failed:
+        STAGE_ERRORS.labels(name).inc()
+    recorded = _recording.get()
+    if recorded is not None:
+        recorded.append((name, seconds, failed))
+
+
+class _StageTimer:
+    __slots__ = ("name", "start", "span")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.span = tracing.span(self.name).__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        failed = exc_type is not None and not issubclass(
+            exc_type, asyncio.CancelledError
+        )
+        _observe_stage(self.name, time.perf_counter() - self.start, failed)
+        self.span.__exit__(exc_type, exc, tb)
+        return False
+
+
+def stage(name: str) -> _StageTimer:
+    """Time a block as stage ``name``; exceptions other than cancellation
+    also count as errors. The block is also a span of the current trace.
+
+    Usable as ``with metrics.stage("download"):`` in sync and async code.
+    """
+    return _StageTimer(name)
+
+
+def count_error(stage_name: str) -> None:
+    """Count a failure that a stage handled without raising."""
+    _observe_stage(stage_name, None, True)
+
+
+@contextlib.contextmanager
+def recording():
+    """Collect the stages timed inside the block, including in tasks it starts.
+
+    Worker processes send the list back with the job result so the bot,
+    which serves ``/metrics``, can ``replay`` it.
+    """
+    stages = []
+    token = _recording.set(stages)
+    try:
+        yield stages
+    finally:
+        _recording.reset(token)
+
+
+def replay(stages) -> None:
+    """Record stages that were timed in another process."""
+    for name, seconds, failed in stages:
+        _observe_stage(name, seconds, failed)
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def set_gauges(values: dict, prefix: str = "") -> None:
+    for name, value in values.items():
+        GAUGES.labels(f"{prefix}{name}").set(value)
+
+
+def set_counts(values: dict, prefix: str = "") -> None:
+    """Export totals that another component already counts itself."""
+    for name, value in values.items():
+        EVENTS.labels(f"{prefix}{name}").set(value)
+
+
+async def metrics_route(headers, body):
+    return HTTPStatus.OK, CONTENT_TYPE, REGISTRY.render()
@@ -0,0 +1,135 @@
+import json
+import time
+import asyncio
+import secrets
+import sqlite3
+import threading
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from . import config
+from . import utils
+
+CALLBACK_PREFIX = "page_"
+# The page counter button between the arrows does nothing.
+NOOP_CALLBACK = f"{CALLBACK_PREFIX}noop"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS paged_documents (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    pages TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS paged_documents_expires
+    ON paged_documents (expires_at);
+"""
+
+
+class DocumentStore:
+    """Pages of every paginated message, keyed by a short document id.
+
+    Documents live in SQLite next to the callback store, so the page buttons
+    work in whichever bot process receives the tap and after a restart.
+    Only the newest ``maxsize`` documents are kept, each for ``ttl`` seconds.
+    """
+
+    def __init__(
+        self, path: str, maxsize: int = None, ttl: float = None, timer=time.time
+    ):
+        self.path = path
+        self.maxsize = maxsize or config.PAGER_MAX_DOCUMENTS
+        self.ttl = ttl or config.PAGER_TTL
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def put(self, pages) -> str:
+        """Store ``pages`` and return the new document id."""
+        now = self._timer()
+        doc_id = secrets.token_urlsafe(6)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM paged_documents WHERE expires_at <= ?", (now,)
+            )
+            seq = self._conn.execute(
+                "INSERT INTO paged_documents (id, pages, expires_at) "
+                "VALUES (?, ?, ?)",
+                (doc_id, json.dumps(list(pages)), now + self.ttl),
+            ).lastrowid
+            # Sequence numbers only grow, so the oldest documents are the
+            # ones below the newest ``maxsize`` and no count is needed.
+            self._conn.execute(
+                "DELETE FROM paged_documents WHERE seq <= ?", (seq - self.maxsize,)
+            )
+        return doc_id
+
+    def get(self, doc_id: str):
+        """Return the pages of ``doc_id``, or ``None`` if unknown or expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pages FROM paged_documents WHERE id = ? AND expires_at > ?",
+                (doc_id, self._timer()),
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+
+_documents = None
+
+
+def get_store() -> DocumentStore:
+    global _documents
+    if _documents is None:
+        _documents = DocumentStore(config.CALLBACK_STORE_PATH or ":memory:")
+    return _documents
+
+
+def build_page_keyboard(doc_id: str, page: int, total: int) -> InlineKeyboardMarkup:
+    """Return the previous/next keyboard for ``page`` (0-based) of ``total``."""
+    buttons = []
+    if page > 0:
+        buttons.append(
+            InlineKeyboardButton(
+                "◀️", callback_data=f"{CALLBACK_PREFIX}{doc_id}_{page - 1}"
+            )
+        )
+    buttons.append(
+        InlineKeyboardButton(f"{page + 1}/{total}", callback_data=NOOP_CALLBACK)
+    )
+    if page < total - 1:
+        buttons.append(
+            InlineKeyboardButton(
+                "▶️", callback_data=f"{CALLBACK_PREFIX}{doc_id}_{page + 1}"
+            )
+        )
+    return InlineKeyboardMarkup([buttons])
+
+
+async def send_paginated_message(bot, chat_id: int, text: str):
+    """Send ``text`` as one message, paginated with inline buttons if long."""
+    pages = utils.split_text(text, config.LYRICS_PAGE_LIMIT)
+    if len(pages) == 1:
+        return await bot.send_message(chat_id=chat_id, text=pages[0])
+    doc_id = await asyncio.to_thread(get_store().put, pages)
+    return await bot.send_message(
+        chat_id=chat_id,
+        text=pages[0],
+        reply_markup=build_page_keyboard(doc_id, 0, len(pages)),
+    )
+
+
+def get_page(callback_data: str):
+    """Resolve a page button to ``(text, keyboard)``, or ``None`` if expired."""
+    doc_id, _, page = callback_data[len(CALLBACK_PREFIX) :].rpartition("_")
+    pages = get_store().get(doc_id)
+    if pages is None or not page.isdigit() or int(page) >= len(pages):
+        return None
+    page = int(page)
+    return pages[page], build_page_keyboard(doc_id, page, len(pages))
@@ -0,0 +1,215 @@
+import json
+import uuid
+import pickle
+import sqlite3
+import asyncio
+import logging
+import threading
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data BLOB NOT NULL,
+    revision TEXT NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+"""
+
+# Marks a row to delete in the write buffer.
+_DROP = object()
+
+
+class SQLitePersistence(BasePersistence):
+    """Stores user data, chat data and conversation states in SQLite.
+
+    The Application hands over changed state every ``update_interval``
+    seconds; the changes are buffered and written in a single transaction.
+    User and chat data are not read at startup but loaded the first time a
+    user or chat sends an update, and reloaded when another process sharing
+    the database has written a newer revision. Conversation states are
+    small and are read in full when the ConversationHandler starts; PTB
+    never reads them again, so processes sharing the database reload a
+    user's state with ``reload_conversation`` before each update.
+    """
+
+    def __init__(self, path: str, update_interval: float = None):
+        super().__init__(
+            store_data=PersistenceInput(
+                bot_data=False, chat_data=True, user_data=True, callback_data=False
+            ),
+            update_interval=update_interval or config.PERSISTENCE_INTERVAL,
+        )
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # Revision of each row as last read or written by this process.
+        self._revisions = {}
+        self._pending = {}
+        self._writing = {}
+        self._write_task = None
+
+    # --- Buffered writes ---
+
+    def _buffer(self, kind: str, key, value) -> None:
+        self._pending[(kind, str(key))] = value
+        if self._write_task is None or self._write_task.done():
+            # Every update_* call of one persistence run lands before this
+            # task gets to run, so they share one transaction.
+            self._write_task = asyncio.create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        self._writing, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self._write, self._writing)
+        finally:
+            self._writing = {}
+
+    def _write(self, items: dict) -> None:
+        if not items:
+            return
+        upserts, deletes = [], []
+        for (kind, key), value in items.items():
+            if value is _DROP:
+                deletes.append((kind, key))
+                self._revisions.pop((kind, key), None)
+                continue
+            revision = uuid.uuid4().hex
+            self._revisions[(kind, key)] = revision
+            upserts.append((kind, key, value, revision))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO state (kind, key, data, revision) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (kind, key) DO UPDATE SET "
+                "data = excluded.data, revision = excluded.revision",
+                upserts,
+            )
+            self._conn.executemany(
+                "DELETE FROM state WHERE kind = ? AND key = ?", deletes
+            )
+        logger.debug("Persisted %s and dropped %s entries", len(upserts), len(deletes))
+
+    async def write_pending(self) -> None:
+        """Write buffered changes now instead of at the next interval."""
+        while self._write_task is not None and not self._write_task.done():
+            await self._write_task
+        if self._pending:
+            self._write_task = asyncio.create_task(self._write_pending())
+            await self._write_task
+
+    async def flush(self) -> None:
+        if self._write_task is not None:
+            await self._write_task
+        self._write(self._pending)
+        self._pending = {}
+        with self._lock:
+            self._conn.close()
+
+    # --- Lazy loading ---
+
+    def _read(self, row_key: tuple):
+        """Return whether the row changed since we last saw it, and its data.
+
+        The data is ``None`` when another process has deleted the row.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, revision FROM state WHERE kind = ? AND key = ?",
+                row_key,
+            ).fetchone()
+        revision = row[1] if row is not None else None
+        if revision == self._revisions.get(row_key):
+            return False, None
+        if row is None:
+            del self._revisions[row_key]
+            return True, None
+        self._revisions[row_key] = revision
+        return True, pickle.loads(row[0])
+
+    async def _reload(self, row_key: tuple):
+        if row_key in self._pending or row_key in self._writing:
+            # Our own unwritten changes are newer than anything stored.
+            return False, None
+        return await asyncio.to_thread(self._read, row_key)
+
+    async def _refresh(self, kind: str, key, data: dict) -> None:
+        changed, stored = await self._reload((kind, str(key)))
+        if changed:
+            data.clear()
+            data.update(stored or {})
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        await self._refresh("user", user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        await self._refresh("chat", chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    async def get_user_data(self) -> dict:
+        return {}
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    # --- Updates from the Application ---
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._buffer("user", user_id, pickle.dumps(data))
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._buffer("chat", chat_id, pickle.dumps(data))
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._buffer("user", user_id, _DROP)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._buffer("chat", chat_id, _DROP)
+
+    # --- Conversations ---
+
+    async def get_conversations(self, name: str) -> dict:
+        kind = f"conv:{name}"
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, data, revision FROM state WHERE kind = ?", (kind,)
+            ).fetchall()
+        for key, _, revision in rows:
+            self._revisions[(kind, key)] = revision
+        return {tuple(json.loads(key)): pickle.loads(data) for key, data, _ in rows}
+
+    async def reload_conversation(self, name: str, key: tuple):
+        """Return whether a conversation's stored state changed, and the state.
+
+        The state is ``None`` when the conversation has ended.
+        """
+        return await self._reload((f"conv:{name}", json.dumps(list(key))))
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        kind = f"conv:{name}"
+        if new_state is None:
+            self._buffer(kind, json.dumps(list(key)), _DROP)
+        else:
+            self._buffer(kind, json.dumps(list(key)), pickle.dumps(new_state))
@@ -0,0 +1,258 @@
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlist_jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    lang TEXT NOT NULL,
+    title TEXT,
+    description TEXT,
+    playlist_id TEXT,
+    state TEXT NOT NULL DEFAULT 'running',
+    owner TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS playlist_songs (
+    job_id TEXT NOT NULL REFERENCES playlist_jobs (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    video_id TEXT,
+    file_id TEXT,
+    playlist_item_id TEXT,
+    PRIMARY KEY (job_id, position)
+);
+"""
+
+# Song statuses after which a resumed job skips the song.
+FINISHED_SONG_STATUSES = ("sent", "inserted", "not_found", "failed", "send_failed")
+
+
+def process_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_is_gone(owner: str) -> bool:
+    if not owner:
+        # Released by a process that shut down before finishing it.
+        return True
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    if owner == process_owner():
+        # Same host and pid as a previous run, e.g. PID 1 in a container.
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+class PlaylistJobStore:
+    """Playlist downloads and uploads with their per-song progress.
+
+    Each song records the YouTube video it resolved to and what was done
+    with it (the Telegram file_id it was sent as, or the playlist item it
+    was inserted as), so an interrupted job can carry on where it stopped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def create(
+        self,
+        kind: str,
+        chat_id: int,
+        lang: str,
+        songs: list,
+        title: str = None,
+        description: str = None,
+    ) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO playlist_jobs (id, kind, chat_id, lang, title, "
+                "description, owner, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    kind,
+                    chat_id,
+                    lang,
+                    title,
+                    description,
+                    process_owner(),
+                    now,
+                    now,
+                ),
+            )
+            self._conn.executemany(
+                "INSERT INTO playlist_songs (job_id, position, title, artist) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (job_id, position, song["title"], song.get("artist", ""))
+                    for position, song in enumerate(songs)
+                ],
+            )
+        return job_id
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._conn.execute(
+                "SELECT * FROM playlist_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            songs = self._conn.execute(
+                "SELECT * FROM playlist_songs WHERE job_id = ? ORDER BY position",
+                (job_id,),
+            ).fetchall()
+        job = dict(job)
+        job["songs"] = [dict(song) for song in songs]
+        return job
+
+    def get_state(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM playlist_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return row["state"] if row is not None else None
+
+    def running_jobs(self, chat_id: int) -> list:
+        """Return the ids of the chat's unfinished jobs."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM playlist_jobs WHERE chat_id = ? AND state = 'running'",
+                (chat_id,),
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def sent_songs(self) -> list:
+        """``(artist, title, file_id)`` of every song sent as audio."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT artist, title, file_id FROM playlist_songs "
+                "WHERE file_id IS NOT NULL"
+            ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def update_job(self, job_id: str, **fields) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE playlist_jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                (*fields.values(), time.time(), job_id),
+            )
+
+    def cancel(self, job_id: str, chat_id: int = None) -> bool:
+        """Mark a running job cancelled; ``False`` if it was not running.
+
+        With ``chat_id``, only a job of that chat is cancelled.
+        """
+        sql = (
+            "UPDATE playlist_jobs SET state = 'cancelled', updated_at = ? "
+            "WHERE id = ? AND state = 'running'"
+        )
+        params = [time.time(), job_id]
+        if chat_id is not None:
+            sql += " AND chat_id = ?"
+            params.append(chat_id)
+        with self._lock, self._conn:
+            return bool(self._conn.execute(sql, params).rowcount)
+
+    def update_song(self, job_id: str, position: int, **fields) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE playlist_songs SET {assignments} "
+                "WHERE job_id = ? AND position = ?",
+                (*fields.values(), job_id, position),
+            )
+            self._conn.execute(
+                "UPDATE playlist_jobs SET updated_at = ? WHERE id = ?",
+                (time.time(), job_id),
+            )
+
+    def claim_orphans(self, stale_after: float = None) -> list:
+        """Take over unfinished jobs whose owning process is gone.
+
+        A job is orphaned when its owner was a process on this host that no
+        longer runs, or when it has made no progress for ``stale_after``
+        seconds. Returns the ids of the jobs now owned by this process. Meant
+        to be called once at startup, before this process runs any job.
+        """
+        stale_after = stale_after or config.PLAYLIST_JOB_STALE_AFTER
+        me = process_owner()
+        claimed = []
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT id, owner, updated_at FROM playlist_jobs "
+                "WHERE state = 'running'"
+            ).fetchall()
+            for row in rows:
+                stale = row["updated_at"] < time.time() - stale_after
+                if not stale and not _owner_is_gone(row["owner"]):
+                    continue
+                updated = self._conn.execute(
+                    "UPDATE playlist_jobs SET owner = ?, updated_at = ? "
+                    "WHERE id = ? AND owner IS ?",
+                    (me, time.time(), row["id"], row["owner"]),
+                ).rowcount
+                if updated:
+                    claimed.append(row["id"])
+        return claimed
+
+    def release(self, job_ids) -> None:
+        """Give up unfinished jobs so that any process may resume them."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE playlist_jobs SET owner = NULL "
+                "WHERE id = ? AND state = 'running'",
+                [(job_id,) for job_id in job_ids],
+            )
+
+    def purge(self, older_than: float) -> int:
+        """Delete finished jobs last updated more than ``older_than`` seconds ago."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM playlist_jobs WHERE state != 'running' "
+                "AND updated_at < ?",
+                (time.time() - older_than,),
+            ).rowcount
+
+
+_store = None
+
+
+def get_store() -> PlaylistJobStore:
+    global _store
+    if _store is None:
+        _store = PlaylistJobStore(config.PLAYLIST_JOBS_PATH)
+    return _store
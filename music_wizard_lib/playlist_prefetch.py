@@ -0,0 +1,166 @@
+import asyncio
+import logging
+
+from . import config, executors, jobs, workspace, youtube_services
+
+logger = logging.getLogger(__name__)
+
+# A speculative download never waits long for workspace budget that a
+# download the user asked for may need.
+_WORKSPACE_WAIT = 1
+
+# Prefetches running or waiting for their user's decision, by user id.
+_prefetches = {}
+_stats = {
+    "started": 0,
+    "dropped": 0,
+    "taken": 0,
+    "cancelled": 0,
+    "expired": 0,
+    "searches": 0,
+    "searches_used": 0,
+    "downloads": 0,
+    "downloads_released": 0,
+}
+
+
+class PlaylistPrefetch:
+    """Video ids and downloaded tracks for one user's generated playlist.
+
+    ``video_ids`` maps song positions to a video id, or ``None`` when the
+    search found nothing. ``tracks`` maps positions to downloaded track
+    dicts holding their workspace; whoever takes the prefetch owns them.
+    """
+
+    def __init__(self, user_id: int, songs: list):
+        self.user_id = user_id
+        self.songs = songs
+        self.video_ids = {}
+        self.tracks = {}
+        self.taken = False
+        self.task = None
+
+    async def _speculate(self) -> None:
+        youtube = await executors.run(
+            "youtube", youtube_services.get_authenticated_service
+        )
+        if not youtube:
+            return
+        for position, song in enumerate(self.songs):
+            if position >= config.PLAYLIST_PREFETCH_SEARCHES:
+                break
+            video_id = await executors.run(
+                "youtube", youtube_services.search_for_song_on_youtube, youtube, song
+            )
+            self.video_ids[position] = video_id
+            _stats["searches"] += 1
+            # Both choices start from the first song, so download it before
+            # looking up the rest.
+            if video_id and position < config.PLAYLIST_PREFETCH_DOWNLOADS:
+                await self._download(position, video_id)
+
+    async def _download(self, position: int, video_id: str) -> None:
+        try:
+            song_workspace = await workspace.get_manager().acquire(
+                timeout=_WORKSPACE_WAIT
+            )
+        except workspace.WorkspaceFullError:
+            return
+        try:
+            track = await jobs.download_song(
+                f"https://www.youtube.com/watch?v={video_id}", song_workspace.path
+            )
+            await song_workspace.settle()
+        except Exception as e:
+            await song_workspace.release()
+            logger.info("Prefetch download of %s failed: %r", video_id, e)
+            return
+        except BaseException:
+            song_workspace.release()
+            raise
+        track["workspace"] = song_workspace
+        track["position"] = position
+        self.tracks[position] = track
+        _stats["downloads"] += 1
+
+    async def _run(self) -> None:
+        try:
+            try:
+                await asyncio.wait_for(
+                    self._speculate(), config.PLAYLIST_PREFETCH_TIMEOUT
+                )
+            except Exception as e:
+                logger.info("Playlist prefetch for %s stopped: %r", self.user_id, e)
+            await asyncio.sleep(config.PLAYLIST_PREFETCH_TTL)
+            _stats["expired"] += 1
+        finally:
+            if _prefetches.get(self.user_id) is self:
+                del _prefetches[self.user_id]
+            if not self.taken:
+                self.release()
+
+    def seed(self, store, job_id: str) -> None:
+        """Record the looked-up video ids on a new playlist job."""
+        for position, video_id in self.video_ids.items():
+            store.update_song(
+                job_id,
+                position,
+                status="resolved" if video_id else "not_found",
+                video_id=video_id,
+            )
+        _stats["searches_used"] += len(self.video_ids)
+
+    def release(self) -> None:
+        """Delete the downloaded tracks that nobody used."""
+        for track in self.tracks.values():
+            track["workspace"].release()
+        _stats["downloads_released"] += len(self.tracks)
+        self.tracks.clear()
+
+
+def start(user_id: int, songs: list) -> bool:
+    """Start speculating on ``songs``, replacing the user's earlier prefetch.
+
+    Returns ``True`` if a prefetch was started.
+    """
+    if not config.PLAYLIST_PREFETCH:
+        return False
+    cancel(user_id)
+    if len(_prefetches) >= config.PLAYLIST_PREFETCH_MAX_ACTIVE:
+        _stats["dropped"] += 1
+        return False
+    prefetch = PlaylistPrefetch(user_id, list(songs))
+    prefetch.task = asyncio.create_task(prefetch._run())
+    _prefetches[user_id] = prefetch
+    _stats["started"] += 1
+    return True
+
+
+def take(user_id: int):
+    """Stop the user's prefetch and hand over what it has, or return None."""
+    prefetch = _prefetches.pop(user_id, None)
+    if prefetch is None:
+        return None
+    prefetch.taken = True
+    prefetch.task.cancel()
+    _stats["taken"] += 1
+    return prefetch
+
+
+def cancel(user_id: int) -> None:
+    """Stop the user's prefetch and free everything it downloaded."""
+    prefetch = _prefetches.pop(user_id, None)
+    if prefetch is None:
+        return
+    prefetch.task.cancel()
+    prefetch.release()
+    _stats["cancelled"] += 1
+
+
+def cancel_all() -> None:
+    for user_id in list(_prefetches):
+        cancel(user_id)
+
+
+def stats() -> dict:
+    return {**_stats, "active": len(_prefetches)}
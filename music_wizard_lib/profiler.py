@@ -0,0 +1,90 @@
+import sys
+import time
+import threading
+import collections
+
+from . import config
+
+# Only one profile runs at a time; sampling itself costs CPU.
+_lock = threading.Lock()
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running."""
+
+
+def _stack(frame) -> tuple:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def _thread_names() -> dict:
+    return {thread.ident: thread.name for thread in threading.enumerate()}
+
+
+def sample(duration: float, interval: float = None) -> dict:
+    """Sample every thread's stack for ``duration`` seconds.
+
+    Returns ``{"samples": n, "stacks": Counter((thread, stack) -> hits)}``.
+    Blocking; run it in a thread so the event loop keeps being sampled.
+    """
+    interval = interval or config.PROFILE_INTERVAL
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already running.")
+    try:
+        me = threading.get_ident()
+        stacks = collections.Counter()
+        names = _thread_names()
+        samples = 0
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names = _thread_names()
+                stacks[(names.get(ident, str(ident)), _stack(frame))] += 1
+            samples += 1
+            time.sleep(interval)
+        return {"samples": samples, "duration": duration, "stacks": stacks}
+    finally:
+        _lock.release()
+
+
+def report(profile: dict, top: int = 40) -> str:
+    """Format a profile as hot functions per thread plus folded stacks.
+
+    The folded section (``thread;outer;...;inner count``) can be fed to
+    flamegraph.pl or speedscope.
+    """
+    samples = profile["samples"] or 1
+    by_thread = collections.defaultdict(collections.Counter)
+    inclusive = collections.defaultdict(collections.Counter)
+    for (thread, stack), hits in profile["stacks"].items():
+        if stack:
+            by_thread[thread][stack[-1]] += hits
+        for function in set(stack):
+            inclusive[thread][function] += hits
+
+    lines = [
+        f"Sampled {profile['samples']} times over {profile['duration']:.1f}s",
+        "",
+    ]
+    for thread in sorted(by_thread):
+        lines.append(f"== Thread {thread} ==")
+        lines.append("  self%  total%  function")
+        for function, hits in by_thread[thread].most_common(top):
+            total = inclusive[thread][function]
+            lines.append(
+                f"{100 * hits / samples:6.1f}  {100 * total / samples:6.1f}  {function}"
+            )
+        lines.append("")
+    lines.append("== Folded stacks ==")
+    for (thread, stack), hits in profile["stacks"].most_common():
+        lines.append(f"{';'.join((thread,) + stack)} {hits}")
+    return "\n".join(lines) + "\n"
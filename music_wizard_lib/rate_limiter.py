@@ -0,0 +1,203 @@
+import time
+import asyncio
+import logging
+
+from telegram.error import NetworkError, RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from . import cache
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# Edits to the same message where only the newest text matters.
+COALESCED_ENDPOINTS = frozenset(
+    {"editMessageText", "editMessageCaption", "editMessageReplyMarkup"}
+)
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second up to ``capacity``.
+
+    ``reserve`` always takes a token and returns how long the caller has to
+    wait before using it, so concurrent callers are served in arrival order.
+    """
+
+    def __init__(self, rate: float, capacity: float, timer=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._timer = timer
+        self._tokens = capacity
+        self._updated = timer()
+        self._blocked_until = 0.0
+
+    def reserve(self) -> float:
+        now = self._timer()
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        return max(wait, self._blocked_until - now)
+
+    def block(self, seconds: float) -> None:
+        """Hand out no tokens for ``seconds``, e.g. after a flood-control error."""
+        self._blocked_until = max(self._blocked_until, self._timer() + seconds)
+        self._tokens = min(self._tokens, 0)
+
+
+class _Interrupted(Exception):
+    """The edit a call was coalesced into was cancelled before it was sent."""
+
+
+class _EditSlot:
+    __slots__ = ("args", "kwargs", "started", "future")
+
+    def __init__(self, args, kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        self.started = False
+        self.future = asyncio.get_running_loop().create_future()
+        # Waiters may all be gone; do not warn about an unretrieved error.
+        self.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+
+class OutboundScheduler(BaseRateLimiter):
+    """Paces every Bot API call made through the application's bot.
+
+    Requests take a token from a global bucket and, when they target a chat,
+    from that chat's bucket (group chats get the slower group rate). Edits to
+    the same message are sent one at a time, and an edit still waiting for a
+    token is replaced by a newer one, so only the latest text goes out.
+    ``RetryAfter`` errors pause the affected bucket and retry the request.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = None,
+        chat_rate: float = None,
+        chat_burst: int = None,
+        group_rate: float = None,
+        max_retries: int = None,
+    ):
+        self.global_rate = global_rate or config.TELEGRAM_GLOBAL_RATE
+        self.chat_rate = chat_rate or config.TELEGRAM_CHAT_RATE
+        self.chat_burst = chat_burst or config.TELEGRAM_CHAT_BURST
+        self.group_rate = group_rate or config.TELEGRAM_GROUP_RATE
+        self.max_retries = (
+            config.TELEGRAM_MAX_RETRIES if max_retries is None else max_retries
+        )
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+        # Idle chats' buckets are full again within a minute, so they can go.
+        self._chats = cache.TTLCache(maxsize=50_000, ttl=60)
+        self._edits = {}
+        self.stats = {"requests": 0, "delayed": 0, "coalesced": 0, "retries": 0}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        for slot in self._edits.values():
+            slot.future.cancel()
+        self._edits.clear()
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            if is_group:
+                bucket = TokenBucket(self.group_rate, self.chat_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+        # Re-setting refreshes the bucket's expiry.
+        self._chats.set(chat_id, bucket)
+        return bucket
+
+    async def _throttle(self, chat_id) -> None:
+        wait = self._global.reserve()
+        if chat_id is not None:
+            wait = max(wait, self._chat_bucket(chat_id).reserve())
+        if wait > 0:
+            self.stats["delayed"] += 1
+            await asyncio.sleep(wait)
+
+    async def _send(self, callback, args, kwargs, chat_id, max_retries):
+        for attempt in range(max_retries + 1):
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == max_retries:
+                    raise
+                self.stats["retries"] += 1
+                logger.warning(
+                    "Flood control for chat %s, retrying in %ss", chat_id, e.retry_after
+                )
+                bucket = self._global if chat_id is None else self._chat_bucket(chat_id)
+                bucket.block(e.retry_after)
+                await self._throttle(chat_id)
+
+    async def _send_edit(self, key, callback, args, kwargs, chat_id, max_retries):
+        slot = self._edits.get(key)
+        if slot is not None and not slot.started:
+            # The newest call is sent whole, timeouts included.
+            slot.args = args
+            slot.kwargs = kwargs
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(slot.future)
+            except _Interrupted:
+                return await self._send_edit(
+                    key, callback, args, kwargs, chat_id, max_retries
+                )
+        previous = slot
+        slot = _EditSlot(args, kwargs)
+        self._edits[key] = slot
+        try:
+            if previous is not None:
+                # Keep edits of one message in order.
+                await asyncio.wait([previous.future])
+            await self._throttle(chat_id)
+            slot.started = True
+            result = await self._send(
+                callback, slot.args, slot.kwargs, chat_id, max_retries
+            )
+            slot.future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # Only the owner was cancelled: calls coalesced into its edit send
+            # it again themselves, or, if it may already have gone out, fail
+            # like a lost connection would.
+            if not slot.future.done():
+                slot.future.set_exception(
+                    NetworkError("The coalesced edit was interrupted.")
+                    if slot.started
+                    else _Interrupted()
+                )
+            raise
+        except Exception as e:
+            slot.future.set_exception(e)
+            raise
+        finally:
+            if self._edits.get(key) is slot:
+                del self._edits[key]
+
+    async def process_request(
+        self, callback, args, kwargs, endpoint, data, rate_limit_args
+    ):
+        self.stats["requests"] += 1
+        max_retries = self.max_retries if rate_limit_args is None else rate_limit_args
+        chat_id = data.get("chat_id")
+        if isinstance(chat_id, str) and chat_id.lstrip("-").isdigit():
+            chat_id = int(chat_id)
+        if endpoint in COALESCED_ENDPOINTS:
+            key = (
+                endpoint,
+                chat_id,
+                data.get("message_id"),
+                data.get("inline_message_id"),
+            )
+            return await self._send_edit(
+                key, callback, args, kwargs, chat_id, max_retries
+            )
+        await self._throttle(chat_id)
+        return await self._send(callback, args, kwargs, chat_id, max_retries)
@@ -0,0 +1,142 @@
+import time
+import asyncio
+
+from telegram.request import BaseRequest, HTTPXRequest
+
+from . import config
+
+# Bot API methods that carry media; they get the upload pool.
+UPLOAD_ENDPOINTS = frozenset(
+    {
+        "sendAudio",
+        "sendDocument",
+        "sendMediaGroup",
+        "sendPhoto",
+        "sendVideo",
+        "sendVoice",
+        "sendAnimation",
+    }
+)
+
+
+class _Pool:
+    """One HTTP client plus the bookkeeping behind its queue-wait metrics."""
+
+    def __init__(self, name: str, size: int, request: BaseRequest):
+        self.name = name
+        self.size = size
+        self.request = request
+        self._slots = asyncio.Semaphore(size)
+        self.requests = 0
+        self.in_flight = 0
+        self.queued = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def do_request(self, **kwargs):
+        self.queued += 1
+        start = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        wait = time.perf_counter() - start
+        self.requests += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.in_flight += 1
+        try:
+            return await self.request.do_request(**kwargs)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "wait_seconds_total": self.wait_total,
+            "wait_seconds_max": self.wait_max,
+        }
+
+
+class RoutedRequest(BaseRequest):
+    """Sends media uploads and control-plane calls through separate pools.
+
+    Multi-megabyte uploads hold their connection for a long time; keeping
+    them in their own pool means ``answerCallbackQuery``, edits and other
+    small calls never queue behind them. ``getUpdates`` keeps using the
+    application's separate ``get_updates_request``.
+    """
+
+    def __init__(self, upload_request=None, control_request=None):
+        if upload_request is None:
+            upload_request = HTTPXRequest(
+                connection_pool_size=config.TELEGRAM_UPLOAD_POOL_SIZE,
+                read_timeout=config.TELEGRAM_UPLOAD_READ_TIMEOUT,
+                write_timeout=config.TELEGRAM_UPLOAD_WRITE_TIMEOUT,
+                connect_timeout=config.TELEGRAM_CONTROL_TIMEOUT,
+                pool_timeout=None,
+            )
+        if control_request is None:
+            control_request = HTTPXRequest(
+                connection_pool_size=config.TELEGRAM_CONTROL_POOL_SIZE,
+                read_timeout=config.TELEGRAM_CONTROL_TIMEOUT,
+                write_timeout=config.TELEGRAM_CONTROL_TIMEOUT,
+                connect_timeout=config.TELEGRAM_CONTROL_TIMEOUT,
+                pool_timeout=config.TELEGRAM_CONTROL_TIMEOUT,
+            )
+        self.pools = {
+            "upload": _Pool(
+                "upload", config.TELEGRAM_UPLOAD_POOL_SIZE, upload_request
+            ),
+            "control": _Pool(
+                "control", config.TELEGRAM_CONTROL_POOL_SIZE, control_request
+            ),
+        }
+
+    @property
+    def read_timeout(self):
+        return self.pools["control"].request.read_timeout
+
+    async def initialize(self) -> None:
+        for pool in self.pools.values():
+            await pool.request.initialize()
+
+    async def shutdown(self) -> None:
+        for pool in self.pools.values():
+            await pool.request.shutdown()
+
+    def pool_for(self, url: str, request_data=None) -> _Pool:
+        endpoint = url.rsplit("/", 1)[-1]
+        if endpoint in UPLOAD_ENDPOINTS or (
+            request_data is not None and request_data.contains_files
+        ):
+            return self.pools["upload"]
+        return self.pools["control"]
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data=None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ):
+        return await self.pool_for(url, request_data).do_request(
+            url=url,
+            method=method,
+            request_data=request_data,
+            read_timeout=read_timeout,
+            write_timeout=write_timeout,
+            connect_timeout=connect_timeout,
+            pool_timeout=pool_timeout,
+        )
+
+    def stats(self) -> dict:
+        """Return per-pool request counts, in-flight calls and queue waits."""
+        return {name: pool.stats() for name, pool in self.pools.items()}
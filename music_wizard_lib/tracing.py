@@ -0,0 +1,156 @@
+import sys
+import json
+import time
+import uuid
+import logging
+import contextlib
+import contextvars
+
+from . import config
+
+# Spans are written through their own logger so they never mix with the
+# human-readable log.
+span_logger = logging.getLogger("music_wizard_lib.spans")
+span_logger.propagate = False
+
+# (trace_id, span_id) of the span the current task is in.
+_current = contextvars.ContextVar("trace_context", default=None)
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def configure(path: str = None) -> bool:
+    """Send spans to ``path`` ("-" for stderr); empty disables tracing.
+
+    Spans are written by a background thread; ``flush()`` waits for them.
+    """
+    from . import logging_setup
+
+    path = config.TRACE_PATH if path is None else path
+    for handler in list(span_logger.handlers):
+        span_logger.removeHandler(handler)
+        handler.close()
+    if not path:
+        span_logger.setLevel(logging.CRITICAL + 1)
+        return False
+    if path == "-":
+        handler = logging.StreamHandler(sys.stderr)
+    else:
+        handler = logging.FileHandler(path, delay=True, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    span_logger.addHandler(
+        logging_setup.BackgroundHandler(handler, config.LOG_QUEUE_SIZE)
+    )
+    span_logger.setLevel(logging.INFO)
+    return True
+
+
+def flush() -> None:
+    for handler in span_logger.handlers:
+        handler.flush()
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = (
+        "name",
+        "attrs",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start",
+        "wall",
+        "_token",
+    )
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is None:
+            self.trace_id, self.parent_id = _new_id(), None
+        else:
+            self.trace_id, self.parent_id = parent
+        self.span_id = _new_id()
+        self._token = _current.set((self.trace_id, self.span_id))
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _current.reset(self._token)
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.wall, 6),
+            "duration_ms": round(duration * 1000, 3),
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        if self.attrs:
+            record["attrs"] = self.attrs
+        span_logger.info(json.dumps(record, default=str, ensure_ascii=False))
+        return False
+
+    def set(self, **attrs) -> None:
+        """Attach attributes found out while the span runs."""
+        self.attrs.update(attrs)
+
+
+def span(name: str, **attrs):
+    """Time a block as a span of the current trace, starting one if needed.
+
+    With tracing disabled this returns a shared no-op object, so a span
+    costs one logger level check.
+    """
+    if not span_logger.isEnabledFor(logging.INFO):
+        return _NOOP
+    return _Span(name, attrs)
+
+
+def current() -> tuple:
+    """Return ``(trace_id, span_id)`` to hand a trace to another process."""
+    return _current.get()
+
+
+def current_trace_id():
+    context = _current.get()
+    return context[0] if context else None
+
+
+@contextlib.contextmanager
+def attach(context):
+    """Continue the trace ``context`` (from ``current()``) in this task."""
+    if not context:
+        yield
+        return
+    token = _current.set(tuple(context))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+configure()
@@ -1,13 +1,168 @@
+import os
+import logging
+from contextlib import ExitStack
+
+from telegram import InputMediaAudio
+from telegram.error import TelegramError
+
 from . import config
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _pack(parts, separator: str, limit: int, split_part) -> list:
+    """Greedily join ``parts`` into chunks no longer than ``limit``.
+
+    Parts that are too long on their own are broken up with ``split_part``.
+    """
+    chunks, current = [], ""
+    for part in parts:
+        candidate = f"{current}{separator}{part}" if current else part
+        if len(candidate) <= limit:
+            current = candidate
+            continue
+        if current:
+            chunks.append(current)
+            current = ""
+        if len(part) <= limit:
+            current = part
+        else:
+            pieces = split_part(part, limit)
+            chunks.extend(pieces[:-1])
+            current = pieces[-1]
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _split_hard(text: str, limit: int) -> list:
+    return [text[i : i + limit] for i in range(0, len(text), limit)]
+
+
+def _split_words(line: str, limit: int) -> list:
+    return _pack(line.split(" "), " ", limit, _split_hard)
+
+
+def _split_lines(block: str, limit: int) -> list:
+    return _pack(block.split("\n"), "\n", limit, _split_words)
+
+
+def split_text(text: str, limit: int = None) -> list:
+    """Split ``text`` into chunks of at most ``limit`` characters.
+
+    Chunks break between sections (blank lines) where possible, then between
+    lines, then between words, and only cut inside a word as a last resort.
+    """
+    limit = limit or config.TELEGRAM_MESSAGE_LIMIT
+    if len(text) <= limit:
+        return [text]
+    return _pack(text.split("\n\n"), "\n\n", limit, _split_lines)
 
 
 async def send_long_message(bot, chat_id: int, text: str):
-    if len(text) <= config.TELEGRAM_MESSAGE_LIMIT:
-        await bot.send_message(chat_id=chat_id, text=text)
-        return
-    chunks = [
-        text[i : i + config.TELEGRAM_MESSAGE_LIMIT]
-        for i in range(0, len(text), config.TELEGRAM_MESSAGE_LIMIT)
-    ]
-    for chunk in chunks:
+    for chunk in split_text(text):
         await bot.send_message(chat_id=chat_id, text=chunk)
+
+
+class FileTooLargeError(Exception):
+    """Raised when a file is above ``config.MAX_FILE_SIZE_MB``."""
+
+
+def _caption(track: dict) -> str:
+    return f"{track['title']} by {track['artist']}"
+
+
+def _check_size(path: str) -> None:
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    if size_mb > config.MAX_FILE_SIZE_MB:
+        raise FileTooLargeError(
+            f"File is {size_mb:.1f} MB, above the "
+            f"{config.MAX_FILE_SIZE_MB} MB upload limit."
+        )
+
+
+def _audio_input(bot, path: str, stack: ExitStack):
+    """Return what to pass as the audio of a request for ``path``.
+
+    A bot talking to a local Bot API server gets the path itself, which the
+    server reads from disk; otherwise the file is opened and uploaded.
+    """
+    if getattr(bot, "local_mode", False):
+        return os.path.abspath(path)
+    return stack.enter_context(open(path, "rb"))
+
+
+async def send_audio_track(bot, chat_id: int, track: dict):
+    """Send one downloaded track (``path``, ``title``, ``artist``) as audio."""
+    _check_size(track["path"])
+    with ExitStack() as stack, metrics.stage("telegram_upload"):
+        return await bot.send_audio(
+            chat_id=chat_id,
+            audio=_audio_input(bot, track["path"], stack),
+            filename=os.path.basename(track["path"]),
+            caption=_caption(track),
+            title=track["title"],
+            performer=track["artist"],
+            read_timeout=config.TELEGRAM_UPLOAD_READ_TIMEOUT,
+            write_timeout=config.TELEGRAM_UPLOAD_WRITE_TIMEOUT,
+        )
+
+
+async def send_audio_tracks(bot, chat_id: int, tracks: list) -> list:
+    """Send tracks one message each; ``None`` marks tracks that failed."""
+    results = []
+    for track in tracks:
+        try:
+            results.append(await send_audio_track(bot, chat_id, track))
+        except (TelegramError, OSError, FileTooLargeError) as e:
+            logger.error("Failed to send '%s': %s", track["path"], e)
+            results.append(None)
+    return results
+
+
+async def send_audio_group(bot, chat_id: int, tracks: list) -> list:
+    """Send tracks as albums of up to ``config.MEDIA_GROUP_SIZE`` audios.
+
+    Order is preserved. If an album is rejected, its tracks are retried one
+    by one so a single bad file does not drop the rest. Returns the sent
+    ``Message`` for each track, or ``None`` for tracks that failed.
+    """
+    results = {}
+    sendable = []
+    for position, track in enumerate(tracks):
+        try:
+            _check_size(track["path"])
+            sendable.append((position, track))
+        except (OSError, FileTooLargeError) as e:
+            logger.error("Not sending '%s': %s", track["path"], e)
+            results[position] = None
+    size = config.MEDIA_GROUP_SIZE
+    for start in range(0, len(sendable), size):
+        positions, group = zip(*sendable[start : start + size])
+        if len(group) == 1:
+            sent = await send_audio_tracks(bot, chat_id, group)
+        else:
+            try:
+                with ExitStack() as stack, metrics.stage("telegram_upload"):
+                    media = [
+                        InputMediaAudio(
+                            media=_audio_input(bot, track["path"], stack),
+                            filename=os.path.basename(track["path"]),
+                            caption=_caption(track),
+                            title=track["title"],
+                            performer=track["artist"],
+                        )
+                        for track in group
+                    ]
+                    sent = await bot.send_media_group(
+                        chat_id=chat_id,
+                        media=media,
+                        read_timeout=config.TELEGRAM_UPLOAD_READ_TIMEOUT,
+                        write_timeout=config.TELEGRAM_UPLOAD_WRITE_TIMEOUT,
+                    )
+            except (TelegramError, OSError) as e:
+                logger.warning("Media group failed (%s), sending tracks one by one", e)
+                sent = await send_audio_tracks(bot, chat_id, group)
+        results.update(zip(positions, sent))
+    return [results[position] for position in range(len(tracks))]
@@ -0,0 +1,119 @@
+import os
+import hmac
+import json
+import signal
+import asyncio
+import logging
+import multiprocessing
+from http import HTTPStatus
+
+from telegram import Update
+
+from . import config
+from .http_server import HTTPServer
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+def webhook_route(application, secret_token: str):
+    """Return a handler that validates webhook POSTs and queues the updates."""
+
+    async def handle(headers, body):
+        received = headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(received.encode(), secret_token.encode()):
+            return HTTPStatus.FORBIDDEN, "text/plain", b""
+        try:
+            update = Update.de_json(json.loads(body), application.bot)
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning("Rejected malformed webhook payload: %s", e)
+            return HTTPStatus.BAD_REQUEST, "text/plain", b""
+        await application.update_queue.put(update)
+        return HTTPStatus.OK, "text/plain", b""
+
+    return handle
+
+
+async def serve_webhook(application, worker_index: int = 0) -> None:
+    """Run ``application`` on the webhook server until SIGINT/SIGTERM.
+
+    Only the first worker registers the webhook with Telegram; the others
+    share the listening port through ``SO_REUSEPORT``.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    server = HTTPServer(
+        {
+            ("POST", config.WEBHOOK_PATH): webhook_route(
+                application, config.WEBHOOK_SECRET
+            )
+        },
+        config.WEBHOOK_LISTEN,
+        config.WEBHOOK_PORT,
+        reuse_port=config.WEBHOOK_WORKERS > 1,
+    )
+    application.bot_data["worker_index"] = worker_index
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        if worker_index == 0:
+            await application.bot.set_webhook(
+                url=config.WEBHOOK_URL,
+                secret_token=config.WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+            )
+        await server.start()
+        logger.info(
+            "Webhook worker %s listening on %s:%s%s",
+            worker_index,
+            config.WEBHOOK_LISTEN,
+            server.port,
+            config.WEBHOOK_PATH,
+        )
+        await stop.wait()
+        await server.stop()
+        await application.stop()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+def _run_worker(build_application, worker_index: int) -> None:
+    asyncio.run(serve_webhook(build_application(), worker_index))
+
+
+def run_webhook(build_application) -> None:
+    """Serve the bot over a webhook with ``config.WEBHOOK_WORKERS`` processes.
+
+    ``build_application`` is called in every worker process so each one has
+    its own Application; they split incoming connections between them.
+    """
+    if not config.WEBHOOK_URL or not config.WEBHOOK_SECRET:
+        raise ValueError("WEBHOOK_URL and WEBHOOK_SECRET must be set in webhook mode.")
+    if config.WEBHOOK_WORKERS <= 1:
+        _run_worker(build_application, 0)
+        return
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(
+            target=_run_worker, args=(build_application, index), daemon=False
+        )
+        for index in range(config.WEBHOOK_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def stop_workers(signum, frame):
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop_workers)
+    signal.signal(signal.SIGTERM, stop_workers)
+    for worker in workers:
+        worker.join()
@@ -0,0 +1,214 @@
+import os
+import uuid
+import shutil
+import asyncio
+import logging
+import contextlib
+
+from . import config
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Folder deletions still running, so their tasks are not garbage collected.
+_removals = set()
+
+
+class WorkspaceFullError(Exception):
+    """Raised when no room frees up in the download budget in time."""
+
+
+def _disk_usage(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Workspace:
+    """A download folder holding a reservation on the manager's budget."""
+
+    def __init__(self, manager, path: str, reserved: int):
+        self.manager = manager
+        self.path = path
+        self.reserved = reserved
+        self._removal = None
+
+    async def settle(self) -> int:
+        """Shrink the reservation to what the folder actually uses now."""
+        used = await asyncio.to_thread(_disk_usage, self.path)
+        if used < self.reserved:
+            self.manager._release_bytes(self.reserved - used)
+            self.reserved = used
+        return used
+
+    def release(self) -> asyncio.Future:
+        """Delete the folder and return its bytes to the budget. Idempotent.
+
+        The folder is deleted in a thread and its bytes go back to the budget
+        once it is gone; await the returned future to wait for that.
+        """
+        if self._removal is None:
+            self.manager._active.discard(self)
+            reserved, self.reserved = self.reserved, 0
+            self._removal = asyncio.ensure_future(
+                asyncio.to_thread(shutil.rmtree, self.path, ignore_errors=True)
+            )
+            _removals.add(self._removal)
+            self._removal.add_done_callback(_removals.discard)
+            if reserved:
+                self._removal.add_done_callback(
+                    lambda _: self.manager._release_bytes(reserved)
+                )
+        # Shielded, so a caller cancelled while waiting leaves the deletion
+        # and the bytes' return running.
+        return asyncio.shield(self._removal)
+
+
+class WorkspaceManager:
+    """Hands out download folders under ``root`` within a byte budget.
+
+    Each workspace reserves ``reserve_bytes`` up front; when the budget is
+    used up, callers wait in arrival order until other workspaces are
+    released. The budget covers this process only, see ``process_budget``.
+    Folder names start with the owning process id so that ``clean_orphans``
+    can remove what crashed processes left behind.
+    """
+
+    def __init__(self, root: str, budget_bytes: int, reserve_bytes: int):
+        self.root = root
+        self.budget = budget_bytes
+        # A reservation above the budget could never be granted.
+        self.reserve_bytes = min(reserve_bytes, budget_bytes)
+        self._reserved = 0
+        self._waiters = []
+        self._active = set()
+        self.rejected = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _release_bytes(self, size: int) -> None:
+        self._reserved -= size
+        while self._waiters and self._reserved + self._waiters[0][0] <= self.budget:
+            size, future = self._waiters.pop(0)
+            if future.done():
+                continue
+            self._reserved += size
+            future.set_result(None)
+
+    async def _reserve(self, size: int, timeout: float) -> None:
+        if size > self.budget:
+            raise WorkspaceFullError(f"{size} bytes exceed the workspace budget.")
+        if not self._waiters and self._reserved + size <= self.budget:
+            self._reserved += size
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (size, future)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # Granted just as we gave up; hand the bytes on.
+                self._release_bytes(size)
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise WorkspaceFullError("Timed out waiting for workspace.") from e
+            raise
+
+    async def acquire(self, size: int = None, timeout: float = None) -> Workspace:
+        """Reserve ``size`` bytes and create a fresh folder for them."""
+        size = self.reserve_bytes if size is None else size
+        with tracing.span("workspace_wait", bytes=size):
+            await self._reserve(size, timeout or config.WORKSPACE_WAIT_TIMEOUT)
+        path = os.path.join(self.root, f"{os.getpid()}-{uuid.uuid4().hex}")
+        try:
+            os.makedirs(path)
+        except BaseException:
+            self._release_bytes(size)
+            raise
+        workspace = Workspace(self, path, size)
+        self._active.add(workspace)
+        return workspace
+
+    @contextlib.asynccontextmanager
+    async def workspace(self, size: int = None, timeout: float = None):
+        workspace = await self.acquire(size, timeout)
+        try:
+            yield workspace
+        finally:
+            await workspace.release()
+
+    def clean_orphans(self) -> int:
+        """Remove folders left by processes that are no longer running.
+
+        Folders carrying this process's own id come from an earlier run that
+        happened to get the same pid (e.g. PID 1 in a container), since this
+        should be called at startup, before any workspace is handed out.
+        """
+        removed = 0
+        for name in os.listdir(self.root):
+            pid, _, _ = name.partition("-")
+            if not pid.isdigit():
+                continue
+            pid = int(pid)
+            if pid == os.getpid() or not _pid_alive(pid):
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                removed += 1
+        if removed:
+            logger.info("Removed %s orphaned workspaces from %s", removed, self.root)
+        return removed
+
+    def disk_usage(self) -> int:
+        """Bytes currently on disk under ``root``, from any process."""
+        return _disk_usage(self.root)
+
+    def stats(self) -> dict:
+        return {
+            "budget_bytes": self.budget,
+            "reserved_bytes": self._reserved,
+            "active": len(self._active),
+            "waiting": len(self._waiters),
+            "rejected": self.rejected,
+        }
+
+
+_manager = None
+
+
+def process_budget() -> int:
+    """This process's share of ``WORKSPACE_BUDGET_MB``, in bytes.
+
+    A manager only counts the reservations of its own process, so webhook
+    workers split the budget evenly to stay within it together.
+    """
+    processes = config.WEBHOOK_WORKERS if config.BOT_MODE == "webhook" else 1
+    return config.WORKSPACE_BUDGET_MB * MB // max(processes, 1)
+
+
+def get_manager() -> WorkspaceManager:
+    global _manager
+    if _manager is None:
+        _manager = WorkspaceManager(
+            config.SCRATCH_DIR,
+            process_budget(),
+            config.WORKSPACE_RESERVE_MB * MB,
+        )
+    return _manager
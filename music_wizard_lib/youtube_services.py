@@ -1,16 +1,24 @@
 import os
 import pickle
 import logging
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 from . import config
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
 
+def preload() -> None:
+    """Import the Google client libraries, which are slow to load."""
+    import google.auth.transport.requests  # noqa: F401
+    import google_auth_oauthlib.flow  # noqa: F401
+    import googleapiclient.discovery  # noqa: F401
+
+
 def get_authenticated_service():
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+    from googleapiclient.discovery import build
+
     try:
         credentials = None
         if os.path.exists(config.TOKEN_FILE):
@@ -33,29 +41,34 @@ def get_authenticated_service():
                 pickle.dump(credentials, token)
         return build(config.API_NAME, config.API_VERSION, credentials=credentials)
     except Exception as e:
-        logger.error(f"Failed to authenticate with YouTube: {e}")
+        logger.error("Failed to authenticate with YouTube: %s", e)
         return None
 
 
 def search_for_song_on_youtube(youtube, song):
+    from googleapiclient.errors import HttpError
+
     query = f"{song['artist']} {song['title']}"
-    logger.info(f"Searching YouTube for '{query}'...")
+    logger.info("Searching YouTube for '%s'...", query)
     try:
-        search_response = (
-            youtube.search()
-            .list(q=query, part="snippet", maxResults=1, type="video")
-            .execute()
-        )
+        with metrics.stage("youtube_search"):
+            search_response = (
+                youtube.search()
+                .list(q=query, part="snippet", maxResults=1, type="video")
+                .execute()
+            )
         items = search_response.get("items", [])
         if not items:
             return None
         return items[0]["id"]["videoId"]
     except HttpError as e:
-        logger.error(f"Youtube failed: {e}")
+        logger.error("Youtube failed: %s", e)
         return None
 
 
 def create_youtube_playlist(youtube, title, description):
+    from googleapiclient.errors import HttpError
+
     try:
         playlist_response = (
             youtube.playlists()
@@ -74,13 +87,15 @@ def create_youtube_playlist(youtube, title, description):
         )
         return playlist_response["id"]
     except HttpError as e:
-        logger.error(f"Could not create YouTube playlist: {e}")
+        logger.error("Could not create YouTube playlist: %s", e)
         return None
 
 
 def add_video_to_youtube_playlist(youtube, playlist_id, video_id):
+    from googleapiclient.errors import HttpError
+
     try:
-        youtube.playlistItems().insert(
+        response = youtube.playlistItems().insert(
             part="snippet",
             body={
                 "snippet": {
@@ -89,6 +104,6 @@ def add_video_to_youtube_playlist(youtube, playlist_id, video_id):
                 }
             },
         ).execute()
-        return True
+        return response["id"]
     except HttpError:
-        return False
+        return None
@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_data_files(monkeypatch, tmp_path):
+    # Keep on-disk stores created by the library out of the working tree.
+    monkeypatch.setenv("LYRICS_INDEX_PATH", str(tmp_path / "lyrics_index.sqlite3"))
+    monkeypatch.setenv("JOB_QUEUE_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setenv("PERSISTENCE_PATH", str(tmp_path / "bot_state.sqlite3"))
+    monkeypatch.setenv("PLAYLIST_JOBS_PATH", str(tmp_path / "playlist_jobs.sqlite3"))
+    monkeypatch.setenv("SCRATCH_DIR", str(tmp_path / "scratch"))
+    monkeypatch.setenv("CATALOG_PATH", str(tmp_path / "song_catalog.sqlite3"))
+    monkeypatch.setenv("CALLBACK_STORE_PATH", str(tmp_path / "callbacks.sqlite3"))
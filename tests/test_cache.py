@@ -0,0 +1,46 @@
+import pytest
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def cache_module(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    import music_wizard_lib.cache as cache
+
+    return cache
+
+
+def test_ttl_cache_expires_entries(cache_module):
+    clock = FakeClock()
+    cache = cache_module.TTLCache(maxsize=10, ttl=5, timer=clock)
+    cache.set("a", 1)
+
+    clock.now = 4
+    assert cache.get("a") == 1
+
+    clock.now = 5
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used(cache_module):
+    cache = cache_module.TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
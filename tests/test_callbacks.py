@@ -0,0 +1,104 @@
+import importlib
+
+import pytest
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def callbacks(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    from music_wizard_lib import config, callbacks
+
+    importlib.reload(config)
+    importlib.reload(callbacks)
+    return callbacks
+
+
+def test_put_get_pop(callbacks):
+    timer = FakeTimer()
+    store = callbacks.CallbackStore(
+        ":memory:", maxsize=10, per_chat=3, ttl=60, timer=timer
+    )
+    callback_id = store.put(1, "Queen", "Bohemian Rhapsody")
+    assert len(f"lyrics_{callback_id}".encode()) <= 64
+    assert store.get(callback_id) == ("Queen", "Bohemian Rhapsody")
+    # Buttons cannot be replayed from another chat.
+    assert store.pop(callback_id, chat_id=2) is None
+    assert store.pop(callback_id, chat_id=1) == ("Queen", "Bohemian Rhapsody")
+    assert store.get(callback_id) is None
+
+    callback_id = store.put(1, "A", "B")
+    timer.now = 61
+    assert store.get(callback_id) is None
+    assert store.stats()["expired"] == 1
+
+
+def test_per_chat_and_global_limits(callbacks):
+    timer = FakeTimer()
+    store = callbacks.CallbackStore(
+        ":memory:", maxsize=5, per_chat=2, ttl=60, evict_every=1, timer=timer
+    )
+
+    def tick(value):
+        timer.now += 1
+        return value
+
+    first, second, third = (tick(store.put(1, "a", str(i))) for i in range(3))
+    assert store.get(first) is None
+    assert tick(store.get(second)) and tick(store.get(third))
+
+    others = [tick(store.put(chat, "a", "b")) for chat in range(2, 6)]
+    assert len(store) == 5
+    # Least recently used goes first: ``second`` was read before ``third``.
+    assert store.get(second) is None
+    assert all(store.get(callback_id) for callback_id in others)
+
+
+def test_memory_stays_flat_under_soak(callbacks):
+    timer = FakeTimer()
+    store = callbacks.CallbackStore(
+        ":memory:", maxsize=2000, per_chat=5, ttl=600, timer=timer
+    )
+    sizes = []
+    for step in range(50_000):
+        timer.now = step * 0.05
+        store.put(step % 3000, "Some Artist", f"Some Title {step % 97}")
+        if step % 10_000 == 9_999:
+            sizes.append(store.stats()["bytes"])
+    assert len(store) <= 2000
+    assert max(sizes) < min(sizes) * 1.2
+
+
+def test_global_limit_is_checked_every_few_puts(callbacks):
+    store = callbacks.CallbackStore(":memory:", maxsize=5, evict_every=4)
+    for chat in range(7):
+        store.put(chat, "a", "b")
+    # Checked at the fourth put only; the next check is at the eighth.
+    assert len(store) == 7
+    store.put(7, "a", "b")
+    assert len(store) == 5
+
+
+def test_buttons_survive_restart_and_other_processes(callbacks, tmp_path):
+    path = str(tmp_path / "callbacks.sqlite3")
+    first = callbacks.CallbackStore(path)
+    callback_id = first.put(1, "Queen", "x" * 1000)
+    # Another process, or this one after a restart, sees the same button.
+    second = callbacks.CallbackStore(path)
+    artist, title = second.pop(callback_id, chat_id=1)
+    assert artist == "Queen"
+    assert len(title.encode()) == callbacks.config.CALLBACK_VALUE_BYTES
+    assert first.get(callback_id) is None
+    first.close()
+    second.close()
@@ -0,0 +1,75 @@
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    from music_wizard_lib import config, catalog
+
+    importlib.reload(config)
+    importlib.reload(catalog)
+    song_catalog = catalog.get_catalog()
+    song_catalog.add_many(
+        [
+            ("Survivor", "Eye of the Tiger", "tiger-1"),
+            ("Queen", "Bohemian Rhapsody", "queen-1"),
+            ("Queen", "Don't Stop Me Now", "queen-2"),
+        ]
+    )
+    yield song_catalog
+    song_catalog.close()
+
+
+def titles(songs) -> list:
+    return [song["title"] for song in songs]
+
+
+def test_search_prefix_fuzzy_and_recent(catalog):
+    assert titles(catalog.search("eye of the ti")) == ["Eye of the Tiger"]
+    assert titles(catalog.search("queen boh")) == ["Bohemian Rhapsody"]
+    assert titles(catalog.search("bohemain rapsody")) == ["Bohemian Rhapsody"]
+    assert catalog.search("zzzz") == []
+    # Typos in the artist, the title, or both.
+    assert titles(catalog.search("survivr")) == ["Eye of the Tiger"]
+    assert titles(catalog.search("tigr")) == ["Eye of the Tiger"]
+    assert titles(catalog.search("tiger survivr")) == ["Eye of the Tiger"]
+    assert titles(catalog.search("quen bohemain")) == ["Bohemian Rhapsody"]
+    assert len(catalog.search("")) == 3
+
+    # Sending a song again refreshes its file_id instead of adding a copy.
+    catalog.add("SURVIVOR", "Eye of the Tiger (Official Video)", "tiger-2")
+    assert len(catalog) == 3
+    assert catalog.search("tiger")[0]["file_id"] == "tiger-2"
+    assert catalog.search("", limit=1)[0]["file_id"] == "tiger-2"
+
+
+@pytest.mark.asyncio
+async def test_inline_query_answers_from_catalog(catalog):
+    import bot
+
+    answers = []
+
+    async def answer(results, **kwargs):
+        answers.append((results, kwargs))
+
+    def update(text):
+        return SimpleNamespace(inline_query=SimpleNamespace(query=text, answer=answer))
+
+    context = SimpleNamespace(user_data={"lang": "ru"})
+    await bot.inline_query(update("queen"), context)
+    await bot.inline_query(update("nothing like this"), context)
+
+    results, kwargs = answers[0]
+    assert {result.audio_file_id for result in results} == {"queen-1", "queen-2"}
+    assert kwargs["button"] is None
+    results, kwargs = answers[1]
+    assert results == []
+    assert kwargs["button"].start_parameter == "inline"
+    assert kwargs["button"].text.startswith("🔍 Не нашли?")
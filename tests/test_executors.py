@@ -0,0 +1,67 @@
+import asyncio
+import importlib
+import threading
+import contextvars
+
+import pytest
+
+
+@pytest.fixture
+def executors(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    monkeypatch.setenv("EXECUTOR_THREADS", "lyrics=1")
+
+    from music_wizard_lib import config, executors
+
+    importlib.reload(config)
+    assert config.EXECUTOR_THREADS["lyrics"] == 1
+    assert config.EXECUTOR_THREADS["youtube"] == 8
+    importlib.reload(executors)
+    yield executors
+    executors.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_slow_class_does_not_block_others(executors):
+    release = threading.Event()
+    slow = [
+        asyncio.create_task(executors.run("lyrics", release.wait, 5))
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0.05)
+    stats = executors.stats()["lyrics"]
+    assert (stats["in_flight"], stats["queued"]) == (1, 2)
+
+    request = contextvars.ContextVar("request")
+    request.set("abc")
+
+    def quick():
+        return threading.current_thread().name, request.get()
+
+    result = await asyncio.wait_for(executors.run("youtube", quick), 1)
+    assert result[0].startswith("youtube-io")
+    assert result[1] == "abc"
+
+    release.set()
+    assert await asyncio.gather(*slow) == [True, True, True]
+    stats = executors.stats()["lyrics"]
+    assert (stats["calls"], stats["in_flight"], stats["queued"]) == (3, 0, 0)
+    assert stats["wait_seconds_max"] > 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_queued_call_leaves_the_queue(executors):
+    release = threading.Event()
+    running = asyncio.create_task(executors.run("lyrics", release.wait, 5))
+    queued = asyncio.create_task(executors.run("lyrics", release.wait, 5))
+    await asyncio.sleep(0.05)
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+    release.set()
+    await running
+    stats = executors.stats()["lyrics"]
+    assert (stats["in_flight"], stats["queued"]) == (0, 0)
@@ -0,0 +1,160 @@
+import time
+import sqlite3
+import asyncio
+import importlib
+
+import pytest
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    monkeypatch.setenv("DOWNLOAD_WORKERS", "1")
+
+    from music_wizard_lib import config, jobs
+
+    importlib.reload(config)
+    importlib.reload(jobs)
+    monkeypatch.setattr(config, "JOB_POLL_INTERVAL", 0.01)
+    yield jobs
+    if jobs._queue is not None:
+        jobs._queue.close()
+
+
+def test_claim_complete_and_cancel(jobs, tmp_path):
+    queue = jobs.JobQueue(str(tmp_path / "q.sqlite3"))
+    first = queue.enqueue("download", {"url": "a"})
+    second = queue.enqueue("download", {"url": "b"})
+
+    job = queue.claim("w1")
+    assert job["id"] == first and job["state"] == "running"
+    assert job["payload"] == {"url": "a"}
+    assert queue.heartbeat(first, "w1")
+    assert not queue.heartbeat(first, "w2")
+    assert queue.complete(first, "w1", {"path": "x"})
+    assert queue.get(first)["result"] == {"path": "x"}
+
+    assert queue.claim("w2")["id"] == second
+    assert queue.cancel(second)
+    # A cancelled job's worker learns about it on its next heartbeat.
+    assert not queue.heartbeat(second, "w2")
+    assert queue.claim("w1") is None
+    assert queue.depth() == {"done": 1, "cancelled": 1}
+    queue.close()
+
+
+def test_expired_lease_is_requeued_then_failed(jobs, tmp_path):
+    queue = jobs.JobQueue(str(tmp_path / "q.sqlite3"), max_attempts=2)
+    job_id = queue.enqueue("download", {})
+
+    assert queue.claim("crashed", lease_seconds=0.01)["id"] == job_id
+    time.sleep(0.02)
+    job = queue.claim("w2", lease_seconds=0.01)
+    assert job["id"] == job_id and job["attempts"] == 2
+    # The first worker lost the job and cannot report on it any more.
+    assert not queue.complete(job_id, "crashed", {})
+
+    time.sleep(0.02)
+    assert queue.claim("w3") is None
+    job = queue.get(job_id)
+    assert job["state"] == "failed" and job["error"] == "lease expired"
+    queue.close()
+
+
+def test_idle_claim_does_not_take_write_lock(jobs, tmp_path):
+    path = str(tmp_path / "q.sqlite3")
+    queue = jobs.JobQueue(path)
+    writer = sqlite3.connect(path, isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        started = time.monotonic()
+        assert queue.claim("w1") is None
+        assert time.monotonic() - started < 1
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+    queue.close()
+
+
+@pytest.mark.asyncio
+async def test_submit_runs_on_worker_after_crash(jobs, monkeypatch):
+    calls = []
+
+    async def fake_download(payload):
+        calls.append(payload)
+        return {"path": payload["url"] + ".mp3"}
+
+    monkeypatch.setitem(jobs.JOB_KINDS, "download", fake_download)
+    queue = jobs.get_job_queue()
+    # A job left behind by a worker that died mid-download.
+    orphan = queue.enqueue("download", {"url": "orphan"})
+    queue.claim("crashed", lease_seconds=0.01)
+    await asyncio.sleep(0.02)
+
+    stop = asyncio.Event()
+    worker = asyncio.create_task(jobs.worker_main(queue, "w1", stop))
+    result = await asyncio.wait_for(jobs.submit("download", {"url": "song"}), 5)
+    stop.set()
+    await worker
+
+    assert result == {"path": "song.mp3"}
+    assert queue.get(orphan)["state"] == "done"
+    assert [call["url"] for call in calls] == ["orphan", "song"]
+
+
+@pytest.mark.asyncio
+async def test_failed_job_raises(jobs, monkeypatch):
+    async def broken(payload):
+        raise RuntimeError("yt-dlp exploded")
+
+    monkeypatch.setitem(jobs.JOB_KINDS, "download", broken)
+    queue = jobs.get_job_queue()
+    stop = asyncio.Event()
+    worker = asyncio.create_task(jobs.worker_main(queue, "w1", stop))
+    with pytest.raises(jobs.JobFailedError, match="yt-dlp exploded"):
+        await asyncio.wait_for(jobs.submit("download", {}), 5)
+    stop.set()
+    await worker
+
+
+@pytest.mark.asyncio
+async def test_cancelled_submit_returns_after_worker_stops(jobs, monkeypatch):
+    monkeypatch.setattr(jobs.config, "JOB_HEARTBEAT_INTERVAL", 0.1)
+    started, stopped = asyncio.Event(), asyncio.Event()
+
+    async def endless(payload):
+        started.set()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            stopped.set()
+
+    monkeypatch.setitem(jobs.JOB_KINDS, "download", endless)
+    queue = jobs.get_job_queue()
+    stop = asyncio.Event()
+    worker = asyncio.create_task(jobs.worker_main(queue, "w1", stop))
+    submitted = asyncio.create_task(jobs.submit("download", {}))
+    await asyncio.wait_for(started.wait(), 5)
+    submitted.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(submitted, 5)
+    # Only now may the caller delete the job's folder.
+    assert stopped.is_set()
+    stop.set()
+    await worker
+
+
+def test_housekeeping_purges_old_finished_jobs(jobs, monkeypatch):
+    import bot
+
+    queue = jobs.get_job_queue()
+    old, running = queue.enqueue("download", {}), queue.enqueue("download", {})
+    queue.cancel(old)
+    queue.claim("w1")
+    monkeypatch.setattr(bot.config, "JOB_RETENTION", -1)
+    bot.purge_old_rows()
+    assert queue.get(old) is None
+    assert queue.get(running)["state"] == "running"
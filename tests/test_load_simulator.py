@@ -0,0 +1,35 @@
+import os
+import sys
+import json
+import subprocess
+
+SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "benchmarks",
+    "load_simulator.py",
+)
+
+
+def test_flows_complete_against_fakes(tmp_path):
+    results = tmp_path / "results.json"
+    latency = ["0.01"] * 7
+    services = ["--telegram", "--youtube", "--openai", "--genius", "--metadata"]
+    services += ["--download", "--transcode"]
+    process = subprocess.run(
+        [sys.executable, SCRIPT, "--users", "2", "--flows", "1"]
+        + [arg for pair in zip(services, latency) for arg in pair]
+        + ["--mix", "song=1,playlist=1", "--playlist-size", "2"]
+        + ["--think-time", "0", "--step-timeout", "30", "--unthrottled"]
+        + ["--json", str(results)],
+        capture_output=True,
+        text=True,
+        timeout=120,
+        env={**os.environ, "SCRATCH_DIR": str(tmp_path / "scratch")},
+    )
+    assert process.returncode == 0, process.stdout + process.stderr
+
+    [level] = json.loads(results.read_text())
+    assert level["users"] == 2
+    assert sum(flow["completed"] for flow in level["flows"].values()) == 2
+    assert not any(flow["failed"] for flow in level["flows"].values())
+    assert level["telegram_calls"] > 0
@@ -0,0 +1,95 @@
+import json
+import threading
+import importlib
+from pathlib import Path
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Wizard", "username": "wizard_bot"}
+
+
+class FakeBotApiServer(ThreadingHTTPServer):
+    """Stand-in for a local Bot API server that records every request."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeBotApiHandler)
+        self.requests = []
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/bot"
+
+
+class FakeBotApiHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        method = self.path.rsplit("/", 1)[-1]
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content_type = self.headers.get("Content-Type", "")
+        self.server.requests.append((method, content_type, body))
+        if method == "getMe":
+            result = BOT_USER
+        else:
+            params = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+            result = {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": int(params["chat_id"]), "type": "private"},
+                "audio": {"file_id": "f1", "file_unique_id": "u1", "duration": 1},
+            }
+        payload = json.dumps({"ok": True, "result": result}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def bot_api_server():
+    server = FakeBotApiServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.asyncio
+async def test_local_mode_sends_audio_by_path(monkeypatch, tmp_path, bot_api_server):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    monkeypatch.setenv("TELEGRAM_LOCAL_MODE", "1")
+
+    import music_wizard_lib.config as config
+
+    importlib.reload(config)
+    assert config.MAX_FILE_SIZE_MB == 2000
+
+    import music_wizard_lib.utils as utils
+
+    importlib.reload(utils)
+    from telegram import Bot
+
+    audio = tmp_path / "song.mp3"
+    audio.write_bytes(b"ID3" * 1000)
+    bot = Bot("123:abc", base_url=bot_api_server.base_url, local_mode=True)
+
+    async with bot:
+        message = await utils.send_audio_track(
+            bot, 42, {"path": str(audio), "title": "Song", "artist": "Artist"}
+        )
+
+    assert message.audio.file_id == "f1"
+    method, content_type, body = bot_api_server.requests[-1]
+    assert method == "sendAudio"
+    # No multipart upload: the server is only told where the file is.
+    assert "multipart" not in content_type
+    params = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+    assert params["audio"] == Path(audio).absolute().as_uri()
@@ -0,0 +1,96 @@
+import json
+import logging
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def logging_setup(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    from music_wizard_lib import logging_setup
+
+    return logging_setup
+
+
+class BlockingHandler(logging.Handler):
+    """A handler stuck behind a slow stream until ``unblock`` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.unblock = threading.Event()
+        self.lines = []
+
+    def emit(self, record):
+        self.unblock.wait(5)
+        self.lines.append(self.format(record))
+
+
+def test_slow_handler_does_not_block_logging(logging_setup):
+    target = BlockingHandler()
+    handler = logging_setup.BackgroundHandler(target, maxsize=10)
+    logger = logging.getLogger("test_background")
+    logger.propagate = False
+    logger.addHandler(handler)
+    items = ["a"]
+    try:
+        for number in range(50):
+            logger.warning("record %s of %s", number, items)
+        items.append("b")
+        assert handler.dropped >= 39
+        target.unblock.set()
+        handler.flush()
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+    # Arguments are merged when the record is logged, not when it is written.
+    assert target.lines[0] == "record 0 of ['a']"
+    assert len(target.lines) == 50 - handler.dropped
+
+
+def test_duplicate_errors_are_rate_limited(logging_setup):
+    now = [0.0]
+    duplicates = logging_setup.DuplicateFilter(60, timer=lambda: now[0])
+
+    def record(level, message):
+        return logging.LogRecord("test", level, __file__, 1, message, None, None)
+
+    assert duplicates.filter(record(logging.ERROR, "boom"))
+    assert not duplicates.filter(record(logging.ERROR, "boom"))
+    assert not duplicates.filter(record(logging.ERROR, "boom"))
+    assert duplicates.filter(record(logging.ERROR, "other"))
+    assert duplicates.filter(record(logging.INFO, "boom"))
+    assert duplicates.filter(record(logging.INFO, "boom"))
+    now[0] = 61
+    later = record(logging.ERROR, "boom")
+    assert duplicates.filter(later)
+    assert later.getMessage() == "boom (2 identical messages suppressed)"
+    assert duplicates.suppressed == 2
+
+
+def test_json_output_carries_trace_id(logging_setup):
+    target = BlockingHandler()
+    target.unblock.set()
+    target.setFormatter(logging_setup.JSONFormatter())
+    handler = logging_setup.BackgroundHandler(target, 100, trace_id=lambda: "t1")
+    logger = logging.getLogger("test_json")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            logger.exception("failed %s", "job")
+        handler.flush()
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+    entry = json.loads(target.lines[0])
+    assert entry["message"] == "failed job"
+    assert entry["level"] == "ERROR"
+    assert entry["trace_id"] == "t1"
+    assert "ValueError: bad" in entry["exc_info"]
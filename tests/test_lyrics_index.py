@@ -0,0 +1,52 @@
+import pytest
+
+
+@pytest.fixture
+def index(monkeypatch, tmp_path):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    from music_wizard_lib.lyrics_index import LyricsIndex
+
+    index = LyricsIndex(str(tmp_path / "index.sqlite3"))
+    index.add("Survivor", "Eye of the Tiger", "Risin' up")
+    index.add("Queen", "Bohemian Rhapsody", "Is this the real life?")
+    yield index
+    index.close()
+
+
+def test_lookup_exact_and_decorated(index):
+    assert index.lookup("Survivor", "Eye of the Tiger") == "Risin' up"
+    assert index.lookup("SURVIVOR", "Eye of the Tiger (Official Video)") == (
+        "Risin' up"
+    )
+
+
+def test_lookup_fuzzy(index):
+    assert index.lookup("Queen", "Bohemian Rapsody") == "Is this the real life?"
+    assert index.lookup("Survivr", "Eye of Tiger") == "Risin' up"
+
+
+def test_lookup_miss(index):
+    assert index.lookup("Nobody", "Unknown Song") is None
+    # Same title, another artist.
+    assert index.lookup("Queensryche", "Bohemian Rhapsody") is None
+    assert index.lookup("Quinn", "Bohemian Rhapsody") is None
+
+
+def test_parse_lrc_file(monkeypatch, tmp_path):
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    from music_wizard_lib.lyrics_index import parse_lyrics_file
+
+    lrc = tmp_path / "whatever.lrc"
+    lrc.write_text("[ar:Artist]\n[ti:Title]\n[00:01.00]First\n[00:02.50]Second\n")
+    txt = tmp_path / "Other Artist - Other Title.txt"
+    txt.write_text("Line\n")
+
+    assert parse_lyrics_file(str(lrc)) == ("Artist", "Title", "First\nSecond")
+    assert parse_lyrics_file(str(txt)) == ("Other Artist", "Other Title", "Line")
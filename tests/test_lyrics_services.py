@@ -1,4 +1,6 @@
+import asyncio
 import importlib
+import threading
 import types
 import sys
 
@@ -102,3 +104,224 @@ async def test_get_lyrics_missing(monkeypatch):
     result = await lyrics_services.get_lyrics("A", "T")
 
     assert result == "Could not find lyrics for this song."
+
+
+@pytest.mark.asyncio
+async def test_get_lyrics_reuses_client(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    import music_wizard_lib.config as config
+    importlib.reload(config)
+
+    import music_wizard_lib.lyrics_services as lyrics_services
+    importlib.reload(lyrics_services)
+
+    instances = []
+
+    class FakeGenius:
+        def __init__(self, *args, **kwargs):
+            instances.append(self)
+
+        def search_song(self, title, artist=None):
+            return types.SimpleNamespace(lyrics="[Chorus]\nLa")
+
+    fake_module = types.SimpleNamespace(Genius=FakeGenius)
+    monkeypatch.setitem(sys.modules, "lyricsgenius", fake_module)
+
+    await lyrics_services.get_lyrics("A", "T")
+    await lyrics_services.get_lyrics("B", "U")
+
+    assert len(instances) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_lyrics_hedges_slow_search(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    import music_wizard_lib.config as config
+    importlib.reload(config)
+    monkeypatch.setattr(config, "GENIUS_HEDGE_DELAY", 0.01)
+
+    import music_wizard_lib.lyrics_services as lyrics_services
+    importlib.reload(lyrics_services)
+
+    release = threading.Event()
+
+    class FakeGenius:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def search_song(self, title, artist=None):
+            if artist is not None:
+                # The artist search hangs until the hedge has answered.
+                release.wait(timeout=5)
+                return None
+            return types.SimpleNamespace(lyrics="[Chorus]\nHedged")
+
+    fake_module = types.SimpleNamespace(Genius=FakeGenius)
+    monkeypatch.setitem(sys.modules, "lyricsgenius", fake_module)
+
+    try:
+        primary_done = asyncio.create_task(
+            lyrics_services.get_lyrics("Artist", "Song")
+        )
+        await asyncio.sleep(0.1)
+        release.set()
+        result = await primary_done
+    finally:
+        release.set()
+
+    assert result == "[Chorus]\nHedged"
+
+
+@pytest.mark.asyncio
+async def test_prefetch_lyrics_serves_tap_from_cache(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    import music_wizard_lib.config as config
+    importlib.reload(config)
+
+    import music_wizard_lib.lyrics_services as lyrics_services
+    importlib.reload(lyrics_services)
+
+    captured = []
+
+    class FakeGenius:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def search_song(self, title, artist=None):
+            captured.append((title, artist))
+            return types.SimpleNamespace(lyrics="[Verse]\nPrefetched")
+
+    fake_module = types.SimpleNamespace(Genius=FakeGenius)
+    monkeypatch.setitem(sys.modules, "lyricsgenius", fake_module)
+
+    assert lyrics_services.prefetch_lyrics("Artist", "Song") is True
+    # A second prefetch for the same song is a no-op.
+    assert lyrics_services.prefetch_lyrics("artist", "song") is False
+
+    result = await lyrics_services.get_lyrics("Artist", "Song")
+
+    assert result == "[Verse]\nPrefetched"
+    assert captured == [("Song", "Artist")]
+    stats = lyrics_services.prefetch_stats()
+    assert stats["hits"] == 1
+    assert stats["hit_rate"] == 1.0
+
+    # A tap on lyrics a finished prefetch cached is a hit too, but only once.
+    lyrics_services.prefetch_lyrics("Artist", "Other")
+    await asyncio.gather(*lyrics_services._prefetch_tasks.values())
+    await lyrics_services.get_lyrics("Artist", "Other")
+    await lyrics_services.get_lyrics("Artist", "Other")
+    await lyrics_services.get_lyrics("Artist", "Song")
+    stats = lyrics_services.prefetch_stats()
+    assert stats["hits"] == 2 and stats["misses"] == 0
+
+
+@pytest.mark.asyncio
+async def test_get_lyrics_uses_local_index_first(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    import music_wizard_lib.config as config
+    importlib.reload(config)
+
+    import music_wizard_lib.lyrics_services as lyrics_services
+    importlib.reload(lyrics_services)
+
+    captured = []
+
+    class FakeGenius:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def search_song(self, title, artist=None):
+            captured.append((title, artist))
+            return types.SimpleNamespace(lyrics="[Verse]\nFrom Genius")
+
+    fake_module = types.SimpleNamespace(Genius=FakeGenius)
+    monkeypatch.setitem(sys.modules, "lyricsgenius", fake_module)
+
+    first = await lyrics_services.get_lyrics("Artist", "Song")
+    # A fresh in-memory cache forces the lookup to go to the index.
+    lyrics_services._lyrics_cache.clear()
+    second = await lyrics_services.get_lyrics("artist", "Song (Live)")
+
+    assert first == second == "[Verse]\nFrom Genius"
+    assert captured == [("Song", "Artist")]
+
+
+@pytest.mark.asyncio
+async def test_partial_provider_failure_is_not_cached_as_missing(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    monkeypatch.setenv("LYRICS_PROVIDERS", "genius,lrclib")
+
+    import music_wizard_lib.config as config
+    importlib.reload(config)
+
+    import music_wizard_lib.lyrics_services as lyrics_services
+    importlib.reload(lyrics_services)
+
+    async def genius_down(artist, title):
+        raise requests.exceptions.ConnectionError("genius is down")
+
+    async def lrclib_missing(artist, title):
+        return None
+
+    monkeypatch.setitem(lyrics_services._PROVIDERS, "genius", genius_down)
+    monkeypatch.setitem(lyrics_services._PROVIDERS, "lrclib", lrclib_missing)
+
+    result = await lyrics_services.get_lyrics("Artist", "Song")
+    assert result == "An unexpected error occurred while fetching lyrics."
+    # Genius may have the song, so the next tap asks again.
+    assert len(lyrics_services._lyrics_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_search_holds_genius_slot_until_thread_returns(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    import music_wizard_lib.config as config
+    importlib.reload(config)
+    monkeypatch.setattr(config, "GENIUS_MAX_CONCURRENCY", 1)
+
+    import music_wizard_lib.lyrics_services as lyrics_services
+    importlib.reload(lyrics_services)
+
+    started = threading.Event()
+    release = threading.Event()
+
+    class FakeGenius:
+        def search_song(self, title, artist=None):
+            started.set()
+            release.wait(timeout=5)
+            return None
+
+    search = asyncio.create_task(lyrics_services._search_song(FakeGenius(), "T"))
+    try:
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        search.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await search
+        # The thread is still inside Genius, so the slot stays taken.
+        assert lyrics_services._get_semaphore().locked()
+    finally:
+        release.set()
+    for _ in range(100):
+        if not lyrics_services._get_semaphore().locked():
+            break
+        await asyncio.sleep(0.01)
+    assert not lyrics_services._get_semaphore().locked()
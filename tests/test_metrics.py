@@ -0,0 +1,111 @@
+import asyncio
+import importlib
+
+import pytest
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    from music_wizard_lib import config, jobs, metrics, workspace
+
+    importlib.reload(config)
+    importlib.reload(jobs)
+    importlib.reload(workspace)
+    yield metrics
+    if jobs._queue is not None:
+        jobs._queue.close()
+
+
+def test_render_histogram_and_labels(metrics):
+    registry = metrics.Registry()
+    latency = registry.histogram(
+        "latency_seconds", "Latency.", ("stage",), buckets=(1, 5)
+    )
+    errors = registry.counter("errors_total", "Errors.", ("stage",))
+    latency.labels("search").observe(0.5)
+    latency.labels("search").observe(3)
+    latency.labels("search").observe(10)
+    errors.labels('say "hi"').inc()
+
+    text = registry.render().decode()
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{stage="search",le="1"} 1' in text
+    assert 'latency_seconds_bucket{stage="search",le="5"} 2' in text
+    assert 'latency_seconds_bucket{stage="search",le="+Inf"} 3' in text
+    assert 'latency_seconds_sum{stage="search"} 13.5' in text
+    assert 'latency_seconds_count{stage="search"} 3' in text
+    assert 'errors_total{stage="say \\"hi\\""} 1' in text
+    with pytest.raises(ValueError):
+        latency.labels("a", "b")
+
+
+def test_stage_counts_errors_but_not_cancellation(metrics):
+    errors = metrics.STAGE_ERRORS.labels("test_stage")
+    durations = metrics.STAGE_SECONDS.labels("test_stage")
+    before = errors.value
+
+    with metrics.stage("test_stage"):
+        pass
+    with pytest.raises(RuntimeError):
+        with metrics.stage("test_stage"):
+            raise RuntimeError("boom")
+    with pytest.raises(asyncio.CancelledError):
+        with metrics.stage("test_stage"):
+            raise asyncio.CancelledError
+
+    assert errors.value == before + 1
+    assert sum(durations.counts) >= 3
+
+
+@pytest.mark.asyncio
+async def test_recording_carries_stages_across_tasks(metrics):
+    async def step():
+        with metrics.stage("recorded_stage"):
+            await asyncio.sleep(0)
+        metrics.count_error("recorded_stage")
+
+    with metrics.recording() as stages:
+        await asyncio.create_task(step())
+    await step()
+
+    assert [(name, failed) for name, _, failed in stages] == [
+        ("recorded_stage", False),
+        ("recorded_stage", True),
+    ]
+    durations = metrics.STAGE_SECONDS.labels("recorded_stage")
+    errors = metrics.STAGE_ERRORS.labels("recorded_stage")
+    count, error_count = sum(durations.counts), errors.value
+    metrics.replay(stages)
+    assert sum(durations.counts) == count + 1
+    assert errors.value == error_count + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_collects_gauges(metrics, monkeypatch):
+    import bot
+    from music_wizard_lib.http_server import HTTPServer
+
+    application = bot.build_application()
+    metrics.REGISTRY.add_collector(lambda: bot.collect_metrics(application))
+    server = HTTPServer({("GET", "/metrics"): metrics.metrics_route}, "127.0.0.1", 0)
+    await server.start()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        response = (await reader.read()).decode()
+        writer.close()
+    finally:
+        await server.stop()
+        metrics.REGISTRY._collectors.clear()
+
+    assert response.startswith("HTTP/1.1 200")
+    assert "text/plain; version=0.0.4" in response
+    assert 'musicwizard_resource{resource="workspace_disk_bytes"} 0' in response
+    assert 'musicwizard_resource{resource="jobs_busy_workers"} 0' in response
+    assert 'musicwizard_resource{resource="telegram_pool_upload_queued"} 0' in response
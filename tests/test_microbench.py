@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import subprocess
+
+SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "benchmarks",
+    "microbench.py",
+)
+
+
+def run_against(tmp_path, baseline_us: float, pattern: str = "get_text"):
+    baseline = tmp_path / "baseline.json"
+    results = tmp_path / "results.json"
+    baseline.write_text(
+        json.dumps({"benchmarks": {"localization_get_text": {"min_us": baseline_us}}})
+    )
+    process = subprocess.run(
+        [
+            sys.executable,
+            SCRIPT,
+            "--filter",
+            pattern,
+            "--repeats",
+            "2",
+            "--json",
+            str(results),
+            "--compare",
+            str(baseline),
+        ],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    return process, json.loads(results.read_text())
+
+
+def test_passes_within_threshold(tmp_path):
+    process, results = run_against(tmp_path, 1e6)
+    assert process.returncode == 0, process.stdout + process.stderr
+    assert list(results["benchmarks"]) == ["localization_get_text"]
+    assert results["benchmarks"]["localization_get_text"]["min_us"] > 0
+
+
+def test_fails_on_regression(tmp_path):
+    process, _ = run_against(tmp_path, 1e-6)
+    assert process.returncode == 1
+    assert "REGRESSION localization_get_text" in process.stdout
+
+
+def test_reports_benchmarks_missing_from_baseline(tmp_path):
+    process, _ = run_against(tmp_path, 1e6, pattern="text")
+    assert process.returncode == 0, process.stdout + process.stderr
+    assert "note: split_text_large is not in the baseline" in process.stdout
@@ -0,0 +1,84 @@
+import importlib
+
+import pytest
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, chat_id: int, text: str, reply_markup=None):
+        self.messages.append((chat_id, text, reply_markup))
+
+
+@pytest.fixture
+def pager(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    import music_wizard_lib.config as config
+
+    importlib.reload(config)
+    monkeypatch.setattr(config, "LYRICS_PAGE_LIMIT", 20)
+
+    import music_wizard_lib.pager as pager
+
+    importlib.reload(pager)
+    return pager
+
+
+def button_data(markup):
+    return [button.callback_data for button in markup.inline_keyboard[0]]
+
+
+@pytest.mark.asyncio
+async def test_short_text_is_sent_without_buttons(pager):
+    bot = FakeBot()
+    await pager.send_paginated_message(bot, 1, "short")
+
+    assert bot.messages == [(1, "short", None)]
+
+
+@pytest.mark.asyncio
+async def test_long_text_is_paged_in_one_message(pager):
+    bot = FakeBot()
+    text = "first page line\n\nsecond page line\n\nthird page line"
+    await pager.send_paginated_message(bot, 1, text)
+
+    assert len(bot.messages) == 1
+    _, first, markup = bot.messages[0]
+    assert first == "first page line"
+    next_data = button_data(markup)[-1]
+
+    second, markup = pager.get_page(next_data)
+    assert second == "second page line"
+    assert button_data(markup)[1] == pager.NOOP_CALLBACK
+
+    last, markup = pager.get_page(button_data(markup)[-1])
+    assert last == "third page line"
+    # The last page only offers the way back.
+    assert len(button_data(markup)) == 2
+
+
+def test_unknown_document_is_expired(pager):
+    assert pager.get_page(f"{pager.CALLBACK_PREFIX}missing_0") is None
+
+
+def test_documents_are_shared_between_processes(pager, tmp_path):
+    path = str(tmp_path / "pages.sqlite3")
+    first = pager.DocumentStore(path, maxsize=2)
+    # Another worker opens the same database.
+    second = pager.DocumentStore(path, maxsize=2)
+
+    oldest = first.put(["a", "b"])
+    kept = first.put(["c", "d"])
+    newest = second.put(["e", "f"])
+
+    assert second.get(kept) == ["c", "d"]
+    assert first.get(newest) == ["e", "f"]
+    # Only the newest ``maxsize`` documents are kept.
+    assert first.get(oldest) is None
+    first.close()
+    second.close()
@@ -0,0 +1,132 @@
+import importlib
+
+import pytest
+
+
+@pytest.fixture
+def persistence(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    from music_wizard_lib import config, persistence
+
+    importlib.reload(config)
+    importlib.reload(persistence)
+    return persistence
+
+
+@pytest.mark.asyncio
+async def test_state_survives_restart(persistence, tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    store = persistence.SQLitePersistence(path)
+    await store.update_user_data(1, {"playlist": {"songs": ["a", "b"]}})
+    await store.update_chat_data(10, {"lyrics_x": {"artist": "A"}})
+    await store.update_conversation("main", (1,), 3)
+    await store.update_conversation("main", (2,), 4)
+    await store.update_conversation("main", (2,), None)
+    await store.flush()
+
+    restarted = persistence.SQLitePersistence(path)
+    # Nothing is loaded up front ...
+    assert await restarted.get_user_data() == {}
+    assert await restarted.get_conversations("main") == {(1,): 3}
+    # ... until the user or chat shows up.
+    user_data = {}
+    await restarted.refresh_user_data(1, user_data)
+    assert user_data == {"playlist": {"songs": ["a", "b"]}}
+    chat_data = {}
+    await restarted.refresh_chat_data(10, chat_data)
+    assert chat_data == {"lyrics_x": {"artist": "A"}}
+    await restarted.flush()
+
+
+@pytest.mark.asyncio
+async def test_refresh_picks_up_other_process_writes(persistence, tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    first = persistence.SQLitePersistence(path)
+    second = persistence.SQLitePersistence(path)
+
+    await first.update_user_data(1, {"lang": "en"})
+    await first._write_task
+    user_data = {}
+    await second.refresh_user_data(1, user_data)
+    assert user_data == {"lang": "en"}
+
+    # Unwritten local changes win over the stored copy.
+    await second.update_user_data(1, {"lang": "ru"})
+    user_data["lang"] = "ru"
+    await second.refresh_user_data(1, user_data)
+    assert user_data == {"lang": "ru"}
+    await second._write_task
+
+    user_data_first = {"lang": "en"}
+    await first.refresh_user_data(1, user_data_first)
+    assert user_data_first == {"lang": "ru"}
+
+    await first.drop_user_data(1)
+    await first.flush()
+    await second.flush()
+    third = persistence.SQLitePersistence(path)
+    user_data = {}
+    await third.refresh_user_data(1, user_data)
+    assert user_data == {}
+    await third.flush()
+
+
+@pytest.mark.asyncio
+async def test_conversation_reloads_state_set_by_other_process(persistence, tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    first = persistence.SQLitePersistence(path)
+    second = persistence.SQLitePersistence(path)
+    assert await second.get_conversations("main") == {}
+
+    await first.update_conversation("main", (1,), 3)
+    await first.write_pending()
+    assert await second.reload_conversation("main", (1,)) == (True, 3)
+    assert await second.reload_conversation("main", (1,)) == (False, None)
+
+    await first.update_conversation("main", (1,), None)
+    await first.write_pending()
+    assert await second.reload_conversation("main", (1,)) == (True, None)
+    await first.flush()
+    await second.flush()
+
+
+@pytest.mark.asyncio
+async def test_ptb_internals_used_to_reload_conversations(persistence, tmp_path):
+    # TracedApplication.reload_conversations reaches into these private
+    # ConversationHandler parts; fail loudly if a PTB upgrade moves them.
+    from datetime import datetime
+    from types import SimpleNamespace
+
+    from telegram import Chat, Message, Update, User
+    from telegram.ext import CommandHandler, ConversationHandler
+
+    async def noop(update, context):
+        pass
+
+    handler = ConversationHandler(
+        entry_points=[CommandHandler("start", noop)],
+        states={},
+        fallbacks=[],
+        name="main",
+        persistent=True,
+    )
+    store = persistence.SQLitePersistence(str(tmp_path / "state.sqlite3"))
+    # What Application.initialize does for persistent conversations.
+    await handler._initialize_persistence(SimpleNamespace(persistence=store))
+    message = Message(
+        1, datetime.now(), Chat(2, Chat.PRIVATE), from_user=User(3, "A", False)
+    )
+    key = handler._get_key(Update(1, message=message))
+    assert key == (2, 3)
+
+    handler._conversations.update_no_track({key: 5})
+    assert handler._conversations.data[key] == 5
+    # Untracked: nothing is queued to be written back to persistence.
+    assert not handler._conversations.pop_accessed_write_items()
+    handler._conversations.data.pop(key)
+    assert key not in handler._conversations
+    await store.flush()
@@ -0,0 +1,212 @@
+import os
+import sys
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+SONGS = [
+    {"title": "One", "artist": "A"},
+    {"title": "Two", "artist": "B"},
+    {"title": "Three", "artist": "C"},
+]
+
+
+@pytest.fixture
+def playlist_jobs(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    from music_wizard_lib import config, playlist_jobs, workspace
+
+    importlib.reload(config)
+    importlib.reload(playlist_jobs)
+    importlib.reload(workspace)
+    yield playlist_jobs
+    if playlist_jobs._store is not None:
+        playlist_jobs._store.close()
+
+
+def test_claim_orphans(playlist_jobs, tmp_path):
+    store = playlist_jobs.PlaylistJobStore(str(tmp_path / "jobs.sqlite3"))
+    live = store.create("download", 1, "en", SONGS)
+    orphan = store.create("upload", 2, "ru", SONGS, title="T", description="D")
+    done = store.create("download", 3, "en", SONGS)
+    store.update_job(done, state="done")
+    # A process that has exited, and one that is still running.
+    with store._conn:
+        store._conn.execute(
+            "UPDATE playlist_jobs SET owner = ? WHERE id = ?",
+            (f"{playlist_jobs.socket.gethostname()}:{2**22 + 1}", orphan),
+        )
+        store._conn.execute(
+            "UPDATE playlist_jobs SET owner = ? WHERE id = ?",
+            (f"{playlist_jobs.socket.gethostname()}:{os.getppid()}", live),
+        )
+
+    assert store.claim_orphans() == [orphan]
+    job = store.get(orphan)
+    assert job["owner"] == playlist_jobs.process_owner()
+    assert [song["title"] for song in job["songs"]] == ["One", "Two", "Three"]
+    assert job["description"] == "D"
+    # Jobs that stopped making progress are taken over wherever they run.
+    assert live in store.claim_orphans(stale_after=-1)
+    store.close()
+
+
+def test_housekeeping_purges_old_finished_playlists(playlist_jobs, monkeypatch):
+    import bot
+
+    store = playlist_jobs.get_store()
+    done = store.create("download", 3, "en", SONGS)
+    store.update_job(done, state="done")
+    running = store.create("download", 4, "en", SONGS)
+    monkeypatch.setattr(bot.config, "DOWNLOAD_WORKERS", 0)
+    monkeypatch.setattr(bot.config, "PLAYLIST_JOB_RETENTION", -1)
+    bot.purge_old_rows()
+    assert store.get(done) is None
+    assert store.get(running)["state"] == "running"
+    # Song rows go with their job.
+    with store._conn:
+        songs = store._conn.execute(
+            "SELECT COUNT(*) FROM playlist_songs WHERE job_id = ?", (done,)
+        ).fetchone()[0]
+    assert songs == 0
+
+
+@pytest.mark.asyncio
+async def test_download_resumes_after_last_completed_song(
+    playlist_jobs, monkeypatch, tmp_path
+):
+    import bot
+
+    store = playlist_jobs.get_store()
+    job_id = store.create("download", 42, "en", SONGS)
+    store.update_song(job_id, 0, status="sent", video_id="v0", file_id="f0")
+    store.update_song(job_id, 1, status="resolved", video_id="v1")
+
+    searched, downloaded = [], []
+
+    def fake_search(youtube, song):
+        searched.append(song["title"])
+        return "v2"
+
+    async def fake_download(url, folder):
+        downloaded.append(url)
+        return {"path": os.path.join(folder, "a.mp3"), "title": url, "artist": "X"}
+
+    async def fake_send(bot, chat_id, tracks):
+        return [
+            SimpleNamespace(audio=SimpleNamespace(file_id=f"file-{track['position']}"))
+            for track in tracks
+        ]
+
+    class FakeBot:
+        def __init__(self):
+            self.texts = []
+
+        async def send_message(self, chat_id, text, **kwargs):
+            self.texts.append(text)
+            return SimpleNamespace(message_id=1)
+
+        async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+            self.texts.append(text)
+
+    monkeypatch.setattr(
+        bot.youtube_services, "get_authenticated_service", lambda: object()
+    )
+    monkeypatch.setattr(bot.youtube_services, "search_for_song_on_youtube", fake_search)
+    monkeypatch.setattr(bot.jobs, "download_song", fake_download)
+    monkeypatch.setattr(bot.utils, "send_audio_group", fake_send)
+
+    await bot.run_playlist_download(FakeBot(), job_id)
+
+    job = store.get(job_id)
+    assert job["state"] == "done"
+    assert searched == ["Three"]
+    assert downloaded == [
+        "https://www.youtube.com/watch?v=v1",
+        "https://www.youtube.com/watch?v=v2",
+    ]
+    assert [song["file_id"] for song in job["songs"]] == ["f0", "file-1", "file-2"]
+    assert os.listdir(tmp_path / "scratch") == []
+
+
+FAKE_YT_DLP = """#!{python}
+import json, os, subprocess, sys, time
+if "--dump-json" in sys.argv:
+    print(json.dumps({{"title": "Song"}}))
+    sys.exit(0)
+# Stands in for the ffmpeg process yt-dlp starts while converting.
+child = subprocess.Popen(["sleep", "60"])
+with open(os.environ["FAKE_YT_DLP_PIDS"], "a") as f:
+    f.write(f"{{os.getpid()}} {{child.pid}}\\n")
+time.sleep(60)
+"""
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.asyncio
+async def test_cancel_kills_downloads_and_removes_workspaces(
+    playlist_jobs, monkeypatch, tmp_path
+):
+    import asyncio
+
+    import bot
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    fake = bin_dir / "yt-dlp"
+    fake.write_text(FAKE_YT_DLP.format(python=sys.executable))
+    fake.chmod(0o755)
+    pids_file = tmp_path / "pids"
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_YT_DLP_PIDS", str(pids_file))
+    monkeypatch.setattr(bot.config, "DOWNLOAD_WORKERS", 0)
+    monkeypatch.setattr(
+        bot.youtube_services, "get_authenticated_service", lambda: object()
+    )
+    monkeypatch.setattr(
+        bot.youtube_services, "search_for_song_on_youtube", lambda yt, song: "vid"
+    )
+
+    texts = []
+
+    class FakeBot:
+        async def send_message(self, chat_id, text, **kwargs):
+            texts.append(text)
+            return SimpleNamespace(message_id=1)
+
+        async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+            texts.append(text)
+
+    application = SimpleNamespace(bot=FakeBot(), create_task=asyncio.create_task)
+    job_id = playlist_jobs.get_store().create("download", 42, "en", SONGS)
+    task = bot.start_playlist_job(application, job_id, "download")
+
+    for _ in range(200):
+        if pids_file.exists() and pids_file.read_text().strip():
+            break
+        await asyncio.sleep(0.05)
+    pids = [int(pid) for pid in pids_file.read_text().split()]
+    assert all(process_alive(pid) for pid in pids)
+
+    await bot.cancel_playlist_job(job_id)
+    await asyncio.wait_for(task, 5)
+
+    assert not any(process_alive(pid) for pid in pids)
+    assert os.listdir(tmp_path / "scratch") == []
+    assert playlist_jobs.get_store().get_state(job_id) == "cancelled"
+    assert "🛑 Playlist cancelled." in texts
+    # A second tap finds nothing left to cancel.
+    assert not await bot.cancel_playlist_job(job_id, chat_id=42)
+    assert job_id not in bot.playlist_tasks
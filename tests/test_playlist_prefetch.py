@@ -0,0 +1,117 @@
+import os
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+SONGS = [
+    {"title": "One", "artist": "A"},
+    {"title": "Two", "artist": "B"},
+    {"title": "Three", "artist": "C"},
+]
+
+
+@pytest.fixture
+def prefetch(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    monkeypatch.setenv("PLAYLIST_PREFETCH", "1")
+    monkeypatch.setenv("PLAYLIST_PREFETCH_DOWNLOADS", "1")
+
+    from music_wizard_lib import config, playlist_jobs, playlist_prefetch, workspace
+
+    importlib.reload(config)
+    importlib.reload(playlist_jobs)
+    importlib.reload(workspace)
+    importlib.reload(playlist_prefetch)
+
+    import bot
+
+    searched, downloaded = [], []
+
+    def fake_search(youtube, song):
+        searched.append(song["title"])
+        return None if song["title"] == "Three" else f"v-{song['title']}"
+
+    async def fake_download(url, folder):
+        downloaded.append(url)
+        with open(os.path.join(folder, "a.mp3"), "wb") as f:
+            f.write(b"x" * 100)
+        return {"path": os.path.join(folder, "a.mp3"), "title": url, "artist": "X"}
+
+    monkeypatch.setattr(
+        bot.youtube_services, "get_authenticated_service", lambda: object()
+    )
+    monkeypatch.setattr(bot.youtube_services, "search_for_song_on_youtube", fake_search)
+    monkeypatch.setattr(bot.jobs, "download_song", fake_download)
+    yield SimpleNamespace(
+        module=playlist_prefetch, searched=searched, downloaded=downloaded
+    )
+    if playlist_jobs._store is not None:
+        playlist_jobs._store.close()
+
+
+async def settle(prefetch):
+    for _ in range(100):
+        if len(prefetch.searched) == len(SONGS):
+            break
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_download_starts_from_prefetched_results(
+    prefetch, monkeypatch, tmp_path
+):
+    import bot
+
+    assert prefetch.module.start(7, SONGS)
+    await settle(prefetch)
+    assert prefetch.downloaded == ["https://www.youtube.com/watch?v=v-One"]
+
+    async def fake_send(bot, chat_id, tracks):
+        return [SimpleNamespace(audio=None) for track in tracks]
+
+    class FakeBot:
+        async def send_message(self, chat_id, text, **kwargs):
+            return SimpleNamespace(message_id=1)
+
+        async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+            pass
+
+    monkeypatch.setattr(bot.utils, "send_audio_group", fake_send)
+    monkeypatch.setattr(bot.utils, "send_audio_tracks", fake_send)
+    store = bot.playlist_jobs.get_store()
+    job_id = store.create("download", 42, "en", SONGS)
+    taken = await bot.take_playlist_prefetch(7, job_id)
+    await bot.run_playlist_download(FakeBot(), job_id, prefetched=taken.tracks)
+
+    # Nothing was looked up or downloaded twice.
+    assert prefetch.searched == ["One", "Two", "Three"]
+    assert prefetch.downloaded == [
+        "https://www.youtube.com/watch?v=v-One",
+        "https://www.youtube.com/watch?v=v-Two",
+    ]
+    statuses = [song["status"] for song in store.get(job_id)["songs"]]
+    assert statuses == ["sent", "sent", "not_found"]
+    assert os.listdir(tmp_path / "scratch") == []
+    assert prefetch.module.stats()["searches_used"] == 3
+
+
+@pytest.mark.asyncio
+async def test_cancel_releases_prefetched_downloads(prefetch, tmp_path):
+    manager = prefetch.module.workspace.get_manager()
+    prefetch.module.start(7, SONGS)
+    await settle(prefetch)
+    assert manager.stats()["reserved_bytes"] > 0
+
+    prefetch.module.cancel(7)
+    # The folders are deleted in a thread.
+    await asyncio.gather(*prefetch.module.workspace._removals)
+    assert manager.stats()["reserved_bytes"] == 0
+    assert os.listdir(tmp_path / "scratch") == []
+    assert prefetch.module.take(7) is None
+    assert prefetch.module.stats()["downloads_released"] == 1
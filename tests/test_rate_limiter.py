@@ -0,0 +1,127 @@
+import asyncio
+import importlib
+
+import pytest
+from telegram.error import RetryAfter
+
+
+@pytest.fixture
+def rate_limiter(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    import music_wizard_lib.config as config
+
+    importlib.reload(config)
+
+    import music_wizard_lib.rate_limiter as rate_limiter
+
+    importlib.reload(rate_limiter)
+    return rate_limiter
+
+
+def test_token_bucket_spaces_requests(rate_limiter):
+    now = [0.0]
+    bucket = rate_limiter.TokenBucket(rate=2, capacity=2, timer=lambda: now[0])
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+    now[0] = 10
+    bucket.block(5)
+    assert bucket.reserve() == pytest.approx(5)
+
+
+@pytest.mark.asyncio
+async def test_edits_to_one_message_are_coalesced(rate_limiter):
+    scheduler = rate_limiter.OutboundScheduler(global_rate=1000, chat_rate=1000)
+    sent = []
+    release = asyncio.Event()
+
+    async def callback(endpoint, data):
+        sent.append(data["text"])
+        if data["text"] == "1":
+            await release.wait()
+        return {"text": data["text"]}
+
+    def edit(text):
+        data = {"chat_id": 1, "message_id": 7, "text": text}
+        return asyncio.create_task(
+            scheduler.process_request(
+                callback, ("editMessageText", data), {}, "editMessageText", data, None
+            )
+        )
+
+    first = edit("1")
+    await asyncio.sleep(0)
+    second, third = edit("2"), edit("3")
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await first == {"text": "1"}
+    assert await second == await third == {"text": "3"}
+    assert sent == ["1", "3"]
+    assert scheduler.stats["coalesced"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_edit_is_resent_for_coalesced_calls(rate_limiter):
+    scheduler = rate_limiter.OutboundScheduler(global_rate=1000, chat_rate=1000)
+    sent = []
+    release = asyncio.Event()
+
+    async def callback(endpoint, data, **kwargs):
+        sent.append((data["text"], kwargs))
+        if data["text"] == "1":
+            await release.wait()
+        return {"text": data["text"]}
+
+    def edit(text, **kwargs):
+        data = {"chat_id": 1, "message_id": 7, "text": text}
+        args = ("editMessageText", data)
+        return asyncio.create_task(
+            scheduler.process_request(
+                callback, args, kwargs, "editMessageText", data, None
+            )
+        )
+
+    first = edit("1")
+    await asyncio.sleep(0)
+    # Waits behind the first edit, then takes the third one's place.
+    second = edit("2")
+    await asyncio.sleep(0)
+    third = edit("3", read_timeout=5)
+    await asyncio.sleep(0)
+    second.cancel()
+    release.set()
+
+    assert await first == {"text": "1"}
+    with pytest.raises(asyncio.CancelledError):
+        await second
+    assert await third == {"text": "3"}
+    assert sent == [("1", {}), ("3", {"read_timeout": 5})]
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_rescheduled(rate_limiter):
+    scheduler = rate_limiter.OutboundScheduler(global_rate=1000, chat_rate=1000)
+    attempts = []
+
+    async def callback(endpoint, data):
+        attempts.append(endpoint)
+        if len(attempts) == 1:
+            raise RetryAfter(0)
+        return True
+
+    data = {"chat_id": 1, "text": "hi"}
+    result = await scheduler.process_request(
+        callback, ("sendMessage", data), {}, "sendMessage", data, None
+    )
+
+    assert result is True
+    assert attempts == ["sendMessage", "sendMessage"]
+    assert scheduler.stats["retries"] == 1
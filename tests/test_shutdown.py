@@ -0,0 +1,80 @@
+import os
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+SONGS = [{"title": "One", "artist": "A"}, {"title": "Two", "artist": "B"}]
+
+
+@pytest.fixture
+def playlist_jobs(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    from music_wizard_lib import config, playlist_jobs, workspace
+
+    importlib.reload(config)
+    importlib.reload(playlist_jobs)
+    importlib.reload(workspace)
+    yield playlist_jobs
+    if playlist_jobs._store is not None:
+        playlist_jobs._store.close()
+
+
+@pytest.mark.asyncio
+async def test_drain_hands_unfinished_playlists_to_next_process(
+    playlist_jobs, monkeypatch, tmp_path
+):
+    import bot
+
+    async def endless_download(url, folder):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(
+        bot.youtube_services, "get_authenticated_service", lambda: object()
+    )
+    monkeypatch.setattr(
+        bot.youtube_services, "search_for_song_on_youtube", lambda yt, song: "vid"
+    )
+    monkeypatch.setattr(bot.jobs, "download_song", endless_download)
+
+    texts = []
+
+    class FakeBot:
+        async def send_message(self, chat_id, text, **kwargs):
+            texts.append(text)
+            return SimpleNamespace(message_id=1)
+
+        async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+            pass
+
+    application = SimpleNamespace(
+        bot=FakeBot(),
+        create_task=asyncio.create_task,
+        draining=False,
+        updates_in_flight=set(),
+    )
+    store = playlist_jobs.get_store()
+    job_id = store.create("download", 42, "en", SONGS)
+    task = bot.start_playlist_job(application, job_id, "download")
+    quick_update = asyncio.create_task(asyncio.sleep(0.05))
+    application.updates_in_flight.add(quick_update)
+    await asyncio.sleep(0.05)
+
+    await bot.drain(application, timeout=0.3)
+
+    assert application.draining
+    # Work that finished in time is left alone; the rest is cancelled.
+    assert quick_update.done() and not quick_update.cancelled()
+    assert task.cancelled()
+    assert os.listdir(tmp_path / "scratch") == []
+    job = store.get(job_id)
+    assert job["state"] == "running"
+    assert job["owner"] is None
+    assert texts[-1].startswith("⏸")
+    # The next process, wherever it runs, takes the job over at startup.
+    assert store.claim_orphans() == [job_id]
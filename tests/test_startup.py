@@ -0,0 +1,71 @@
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHECK = """
+import sys
+from music_wizard_lib import config, jobs
+
+try:
+    config.validate()
+except ValueError as e:
+    print(e)
+heavy = ("openai", "telegram", "googleapiclient", "music_wizard_lib.ai_services")
+print(sorted(name for name in heavy if name in sys.modules))
+"""
+
+
+def test_worker_imports_stay_light_and_config_reports_missing_tokens(tmp_path):
+    env = {
+        name: value
+        for name, value in os.environ.items()
+        if name not in ("TELEGRAM_TOKEN", "GENIUS_ACCESS_TOKEN", "OPENAI_API_KEY")
+    }
+    env["JOB_QUEUE_PATH"] = str(tmp_path / "jobs.sqlite3")
+    process = subprocess.run(
+        [sys.executable, "-c", CHECK],
+        cwd=tmp_path,
+        env={**env, "PYTHONPATH": ROOT},
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert process.returncode == 0, process.stderr
+    missing, loaded = process.stdout.splitlines()
+    assert missing == (
+        "Required environment variables are not set: "
+        "TELEGRAM_TOKEN, GENIUS_ACCESS_TOKEN, OPENAI_API_KEY."
+    )
+    assert loaded == "[]"
+
+
+def test_concurrent_first_use_builds_one_openai_client(monkeypatch):
+    import time
+    import types
+    import threading
+
+    from music_wizard_lib import ai_services
+
+    built = []
+
+    def slow_client(api_key):
+        time.sleep(0.05)
+        built.append(api_key)
+        return object()
+
+    fake_openai = types.SimpleNamespace(AsyncOpenAI=slow_client)
+    monkeypatch.setitem(sys.modules, "openai", fake_openai)
+    monkeypatch.setattr(ai_services, "openai_client", None)
+    clients = []
+    threads = [
+        threading.Thread(target=lambda: clients.append(ai_services.get_openai_client()))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1
+    assert len({id(client) for client in clients}) == 1
@@ -0,0 +1,72 @@
+import asyncio
+import importlib
+
+import pytest
+from telegram.request import BaseRequest
+
+
+class FakeRequest(BaseRequest):
+    def __init__(self, name, log, gate=None):
+        self.name = name
+        self.log = log
+        self.gate = gate
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **timeouts):
+        self.log.append((self.name, url.rsplit("/", 1)[-1]))
+        if self.gate is not None:
+            await self.gate.wait()
+        return 200, b'{"ok": true, "result": true}'
+
+
+@pytest.fixture
+def telegram_http(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    import music_wizard_lib.config as config
+
+    importlib.reload(config)
+    monkeypatch.setattr(config, "TELEGRAM_UPLOAD_POOL_SIZE", 1)
+
+    import music_wizard_lib.telegram_http as telegram_http
+
+    importlib.reload(telegram_http)
+    return telegram_http
+
+
+@pytest.mark.asyncio
+async def test_control_calls_do_not_wait_for_uploads(telegram_http):
+    log = []
+    gate = asyncio.Event()
+    request = telegram_http.RoutedRequest(
+        upload_request=FakeRequest("upload", log, gate),
+        control_request=FakeRequest("control", log),
+    )
+    base = "https://api.telegram.org/bot123"
+
+    uploads = [
+        asyncio.create_task(request.post(f"{base}/sendAudio")) for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+    # The upload pool is full, yet a control call goes straight through.
+    assert await request.post(f"{base}/answerCallbackQuery") is True
+    assert log == [("upload", "sendAudio"), ("control", "answerCallbackQuery")]
+
+    stats = request.stats()
+    assert stats["upload"]["in_flight"] == 1
+    assert stats["upload"]["queued"] == 1
+
+    gate.set()
+    await asyncio.gather(*uploads)
+    stats = request.stats()
+    assert stats["upload"]["requests"] == 2
+    assert stats["upload"]["wait_seconds_max"] > 0
+    assert stats["control"]["requests"] == 1
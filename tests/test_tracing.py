@@ -0,0 +1,102 @@
+import json
+import asyncio
+import importlib
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def tracing(monkeypatch, tmp_path):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    monkeypatch.setenv("DOWNLOAD_WORKERS", "1")
+
+    from music_wizard_lib import config, jobs, tracing
+
+    importlib.reload(config)
+    importlib.reload(jobs)
+    monkeypatch.setattr(config, "JOB_POLL_INTERVAL", 0.01)
+    tracing.configure(str(tmp_path / "spans.jsonl"))
+    yield tracing
+    tracing.configure("")
+    if jobs._queue is not None:
+        jobs._queue.close()
+
+
+def read_spans(tmp_path) -> list:
+    from music_wizard_lib import tracing
+
+    tracing.flush()
+    with open(tmp_path / "spans.jsonl") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_spans_are_noops_when_disabled(tracing):
+    tracing.configure("")
+    first = tracing.span("a")
+    with first as active:
+        active.set(x=1)
+        assert tracing.current() is None
+    assert tracing.span("b") is first
+
+
+@pytest.mark.asyncio
+async def test_trace_follows_job_to_worker(tracing, monkeypatch, tmp_path):
+    from music_wizard_lib import jobs, metrics
+
+    async def fake_download(payload):
+        with metrics.stage("download"):
+            await asyncio.sleep(0)
+        return {"path": payload["url"]}
+
+    monkeypatch.setitem(jobs.JOB_KINDS, "download", fake_download)
+    stop = asyncio.Event()
+    worker = asyncio.create_task(
+        jobs.worker_main(jobs.get_job_queue(), "w1", stop)
+    )
+    with pytest.raises(RuntimeError):
+        with tracing.span("update", chat_id=5):
+            with tracing.span("lookup") as span:
+                span.set(hit=False)
+            await jobs.submit("download", {"url": "song"})
+            raise RuntimeError("handler failed")
+    stop.set()
+    await worker
+
+    spans = {span["name"]: span for span in read_spans(tmp_path)}
+    root = spans["update"]
+    assert root["parent_id"] is None
+    assert root["attrs"] == {"chat_id": 5}
+    assert root["error"] == "RuntimeError"
+    assert {span["trace_id"] for span in spans.values()} == {root["trace_id"]}
+    assert spans["lookup"]["parent_id"] == root["span_id"]
+    assert spans["lookup"]["attrs"] == {"hit": False}
+    assert spans["job"]["parent_id"] == root["span_id"]
+    assert spans["download"]["parent_id"] == spans["job"]["span_id"]
+
+
+def test_profiler_reports_busy_thread(tracing):
+    from music_wizard_lib import profiler
+
+    stop = threading.Event()
+
+    def busy_loop():
+        while not stop.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy_loop, name="busy")
+    thread.start()
+    try:
+        profile = profiler.sample(0.2, interval=0.001)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert profile["samples"] > 10
+    report = profiler.report(profile)
+    assert "== Thread busy ==" in report
+    assert "busy_loop (" in report
+    assert "\nbusy;" in report
@@ -40,3 +40,98 @@ async def test_send_long_message(monkeypatch):
         (1, "a" * 5),
     ]
     assert fake_bot.messages == expected
+
+
+def test_split_text_prefers_section_and_line_boundaries(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    import music_wizard_lib.utils as utils
+
+    text = "[Verse]\nline one\nline two\n\n[Chorus]\nla la la"
+    assert utils.split_text(text, limit=30) == [
+        "[Verse]\nline one\nline two",
+        "[Chorus]\nla la la",
+    ]
+    assert utils.split_text("aaaa bbbb\ncccc", limit=9) == ["aaaa bbbb", "cccc"]
+    assert utils.split_text("one two three", limit=8) == ["one two", "three"]
+
+
+class FakeMediaBot:
+    def __init__(self, fail_groups=False):
+        self.fail_groups = fail_groups
+        self.calls = []
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        from telegram.error import BadRequest
+
+        self.calls.append(("group", [item.title for item in media]))
+        if self.fail_groups:
+            raise BadRequest("one of the files is broken")
+        return [item.title for item in media]
+
+    async def send_audio(self, chat_id, audio, title, **kwargs):
+        from telegram.error import BadRequest
+
+        self.calls.append(("audio", title))
+        if title == "bad":
+            raise BadRequest("broken file")
+        return title
+
+
+def make_tracks(tmp_path, titles):
+    tracks = []
+    for title in titles:
+        path = tmp_path / f"{title}.mp3"
+        path.write_bytes(b"ID3")
+        tracks.append({"path": str(path), "title": title, "artist": "A"})
+    return tracks
+
+
+@pytest.mark.asyncio
+async def test_send_audio_group_batches_in_order(monkeypatch, tmp_path):
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    import music_wizard_lib.config as config
+
+    importlib.reload(config)
+    monkeypatch.setattr(config, "MEDIA_GROUP_SIZE", 2)
+
+    import music_wizard_lib.utils as utils
+
+    importlib.reload(utils)
+
+    bot = FakeMediaBot()
+    results = await utils.send_audio_group(
+        bot, 1, make_tracks(tmp_path, ["s1", "s2", "s3"])
+    )
+
+    assert results == ["s1", "s2", "s3"]
+    assert bot.calls == [("group", ["s1", "s2"]), ("audio", "s3")]
+
+
+@pytest.mark.asyncio
+async def test_send_audio_group_keeps_good_tracks_of_failed_group(
+    monkeypatch, tmp_path
+):
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    import music_wizard_lib.config as config
+
+    importlib.reload(config)
+
+    import music_wizard_lib.utils as utils
+
+    importlib.reload(utils)
+
+    bot = FakeMediaBot(fail_groups=True)
+    results = await utils.send_audio_group(
+        bot, 1, make_tracks(tmp_path, ["s1", "bad", "s3"])
+    )
+
+    assert results == ["s1", None, "s3"]
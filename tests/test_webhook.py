@@ -0,0 +1,93 @@
+import json
+import asyncio
+import importlib
+
+import pytest
+from telegram.ext import Application
+
+UPDATE = {
+    "update_id": 10,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 5, "type": "private"},
+        "text": "/start",
+    },
+}
+
+
+async def post(port, path, body, secret=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    headers = f"POST {path} HTTP/1.1\r\nHost: localhost\r\n"
+    headers += f"Content-Length: {len(body)}\r\nConnection: close\r\n"
+    if secret is not None:
+        headers += f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n"
+    writer.write(headers.encode() + b"\r\n" + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    import music_wizard_lib.config as config
+
+    importlib.reload(config)
+
+    import music_wizard_lib.webhook as webhook
+
+    importlib.reload(webhook)
+    return webhook
+
+
+@pytest.mark.asyncio
+async def test_webhook_queues_authenticated_updates(webhook):
+    from music_wizard_lib.http_server import HTTPServer
+
+    application = Application.builder().token("123:abc").updater(None).build()
+    server = HTTPServer(
+        {("POST", "/hook"): webhook.webhook_route(application, "s3cret")},
+        "127.0.0.1",
+        0,
+    )
+    await server.start()
+    try:
+        body = json.dumps(UPDATE).encode()
+        assert await post(server.port, "/hook", body, secret="wrong") == 403
+        assert await post(server.port, "/hook", body) == 403
+        assert await post(server.port, "/other", body, secret="s3cret") == 404
+        assert await post(server.port, "/hook", b"{", secret="s3cret") == 400
+        assert application.update_queue.empty()
+
+        assert await post(server.port, "/hook", body, secret="s3cret") == 200
+        update = application.update_queue.get_nowait()
+        assert update.update_id == 10
+        assert update.message.text == "/start"
+    finally:
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_bad_content_length_is_rejected(webhook):
+    from music_wizard_lib.http_server import HTTPServer
+
+    async def route(headers, body):
+        return 200, "text/plain", b""
+
+    server = HTTPServer({("POST", "/hook"): route}, "127.0.0.1", 0)
+    await server.start()
+    try:
+        for length in (b"abc", b"-5"):
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            writer.write(b"POST /hook HTTP/1.1\r\nContent-Length: %s\r\n\r\n" % length)
+            await writer.drain()
+            assert (await reader.readline()).split()[1] == b"400"
+            writer.close()
+    finally:
+        await server.stop()
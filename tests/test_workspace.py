@@ -0,0 +1,87 @@
+import os
+import asyncio
+import importlib
+
+import pytest
+
+
+@pytest.fixture
+def workspace(monkeypatch):
+    # Set required environment variables before importing modules
+    monkeypatch.setenv("TELEGRAM_TOKEN", "dummy")
+    monkeypatch.setenv("GENIUS_ACCESS_TOKEN", "dummy")
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+    from music_wizard_lib import config, workspace
+
+    importlib.reload(config)
+    importlib.reload(workspace)
+    return workspace
+
+
+@pytest.mark.asyncio
+async def test_budget_queues_and_rejects(workspace, tmp_path):
+    manager = workspace.WorkspaceManager(str(tmp_path), 100, 60)
+    first = await manager.acquire()
+    assert os.path.isdir(first.path)
+
+    waiting = asyncio.create_task(manager.acquire())
+    await asyncio.sleep(0.01)
+    assert not waiting.done()
+    assert manager.stats()["waiting"] == 1
+    with pytest.raises(workspace.WorkspaceFullError):
+        await manager.acquire(timeout=0.01)
+    with pytest.raises(workspace.WorkspaceFullError):
+        await manager.acquire(size=101)
+
+    first.release()
+    first.release()
+    second = await asyncio.wait_for(waiting, 1)
+    assert not os.path.exists(first.path)
+    assert manager.stats()["reserved_bytes"] == 60
+
+    # Settling shrinks the reservation to the bytes actually on disk.
+    with open(os.path.join(second.path, "song.mp3"), "wb") as f:
+        f.write(b"x" * 10)
+    assert await second.settle() == 10
+    async with manager.workspace(size=90) as third:
+        assert manager.stats()["reserved_bytes"] == 100
+    assert not os.path.exists(third.path)
+    await second.release()
+    assert manager.stats() == {
+        "budget_bytes": 100,
+        "reserved_bytes": 0,
+        "active": 0,
+        "waiting": 0,
+        "rejected": 1,
+    }
+
+
+def test_clean_orphans(workspace, tmp_path):
+    manager = workspace.WorkspaceManager(str(tmp_path), 100, 10)
+    dead = tmp_path / f"{2**22 + 1}-abc"
+    live = tmp_path / f"{os.getppid()}-abc"
+    own = tmp_path / f"{os.getpid()}-abc"
+    for path in (dead, live, own):
+        path.mkdir()
+        (path / "partial.webm").write_bytes(b"x")
+
+    assert manager.clean_orphans() == 2
+    assert sorted(os.listdir(tmp_path)) == [live.name]
+
+
+def test_webhook_workers_split_the_budget(workspace, monkeypatch):
+    monkeypatch.setattr(workspace.config, "WORKSPACE_BUDGET_MB", 2048)
+    assert workspace.process_budget() == 2048 * workspace.MB
+    monkeypatch.setattr(workspace.config, "BOT_MODE", "webhook")
+    monkeypatch.setattr(workspace.config, "WEBHOOK_WORKERS", 4)
+    assert workspace.process_budget() == 512 * workspace.MB
+
+
+def test_default_reservation_covers_a_transcoded_download(workspace, tmp_path):
+    # The source and the mp3 made from it are on disk together.
+    config = workspace.config
+    assert config.WORKSPACE_RESERVE_MB == 2 * config.MAX_FILE_SIZE_MB
+    # In local mode one download may need the whole budget.
+    manager = workspace.WorkspaceManager(str(tmp_path), 100, 4000)
+    assert manager.reserve_bytes == 100
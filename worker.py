@@ -0,0 +1,54 @@
+"""Run download workers that take jobs from the bot's job queue.
+
+Usage:
+    python worker.py [--processes N] [--queue jobs.sqlite3]
+
+The bot starts DOWNLOAD_WORKERS workers itself; use this script to add
+workers on other cores of the same host. The queue is a SQLite database
+in WAL mode, which needs a local filesystem, so workers cannot share it
+over the network.
+"""
+
+import argparse
+import logging
+
+from music_wizard_lib import config, jobs
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=max(config.DOWNLOAD_WORKERS, 1),
+        help="Number of worker processes (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--queue",
+        default=config.JOB_QUEUE_PATH,
+        help="Job queue database (default: %(default)s).",
+    )
+    args = parser.parse_args()
+    try:
+        config.validate(("OPENAI_API_KEY",))
+    except ValueError as e:
+        logger.error("%s The workers cannot start.", e)
+        return
+    if args.processes == 1:
+        jobs.run_worker_process(0, args.queue)
+        return
+    workers = jobs.start_workers(args.processes, args.queue)
+    logger.info("Started %s download workers on '%s'.", len(workers), args.queue)
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        jobs.stop_workers(workers)
+
+
+if __name__ == "__main__":
+    main()